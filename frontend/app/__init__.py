@@ -1,11 +1,15 @@
 import os
-from flask import Flask, request
+from flask import Flask, request, g
 from flask_migrate import Migrate
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
-from flask_wtf.csrf import CSRFProtect, generate_csrf
+from flask_wtf.csrf import CSRFProtect, generate_csrf, validate_csrf
 from flask_login import LoginManager, current_user
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import make_transient_to_detached
+from wtforms import ValidationError
 import jwt
+from .cache import TTLCache
 from .config import Config
 
 # Initialize Flask app
@@ -33,6 +37,43 @@ app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['REMEMBER_COOKIE_SECURE'] = False
 app.config['REMEMBER_COOKIE_HTTPONLY'] = True
 
+# Verified tokens (token -> user id) and detached copies of their users, so
+# an authenticated request costs neither a signature check nor a query.
+# They are per process: AUTH_CACHE_TTL bounds how long another worker may
+# serve a user or token after a change it did not commit itself
+token_cache = TTLCache(app.config['AUTH_CACHE_SIZE'], app.config['AUTH_CACHE_TTL'])
+user_cache = TTLCache(app.config['AUTH_CACHE_SIZE'], app.config['AUTH_CACHE_TTL'])
+
+def invalidate_user(user_id):
+    """Forget a user and every token verified for them in this process (e.g. after a password change)."""
+    key = str(user_id)
+    user_cache.pop(key)
+    token_cache.discard_where(lambda cached_id: str(cached_id) == key)
+
+def verify_token(token):
+    user_id = token_cache.get(token)
+    if user_id is None:
+        data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+        user_id = data.get('sub')
+        if user_id:
+            # Never serve a cached token past its own expiry
+            token_cache.put(token, user_id, expires=data.get('exp'))
+    return user_id
+
+def get_user(user_id):
+    from app.models import User
+    key = str(user_id)
+    cached = user_cache.get(key)
+    if cached is not None:
+        # Attach a copy to this request's session without a query
+        return db.session.merge(cached, load=False)
+    user = db.session.get(User, user_id)
+    if user is not None:
+        copy = User(**{attr.key: getattr(user, attr.key) for attr in sa_inspect(User).column_attrs})
+        make_transient_to_detached(copy)
+        user_cache.put(key, copy)
+    return user
+
 # User loader for Flask-Login
 @login_manager.request_loader
 def load_user_from_request(request):
@@ -40,11 +81,9 @@ def load_user_from_request(request):
     if auth_header:
         try:
             token = auth_header.split(" ")[1]
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            user_id = data.get('sub')
+            user_id = verify_token(token)
             if user_id:
-                from app.models import User
-                user = db.session.get(User, user_id)
+                user = get_user(user_id)
                 if user:
                     return user
         except Exception as e:
@@ -57,10 +96,34 @@ def log_options_requests():
     if request.method == 'OPTIONS':
         app.logger.debug(f"Received OPTIONS request for {request.path}")
 
-# Set CSRF token cookie after each request
+def needs_csrf_cookie(response):
+    """Whether a response should (re)issue the csrf_token cookie.
+
+    Preflights, static files, streams and bearer-token API calls never need
+    one. Otherwise the cookie is only sent when this request generated a
+    token, or the client's cookie is missing or past half its lifetime.
+    """
+    if request.method == 'OPTIONS' or request.endpoint == 'static' or response.is_streamed:
+        return False
+    if request.headers.get('Authorization'):
+        return False
+    if 'csrf_token' in g:
+        return True
+    token = request.cookies.get('csrf_token')
+    if not token:
+        return True
+    time_limit = app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    try:
+        validate_csrf(token, time_limit=time_limit // 2 if time_limit else None)
+    except ValidationError:
+        return True
+    return False
+
+# Set CSRF token cookie only when the client needs a fresh one
 @app.after_request
 def set_csrf_cookie(response):
-    response.set_cookie('csrf_token', generate_csrf())
+    if needs_csrf_cookie(response):
+        response.set_cookie('csrf_token', generate_csrf())
     return response
 
 # Import views and models to register routes and database models
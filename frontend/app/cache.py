@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries also expire.
+
+    Each entry lives for at most `ttl` seconds (or less, if put() is given
+    an earlier expiry) and the least recently used entry is evicted once
+    `maxsize` is reached. A ttl of 0 disables the cache.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, expires=None):
+        """Store a value; `expires` is an optional time.time() deadline."""
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        lifetime = self.ttl
+        if expires is not None:
+            lifetime = min(lifetime, expires - time.time())
+            if lifetime <= 0:
+                return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + lifetime)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return entry[0] if entry else None
+
+    def discard_where(self, predicate):
+        """Drop every entry whose value matches; returns how many were dropped."""
+        with self._lock:
+            keys = [k for k, (value, _) in self._data.items() if predicate(value)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -7,4 +7,27 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'default_secret_key')
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')  # Use DATABASE_URL from .env
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-   
\ No newline at end of file
+   
+    # Pre-started engine worker processes for /api/matlab/*; 'stub' runs without MATLAB
+    MATLAB_WORKERS = int(os.getenv('MATLAB_WORKERS', '1'))
+    MATLAB_ENGINE = os.getenv('MATLAB_ENGINE', 'matlab')
+    MATLAB_CANCEL_TIMEOUT = float(os.getenv('MATLAB_CANCEL_TIMEOUT', '5'))
+
+    # The one process owning those engines and their jobs (`python loraRecv/src/worker_pool.py`);
+    # with autostart on, the first web worker to find it missing starts it
+    MATLAB_POOL_ADDRESS = os.getenv('MATLAB_POOL_ADDRESS', '127.0.0.1:6010')
+    MATLAB_POOL_AUTHKEY = os.getenv('MATLAB_POOL_AUTHKEY', SECRET_KEY)
+    MATLAB_POOL_AUTOSTART = os.getenv('MATLAB_POOL_AUTOSTART', '1').lower() not in ('0', 'false', 'off')
+
+    # Verified JWTs and their users are cached per web worker for this many seconds; 0 disables.
+    # A worker drops its own entries when it commits a change to a user, but the other workers
+    # only see the change (a new password, a deleted user) once their entries expire
+    AUTH_CACHE_TTL = float(os.getenv('AUTH_CACHE_TTL', '5'))
+    AUTH_CACHE_SIZE = int(os.getenv('AUTH_CACHE_SIZE', '1024'))
+
+    # Per-stage timers and counters, exported at /metrics; off costs next to nothing
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'off')
+
+    # Name of the SharedMap segment the SLAM process publishes (`python loraRecv/src/shared_map.py PORT`,
+    # which defaults to 'hexit-map'); unset serves the in-process map
+    SHARED_MAP_NAME = os.getenv('SHARED_MAP_NAME')
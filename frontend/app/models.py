@@ -1,5 +1,7 @@
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
 from werkzeug.security import generate_password_hash, check_password_hash
-from app import db
+from app import db, invalidate_user
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -13,4 +15,19 @@ class User(db.Model):
 
     def check_password(self, password):
         """Check the provided password against the stored hash."""
-        return check_password_hash(self.password_hash, password)
\ No newline at end of file
+        return check_password_hash(self.password_hash, password)
+
+# Cached users and tokens are dropped once a change to a user is committed
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _mark_user_changed(mapper, connection, target):
+    object_session(target).info.setdefault('changed_users', set()).add(target.id)
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop('changed_users', ()):
+        invalidate_user(user_id)
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_changed_users(session):
+    session.info.pop('changed_users', None)
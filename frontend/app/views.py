@@ -1,17 +1,23 @@
 import os
 import sys
 
-# Manually add the path to loraRecv/src for importing matlab_intt
+# Manually add the path to loraRecv/src for importing worker_pool and map_stream
 # This is necessary because the script is not in the same directory as the app
-lora_recv_src_path = r"C:\Users\donta\OneDrive\Desktop\HEX-it_website\HEX-it\loraRecv\src"
+lora_recv_src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                  'loraRecv', 'src')
 
 if lora_recv_src_path not in sys.path:
     sys.path.insert(0, lora_recv_src_path)
 
-from matlab_int import start_matlab_script_async, stop_matlab_script
+from worker_pool import PoolClient, DEFAULT_SCRIPT, parse_address
+from map_stream import MapStream, SharedMapFeed
+from tile_renderer import TileRenderer
+from shared_map import SharedMap, SharedGrid
+from planner import GridPlanner
+from metrics import METRICS
 
 from app import app, db, login_manager, csrf
-from flask import request, jsonify, send_from_directory, session, redirect, url_for
+from flask import request, jsonify, send_from_directory, session, redirect, url_for, Response, stream_with_context, g
 from flask_wtf.csrf import generate_csrf
 from flask_login import login_user, logout_user, current_user, login_required
 from werkzeug.security import check_password_hash
@@ -20,12 +26,69 @@ from app.models import User
 from datetime import datetime, timedelta
 from flask_cors import CORS
 import threading
+import math
+import time
 import jwt
 import logging
 
 # Enable CORS for all routes
 CORS(app)
 
+# Live map deltas; fed from the shared map once it is attached
+map_stream = MapStream()
+
+# Tile pyramid of the same map, re-rendered only where it changed
+map_tiles = TileRenderer()
+
+# The SLAM process's map in shared memory, when it runs outside the web
+# workers; attached on first use so workers may start before it
+shared_map = None
+shared_grid = None
+map_feed = None
+shared_epoch = None
+overlay_generation = None
+shared_lock = threading.Lock()
+
+# Distance fields are cached per map version, so repeat queries from the
+# drone's cell are a descent through the cached field
+map_planner = None
+planning_map = None
+planner_lock = threading.Lock()
+
+# One pool process owns the engines and the jobs; every web worker talks to
+# it, so a job started through one worker can be polled or stopped through
+# any other. The first request that finds it missing starts it.
+job_pool = PoolClient(parse_address(app.config['MATLAB_POOL_ADDRESS']),
+                      app.config['MATLAB_POOL_AUTHKEY'].encode(),
+                      spawn=(app.config['MATLAB_WORKERS'], app.config['MATLAB_ENGINE'],
+                             app.config['MATLAB_CANCEL_TIMEOUT']) if app.config['MATLAB_POOL_AUTOSTART'] else None)
+
+METRICS.enabled = app.config['METRICS_ENABLED']
+request_seconds = METRICS.histogram('http_request_seconds', "Time to build a response, by endpoint")
+request_count = METRICS.counter('http_requests_total', "Responses by endpoint and status code")
+
+@app.before_request
+def start_request_timer():
+    if METRICS.enabled:
+        g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Streams are timed until their first byte, not until they close
+        endpoint = request.endpoint or 'unmatched'
+        request_seconds.labels(endpoint=endpoint).observe(time.perf_counter() - started)
+        request_count.labels(endpoint=endpoint, status=response.status_code).inc()
+    return response
+
+@csrf.exempt
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    if not METRICS.enabled:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/')
 def index():
     return send_from_directory(app.static_folder, 'index.html')
@@ -124,13 +187,15 @@ def register():
 @app.route('/api/matlab/start', methods=['POST'])
 def start_matlab():
     try:
-        # Start MATLAB asynchronously on button press
-        success, message = start_matlab_script_async()
-        if success:
-            return jsonify({'message': message}), 200
-        else:
-            app.logger.error(f"MATLAB async start failed: {message}")
-            return jsonify({'error': message}), 400
+        data = request.get_json(silent=True) or {}
+        # Queue the run on a pre-started engine and answer straight away
+        job_id = job_pool.submit(data.get('script', DEFAULT_SCRIPT))
+        return jsonify({'message': 'MATLAB script queued', 'job_id': job_id,
+                        'status': job_pool.status(job_id)}), 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except ConnectionError:
+        return jsonify({'error': 'MATLAB job pool is not running'}), 503
     except Exception as e:
         app.logger.error(f"Exception in /api/matlab/start: {e}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -139,12 +204,174 @@ def start_matlab():
 @app.route('/api/matlab/stop', methods=['POST'])
 def stop_matlab():
     try:
-        success, message = stop_matlab_script()
-        if success:
-            return jsonify({'message': message}), 200
-        else:
-            app.logger.error(f"MATLAB stop failed: {message}")
-            return jsonify({'error': message}), 400
+        data = request.get_json(silent=True) or {}
+        job_id = data.get('job_id')
+        # Without a job id, stop everything that is queued or running
+        job_ids = [job_id] if job_id else job_pool.active()
+        cancelled = [j for j in job_ids if job_pool.cancel(j)]
+        if not cancelled:
+            return jsonify({'error': 'No running MATLAB job'}), 400
+        return jsonify({'message': 'MATLAB script stopping', 'cancelled': cancelled}), 200
+    except ConnectionError:
+        return jsonify({'error': 'MATLAB job pool is not running'}), 503
     except Exception as e:
         app.logger.error(f"Exception in /api/matlab/stop: {e}")
         return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/api/matlab/jobs/<job_id>', methods=['GET'])
+def matlab_job_status(job_id):
+    try:
+        status = job_pool.status(job_id)
+    except ConnectionError:
+        return jsonify({'error': 'MATLAB job pool is not running'}), 503
+    if status is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(status), 200
+
+@csrf.exempt
+@app.route('/api/map/stream', methods=['GET'])
+def stream_map():
+    # EventSource resends the last id it saw when it reconnects
+    since = request.headers.get('Last-Event-ID', request.args.get('since'))
+    try:
+        since = int(since) if since is not None else None
+    except ValueError:
+        since = None
+    # Starts feeding map_stream from the SLAM process, if it is not yet
+    _shared_map()
+    response = Response(stream_with_context(map_stream.follow(since)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/map/snapshot', methods=['GET'])
+def map_snapshot():
+    if _shared_map() is not None:
+        map_feed.poll()
+    snapshot = map_stream.snapshot()
+    return Response(snapshot.data, mimetype='application/json')
+
+def _tile_response(body, etag, mimetype, headers=None):
+    # Clients revalidate with If-None-Match and get a 304 while the tile is unchanged
+    response = Response(body, mimetype=mimetype, headers=headers)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def _shared_map():
+    global shared_map, shared_grid, map_feed
+    name = app.config['SHARED_MAP_NAME']
+    if shared_map is None and name:
+        with shared_lock:
+            if shared_map is None:
+                try:
+                    shared_map = SharedMap(name)
+                except FileNotFoundError:
+                    return None
+                shared_grid = SharedGrid(shared_map)
+                map_feed = SharedMapFeed(shared_map, map_stream)
+                map_feed.start()
+    return shared_map
+
+def _current_tiles():
+    global shared_epoch, overlay_generation
+    if _shared_map() is not None:
+        # A new flight in the SLAM process starts a new epoch
+        epoch = shared_grid.epoch
+        if map_tiles.grid is not shared_grid or shared_epoch != epoch:
+            map_tiles.attach(shared_grid)
+            shared_epoch = epoch
+            overlay_generation = None
+    elif map_tiles.grid is not map_stream.grid and map_stream.grid is not None:
+        map_tiles.attach(map_stream.grid)
+    return map_tiles
+
+def _planning_map():
+    """(obstacle mask, world origin, resolution, version) of the latest map, or None.
+
+    The version is compared first, so the mask is only rebuilt when the map changed.
+    """
+    global planning_map
+    shared = _shared_map()
+    if shared is not None:
+        source = shared.snapshot()
+        # Nothing published yet, or nothing mapped in what was
+        if source is None or source.bounds[0] == source.bounds[2]:
+            return None
+        version = (source.epoch, source.revision)
+    else:
+        source = map_stream.grid
+        if source is None or not len(source.tiles):
+            return None
+        version = (id(source), source.version)
+    if planning_map is None or planning_map[3] != version:
+        blocked, origin = source.occupied_mask()
+        planning_map = (blocked, origin, source.resolution, version)
+    return planning_map
+
+@app.route('/api/map/tiles/<int:zoom>/<int(signed=True):x>/<int(signed=True):y>.png', methods=['GET'])
+def map_tile_png(zoom, x, y):
+    tile = _current_tiles().png(zoom, x, y) if zoom < map_tiles.levels else None
+    if tile is None:
+        return jsonify({'error': 'No such tile'}), 404
+    etag, body = tile
+    return _tile_response(body, etag, 'image/png')
+
+@app.route('/api/map/tiles/<int:zoom>/<int(signed=True):x>/<int(signed=True):y>.raw', methods=['GET'])
+def map_tile_raw(zoom, x, y):
+    tile = _current_tiles().tile(zoom, x, y) if zoom < map_tiles.levels else None
+    if tile is None:
+        return jsonify({'error': 'No such tile'}), 404
+    etag, image = tile
+    return _tile_response(image.tobytes(), etag, 'application/octet-stream',
+                          {'X-Tile-Size': str(image.shape[0])})
+
+def _current_overlay():
+    global overlay_generation
+    tiles = _current_tiles()
+    if shared_map is not None:
+        # Trajectory and events as published by the SLAM process, once per publish
+        snapshot = shared_map.snapshot()
+        if snapshot is not None and snapshot.generation != overlay_generation:
+            tiles.update_overlay(snapshot.poses, snapshot.event_dicts())
+            overlay_generation = snapshot.generation
+    return tiles
+
+@app.route('/api/map/overlay', methods=['GET'])
+def map_overlay():
+    etag, body = _current_overlay().overlay()
+    return _tile_response(body, etag, 'application/json')
+
+def _world_point(text):
+    x, y = (float(v) for v in text.split(','))
+    return x, y
+
+@app.route('/api/map/route', methods=['GET'])
+def map_route():
+    global map_planner
+    try:
+        start = _world_point(request.args['start'])
+        goal = _world_point(request.args['goal'])
+    except (KeyError, ValueError):
+        return jsonify({'error': 'start and goal must be given as x,y in meters'}), 400
+    with planner_lock:
+        current = _planning_map()
+        if current is None:
+            return jsonify({'error': 'No map yet'}), 404
+        blocked, origin, resolution, version = current
+        if map_planner is None:
+            map_planner = GridPlanner(blocked, version)
+        elif map_planner.version != version:
+            map_planner.set_map(blocked, version)
+        planner = map_planner
+        # world (x, y) -> (row, col) of the mask
+        cells = [(math.floor((y - origin[1]) * resolution), math.floor((x - origin[0]) * resolution))
+                 for x, y in (start, goal)]
+        try:
+            route = planner.plan(*cells)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    if route is None:
+        return jsonify({'error': 'Goal is unreachable'}), 404
+    path = (route.cells[:, ::-1] + 0.5) / resolution + origin
+    return jsonify({'path': path.round(3).tolist(), 'length': route.cost / resolution}), 200
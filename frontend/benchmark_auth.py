@@ -0,0 +1,73 @@
+"""Requests/s of the auth and CSRF paths, with and without the caches.
+
+Run from the frontend directory:  python benchmark_auth.py [requests]
+Uses an in-memory SQLite database unless DATABASE_URL is set.
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('MATLAB_ENGINE', 'stub')
+
+from flask import request
+
+import app as app_module
+from app import app, db
+from app.cache import TTLCache
+from app.models import User
+from app.views import generate_token
+
+
+def run(client, path, requests, headers=None):
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200, response.status_code
+    return requests / (time.perf_counter() - started)
+
+
+def authenticate(requests, headers):
+    # What a bearer-token request costs the request loader
+    started = time.perf_counter()
+    for _ in range(requests):
+        with app.test_request_context(headers=headers):
+            assert app_module.load_user_from_request(request) is not None
+    return requests / (time.perf_counter() - started)
+
+
+def benchmark(requests=2000):
+    app.config['WTF_CSRF_ENABLED'] = True
+    with app.app_context():
+        db.create_all()
+        if db.session.get(User, 1) is None:
+            user = User(id=1)
+            user.set_password('benchmark')
+            db.session.add(user)
+            db.session.commit()
+        token = generate_token(1)
+
+    auth = {'Authorization': f'Bearer {token}'}
+    always_issue = lambda response: True
+    needs_cookie = app_module.needs_csrf_cookie
+    ttl, size = app.config['AUTH_CACHE_TTL'], app.config['AUTH_CACHE_SIZE']
+    results = {}
+    for label, cached in (('before', False), ('after', True)):
+        # "before" decodes and queries on every request and always sets the cookie
+        app_module.token_cache = TTLCache(size, ttl if cached else 0)
+        app_module.user_cache = TTLCache(size, ttl if cached else 0)
+        app_module.needs_csrf_cookie = needs_cookie if cached else always_issue
+        client = app.test_client()
+        client.get('/home')
+        results[label] = {'api': authenticate(requests, auth),
+                          'browser': run(client, '/home', requests)}
+    app_module.needs_csrf_cookie = needs_cookie
+
+    for scenario in ('api', 'browser'):
+        before, after = results['before'][scenario], results['after'][scenario]
+        print(f"{scenario:8s} before {before:8.0f} req/s   after {after:8.0f} req/s   ({after / before:.2f}x)")
+    return results
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
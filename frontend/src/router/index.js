@@ -4,6 +4,7 @@ import LoginForm from '../components/LoginForm.vue';
 import AboutView from '../views/AboutView.vue';
 import SignUpForm from '../components/SignUpForm.vue';
 import MatlabControl from '../components/MatlabControl.vue';
+import LiveMap from '../components/LiveMap.vue';
 
 const routes = [
   {
@@ -35,6 +36,11 @@ const routes = [
     name: 'MatlabControl',
     component: MatlabControl,
   },
+  {
+    path: '/live-map',
+    name: 'LiveMap',
+    component: LiveMap,
+  },
 ];
 
 const router = createRouter({
@@ -0,0 +1,158 @@
+import unittest
+import sys
+import os
+import time
+from unittest import mock
+
+# Run against an in-memory database and without MATLAB
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('MATLAB_ENGINE', 'stub')
+
+# Add the frontend directory to path to import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app as app_module
+from flask import request
+from app import app, db
+from app.cache import TTLCache
+from app.models import User
+from app.views import generate_token
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+class TestTTLCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('app.cache.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_entries_expire(self):
+        cache = TTLCache(maxsize=4, ttl=10)
+        cache.put('a', 1)
+        self.clock.now += 9
+        self.assertEqual(cache.get('a'), 1)
+        self.clock.now += 2
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+        # An earlier deadline of the value's own wins, a past one is not stored
+        cache.put('b', 2, expires=self.clock.now + 3)
+        cache.put('c', 3, expires=self.clock.now - 1)
+        self.clock.now += 4
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+    def test_least_recently_used_is_evicted(self):
+        cache = TTLCache(maxsize=2, ttl=10)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        self.assertEqual([cache.get(key) for key in 'abc'], [1, None, 3])
+        self.assertEqual(cache.discard_where(lambda value: value == 3), 1)
+        self.assertEqual(cache.pop('a'), 1)
+        self.assertEqual(len(cache), 0)
+
+    def test_zero_ttl_disables(self):
+        cache = TTLCache(maxsize=2, ttl=0)
+        cache.put('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+class TestAuthCaches(unittest.TestCase):
+    # Each block gets its own app context, as separate requests would
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('app.cache.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with app.app_context():
+            db.create_all()
+            user = User(id=1)
+            user.set_password('first')
+            db.session.add(user)
+            db.session.commit()
+        app_module.token_cache.clear()
+        app_module.user_cache.clear()
+        self.auth = {'Authorization': f'Bearer {generate_token(1)}'}
+        # Token expiries are wall-clock times; follow the real clock
+        self.clock.now = time.time()
+
+    def tearDown(self):
+        with app.app_context():
+            db.drop_all()
+
+    def authenticated_id(self):
+        with app.test_request_context(headers=self.auth):
+            user = app_module.load_user_from_request(request)
+            return user.id if user is not None else None
+
+    def test_password_change_drops_cached_user_and_tokens(self):
+        self.assertEqual(self.authenticated_id(), 1)
+        self.assertEqual(len(app_module.token_cache), 1)
+        self.assertEqual(len(app_module.user_cache), 1)
+        with app.app_context():
+            db.session.get(User, 1).set_password('second')
+            db.session.flush()
+            # Nothing is dropped until the change commits, and a rollback keeps the cache
+            db.session.rollback()
+            self.assertEqual(len(app_module.user_cache), 1)
+            db.session.get(User, 1).set_password('second')
+            db.session.commit()
+        self.assertEqual(len(app_module.token_cache), 0)
+        self.assertEqual(len(app_module.user_cache), 0)
+
+    def test_deleted_user_is_not_served_from_cache(self):
+        self.assertEqual(self.authenticated_id(), 1)
+        with app.app_context():
+            db.session.delete(db.session.get(User, 1))
+            db.session.commit()
+        self.assertIsNone(self.authenticated_id())
+
+    def test_change_from_another_worker_is_seen_within_the_ttl(self):
+        self.assertEqual(self.authenticated_id(), 1)
+        # Another process deletes the user; nothing tells this one
+        with app.app_context():
+            db.session.execute(db.text('DELETE FROM users WHERE id = 1'))
+            db.session.commit()
+        self.assertEqual(self.authenticated_id(), 1)
+        self.clock.now += app.config['AUTH_CACHE_TTL'] + 0.1
+        self.assertIsNone(self.authenticated_id())
+
+class TestCsrfCookie(unittest.TestCase):
+    def setUp(self):
+        self.config = mock.patch.dict(app.config, {'WTF_CSRF_ENABLED': True})
+        self.config.start()
+        self.addCleanup(self.config.stop)
+        self.client = app.test_client()
+
+    def issued(self, response):
+        return any(header.startswith('csrf_token=') for header in response.headers.getlist('Set-Cookie'))
+
+    def test_cookie_only_when_needed(self):
+        self.assertTrue(self.issued(self.client.get('/home')))
+        # The client now holds a fresh cookie
+        self.assertFalse(self.issued(self.client.get('/home')))
+        self.assertFalse(self.issued(self.client.options('/home')))
+        # Bearer-token API calls never get one, even without a cookie
+        other = app.test_client()
+        self.assertFalse(self.issued(other.get('/home', headers={'Authorization': 'Bearer x'})))
+        # A token generated by the request is always sent
+        self.assertTrue(self.issued(self.client.get('/api/v1/csrf-token')))
+
+    def test_cookie_reissued_past_half_its_lifetime(self):
+        app.config['WTF_CSRF_TIME_LIMIT'] = 2
+        self.assertTrue(self.issued(self.client.get('/home')))
+        self.assertFalse(self.issued(self.client.get('/home')))
+        time.sleep(2.1)
+        self.assertTrue(self.issued(self.client.get('/home')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import unittest
+import sys
+import os
+import json
+import time
+import asyncio
+import threading
+from unittest import mock
+import numpy as np
+
+# Run against an in-memory database and without MATLAB
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('MATLAB_ENGINE', 'stub')
+
+# Add the frontend directory to path to import the app (which adds loraRecv/src)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import app, views
+from map_stream import MapStream
+from tile_renderer import TileRenderer
+from shared_map import SharedMap, Snapshot, serve
+from pipeline_benchmark import synthetic_stream
+from occupancy_grid import OccupancyGrid
+
+def sse_messages(response, timeout=10):
+    """Yield the JSON body of each event of a streamed response, ignoring keepalives."""
+    deadline = time.monotonic() + timeout
+    for chunk in response.response:
+        if time.monotonic() > deadline:
+            return
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        for line in text.splitlines():
+            if line.startswith('data: '):
+                yield json.loads(line[len('data: '):])
+
+class TestMapApi(unittest.TestCase):
+    """The web worker serving the map a separate SLAM process publishes."""
+
+    def setUp(self):
+        self.writer = SharedMap(create=True, rows=512, cols=512)
+        self.addCleanup(self.writer.close)
+        self.grid = OccupancyGrid(resolution=20)
+        self.angles = np.radians(np.arange(0, 360, 4))
+        # A worker that has not attached to the shared map yet
+        for name, value in [('map_stream', MapStream()), ('map_tiles', TileRenderer()), ('shared_map', None),
+                            ('shared_grid', None), ('shared_epoch', None), ('map_feed', None),
+                            ('overlay_generation', None), ('map_planner', None), ('planning_map', None)]:
+            patcher = mock.patch.object(views, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.dict(app.config, {'SHARED_MAP_NAME': self.writer.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.detach)
+        self.client = app.test_client()
+
+    def detach(self):
+        if views.map_feed is not None:
+            views.map_feed.stop()
+        if views.shared_map is not None:
+            views.shared_map.close()
+
+    def publish(self, scan_id, x, events=()):
+        self.grid.insert_scan(scan_id, (x, 0.0, 0.0), np.full(len(self.angles), 2.0), self.angles)
+        poses = [(0.3 * k, 0.0, 0.0) for k in range(scan_id + 1)]
+        self.writer.publish(self.grid, poses, events)
+
+    def test_map_updates_reach_the_stream(self):
+        self.publish(0, 0.0)
+        response = self.client.get('/api/map/stream', buffered=False)
+        self.addCleanup(response.close)
+        messages = sse_messages(response)
+        body = next(body for body in messages if body['tiles'])
+        self.assertEqual(body['pose'], [0.0, 0.0, 0.0])
+        self.assertEqual(body['resolution'], 20)
+
+        person = {'id': 4, 'type': 'person', 'pose': [0.3, 0.5]}
+        self.publish(1, 0.3, [person])
+        body = next(body for body in messages if body['pose'] == [0.3, 0.0, 0.0])
+        self.assertTrue(body['delta'])
+        self.assertTrue(body['tiles'])
+        self.assertEqual([(e['id'], e['type']) for e in body['events']], [(4, 'person')])
+
+        snapshot = json.loads(self.client.get('/api/map/snapshot').data)
+        self.assertEqual(len(snapshot['tiles']), len(self.grid.tiles))
+        self.assertEqual(snapshot['pose'], [0.3, 0.0, 0.0])
+
+    def test_overlay_from_the_shared_map(self):
+        self.publish(0, 0.0)
+        response = self.client.get('/api/map/overlay')
+        body = response.get_json()
+        self.assertEqual(body['trajectory'], [[0.0, 0.0]])
+        self.assertEqual(body['events'], [])
+        # Unchanged until the next publish
+        again = self.client.get('/api/map/overlay', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(again.status_code, 304)
+
+        person = {'id': 2, 'type': 'person', 'pose': [0.3, 0.5], 'count': 3}
+        self.publish(1, 0.3, [person])
+        body = self.client.get('/api/map/overlay').get_json()
+        self.assertEqual(body['trajectory'], [[0.0, 0.0], [0.3, 0.0]])
+        self.assertEqual([(e['id'], e['count']) for e in body['events']], [(2, 3)])
+
+    def test_route_rebuilds_the_mask_only_when_the_map_changed(self):
+        # Published before anything was mapped
+        self.writer.publish(self.grid)
+        self.assertEqual(self.client.get('/api/map/route?start=0,0&goal=0.5,0').status_code, 404)
+
+        self.publish(0, 0.0)
+        with mock.patch.object(Snapshot, 'occupied_mask', autospec=True,
+                               side_effect=Snapshot.occupied_mask) as occupied_mask:
+            for _ in range(3):
+                response = self.client.get('/api/map/route?start=0,0&goal=0.5,0')
+                self.assertEqual(response.status_code, 200)
+            self.assertEqual(occupied_mask.call_count, 1)
+            self.publish(1, 0.3)
+            self.assertEqual(self.client.get('/api/map/route?start=0,0&goal=0.5,0').status_code, 200)
+            self.assertEqual(occupied_mask.call_count, 2)
+        self.assertAlmostEqual(response.get_json()['length'], 0.5, delta=0.1)
+
+    def test_ingestion_entry_point_feeds_the_web_worker(self):
+        name = f'hexit-test-{os.getpid()}'
+        chunks = synthetic_stream(12)
+        release = threading.Event()
+
+        async def source():
+            for _, data in chunks:
+                yield data
+            # The receiver goes quiet with the last scans still throttled
+            await asyncio.get_running_loop().run_in_executor(None, release.wait)
+
+        patcher = mock.patch.dict(app.config, {'SHARED_MAP_NAME': name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        result = {}
+        writer = threading.Thread(target=lambda: result.update(slam=serve(source(), name, interval=60)))
+        writer.start()
+        self.addCleanup(writer.join, 30)
+        self.addCleanup(release.set)
+
+        deadline = time.monotonic() + 30
+        while not self.client.get('/api/map/overlay').get_json()['trajectory']:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+        # Only the first scan went out inside the interval
+        time.sleep(0.5)
+        self.assertEqual(len(self.client.get('/api/map/overlay').get_json()['trajectory']), 1)
+        release.set()
+        writer.join(30)
+        # The rest is published on shutdown
+        poses = result['slam'].poses
+        self.assertEqual(len(poses), 12)
+        trajectory = self.client.get('/api/map/overlay').get_json()['trajectory']
+        np.testing.assert_allclose(trajectory, poses[:, :2], atol=1e-3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+import sys
+import os
+import socket
+from unittest import mock
+
+# Run against an in-memory database and without MATLAB
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('MATLAB_ENGINE', 'stub')
+
+# Add the frontend directory to path to import the app (which adds loraRecv/src)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import app, views
+from worker_pool import PoolClient, DONE
+
+class TestMatlabApi(unittest.TestCase):
+    """Jobs started through one web worker, seen through another."""
+
+    def setUp(self):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            address = probe.getsockname()
+        # What each gunicorn worker builds at import time
+        self.workers = [PoolClient(address, b'secret', spawn=(1, 'stub', 1.0)) for _ in range(2)]
+        self.addCleanup(self.stop_pool)
+        self.client = app.test_client()
+
+    def stop_pool(self):
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.terminate()
+                worker.process.wait(10)
+
+    def on(self, worker, method, url, **kwargs):
+        with mock.patch.object(views, 'job_pool', self.workers[worker]):
+            return getattr(self.client, method)(url, **kwargs)
+
+    def test_any_worker_sees_the_job(self):
+        response = self.on(0, 'post', '/api/matlab/start', json={})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job_id']
+        self.assertEqual(self.workers[1].wait(job_id, 10)['state'], DONE)
+        self.assertEqual(self.on(1, 'get', f'/api/matlab/jobs/{job_id}').get_json()['state'], DONE)
+        # Only one pool process was started
+        self.assertEqual(sum(worker.process is not None for worker in self.workers), 1)
+        self.assertEqual(self.on(1, 'post', '/api/matlab/stop', json={'job_id': job_id}).status_code, 400)
+        self.assertEqual(self.on(1, 'post', '/api/matlab/start', json={'script': 'x.py'}).status_code, 400)
+
+    def test_missing_pool_without_autostart(self):
+        self.workers[1].spawn = None
+        self.assertEqual(self.on(1, 'get', '/api/matlab/jobs/abc').status_code, 503)
+        self.assertEqual(self.on(1, 'post', '/api/matlab/stop', json={}).status_code, 503)
+
+if __name__ == '__main__':
+    unittest.main()
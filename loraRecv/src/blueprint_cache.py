@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from costmap import FIRE_RADIUS, inflate
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.blueprint_cache')
+
+# Preprocessing defaults, matching roomMapper.m. threshold=None means Otsu,
+# like imbinarize
+DEFAULT_PARAMS = {
+    'threshold': None,
+    'red': [150, 100, 100],
+    'green': [100, 150, 100],
+    'fire_radius': FIRE_RADIUS,
+}
+
+_MASKS = ('walls', 'fire', 'fire_zone')
+
+
+def to_gray(rgb):
+    """rgb2gray weights, as uint8."""
+    rgb = np.asarray(rgb, dtype=np.float32)
+    gray = rgb[..., 0] * 0.2989 + rgb[..., 1] * 0.5870 + rgb[..., 2] * 0.1140
+    return np.clip(np.round(gray), 0, 255).astype(np.uint8)
+
+
+def otsu_threshold(gray):
+    """Global Otsu level on a uint8 image; pixels above it are foreground."""
+    hist = np.bincount(gray.reshape(-1), minlength=256).astype(float)
+    levels = np.arange(256)
+    weight = np.cumsum(hist)
+    total = weight[-1]
+    mean = np.cumsum(hist * levels)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = (mean[-1] * weight - mean * total) ** 2 / (weight * (total - weight))
+    return int(np.nanargmax(between))
+
+
+def preprocess(rgb, threshold=None, red=(150, 100, 100), green=(100, 150, 100),
+               fire_radius=FIRE_RADIUS):
+    """Obstacle mask, fire mask, inflated fire zone and person pixels of a blueprint.
+
+    Same steps as roomMapper.m: white is free after binarizing the gray
+    image, red pixels (R > red[0], G < red[1], B < red[2]) are fire and green
+    pixels (R < green[0], G > green[1], B < green[2]) are people.
+    """
+    rgb = np.asarray(rgb)
+    gray = to_gray(rgb)
+    level = otsu_threshold(gray) if threshold is None else threshold
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    fire = (r > red[0]) & (g < red[1]) & (b < red[2])
+    person = (r < green[0]) & (g > green[1]) & (b < green[2])
+    return {
+        'walls': gray <= level,
+        'fire': fire,
+        'fire_zone': np.isfinite(inflate(fire, fire_radius)),
+        'persons': np.argwhere(person).astype(np.int32),
+    }
+
+
+def load_image(path):
+    from PIL import Image
+
+    with Image.open(path) as image:
+        return np.asarray(image.convert('RGB'))
+
+
+class Blueprint:
+    """Preprocessed blueprint backed by memory-mapped, bit-packed masks.
+
+    Masks are packed along rows, so single-cell lookups (wall_at, in_fire)
+    read one byte of the mapping; the full boolean arrays are unpacked once
+    on first access.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.shape = tuple(self.meta['shape'])
+        self.packed = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+                       for name in _MASKS}
+        self.persons = np.load(os.path.join(directory, 'persons.npy'), mmap_mode='r')
+        self._unpacked = {}
+
+    def mask(self, name):
+        if name not in self._unpacked:
+            bits = np.unpackbits(self.packed[name], axis=1, count=self.shape[1])
+            self._unpacked[name] = bits.view(bool)
+        return self._unpacked[name]
+
+    @property
+    def walls(self):
+        return self.mask('walls')
+
+    @property
+    def fire(self):
+        return self.mask('fire')
+
+    @property
+    def fire_zone(self):
+        return self.mask('fire_zone')
+
+    def _bit(self, name, row, col):
+        return bool((self.packed[name][row, col >> 3] >> (7 - (col & 7))) & 1)
+
+    def wall_at(self, row, col):
+        return self._bit('walls', row, col)
+
+    def in_fire(self, row, col):
+        return self._bit('fire_zone', row, col)
+
+    def blocked(self):
+        """Planner obstacle mask: walls plus inflated fire."""
+        if 'blocked' not in self._unpacked:
+            self._unpacked['blocked'] = self.walls | self.fire_zone
+        return self._unpacked['blocked']
+
+
+class BlueprintCache:
+    """Content-addressed store of preprocessed blueprint images.
+
+    The key is the SHA-256 of the image bytes plus the preprocessing
+    parameters, so a renamed copy of a blueprint is still a hit and changing
+    a threshold is a miss. Each entry is a directory of .npy files written
+    to a temporary name and renamed into place, so concurrent readers never
+    see a partial entry. File hashes are memoized by (size, mtime) for the
+    life of the cache object.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._hashes = {}
+        self._loaded = {}
+
+    def key(self, path, **params):
+        stat = os.stat(path)
+        memo = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        digest = self._hashes.get(memo)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(chunk)
+            digest = self._hashes[memo] = sha.hexdigest()
+        merged = dict(DEFAULT_PARAMS, **params)
+        unknown = set(params) - set(DEFAULT_PARAMS)
+        if unknown:
+            raise ValueError(f"Unknown preprocessing parameters: {sorted(unknown)}")
+        merged = {name: list(value) if isinstance(value, tuple) else value
+                  for name, value in merged.items()}
+        blob = digest + json.dumps(merged, sort_keys=True)
+        return hashlib.sha256(blob.encode()).hexdigest()[:32], merged
+
+    def load(self, path, **params):
+        """Blueprint for an image file, preprocessing it only on a miss."""
+        key, merged = self.key(path, **params)
+        blueprint = self._loaded.get(key)
+        if blueprint is not None:
+            self.hits += 1
+            return blueprint
+        entry = os.path.join(self.directory, key)
+        if os.path.isdir(entry):
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._store(entry, load_image(path), merged, path)
+        blueprint = self._loaded[key] = Blueprint(entry)
+        return blueprint
+
+    def _store(self, entry, rgb, params, source):
+        os.makedirs(self.directory, exist_ok=True)
+        result = preprocess(rgb, **params)
+        staging = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+        try:
+            for name in _MASKS:
+                np.save(os.path.join(staging, name + '.npy'), np.packbits(result[name], axis=1))
+            np.save(os.path.join(staging, 'persons.npy'), result['persons'])
+            with open(os.path.join(staging, 'meta.json'), 'w') as f:
+                json.dump({'shape': list(rgb.shape[:2]), 'params': params,
+                           'source': os.path.basename(source)}, f)
+            os.rename(staging, entry)
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.isdir(entry):
+                raise
@@ -0,0 +1,189 @@
+import numpy as np
+
+# Radii in cells. A fire blocks its 3x3 neighbourhood like pathVisual.m, and
+# a person target covers the 6x6 box pathVisual draws around it
+FIRE_RADIUS = 1.5
+PERSON_RADIUS = 3.0
+
+
+def disk_offsets(radius):
+    """(d_row, d_col, distance) of every offset within `radius` cells."""
+    reach = int(np.floor(radius))
+    span = np.arange(-reach, reach + 1)
+    d_row, d_col = np.meshgrid(span, span, indexing='ij')
+    distance = np.hypot(d_row, d_col)
+    keep = distance <= radius
+    return d_row[keep], d_col[keep], distance[keep].astype(np.float32)
+
+
+def inflate(sources, radius, window=None):
+    """Distance from each cell to the nearest source cell, inf past `radius`.
+
+    A bounded Euclidean distance transform done as one shifted minimum per
+    offset in the disk. `window` = (row0, col0, row1, col1) limits the output
+    to a sub-rectangle (sources outside it still count).
+    """
+    sources = np.asarray(sources, dtype=bool)
+    rows, cols = sources.shape
+    row0, col0, row1, col1 = window or (0, 0, rows, cols)
+    out = np.full((row1 - row0, col1 - col0), np.inf, dtype=np.float32)
+    for d_row, d_col, distance in zip(*disk_offsets(radius)):
+        # out[r, c] takes `distance` where sources[r + d_row, c + d_col]
+        top, left = max(row0, -d_row), max(col0, -d_col)
+        bottom, right = min(row1, rows - d_row), min(col1, cols - d_col)
+        if top >= bottom or left >= right:
+            continue
+        src = sources[top + d_row:bottom + d_row, left + d_col:right + d_col]
+        dst = out[top - row0:bottom - row0, left - col0:right - col0]
+        dst[src & (dst > distance)] = distance
+    return out
+
+
+class Layer:
+    """One cost-map layer: a set of source cells inflated by a radius.
+
+    `distance` holds the distance (cells) to the nearest source, inf outside
+    the inflated zone, and `zone` is the matching boolean raster, so "is this
+    cell in the zone" is one array index instead of an ismember search over
+    every affected cell. New sources are stamped into both rasters directly;
+    removing sources recomputes only the window they could have affected.
+    """
+
+    def __init__(self, shape, radius=0.0):
+        self.shape = tuple(shape)
+        self.radius = radius
+        self.sources = np.zeros(self.shape, dtype=bool)
+        self.distance = np.full(self.shape, np.inf, dtype=np.float32)
+        self.zone = np.zeros(self.shape, dtype=bool)
+        self.version = 0
+
+    def __contains__(self, cell):
+        row, col = cell
+        return bool(0 <= row < self.shape[0] and 0 <= col < self.shape[1] and self.zone[row, col])
+
+    def set(self, sources):
+        """Replace every source with a full mask."""
+        self.sources = np.array(sources, dtype=bool)
+        self.distance = inflate(self.sources, self.radius)
+        self.zone = np.isfinite(self.distance)
+        self.version += 1
+
+    def add(self, rows, cols):
+        """Add source cells; only the cells within `radius` of them change."""
+        rows, cols = self._inside(rows, cols)
+        new = ~self.sources[rows, cols]
+        rows, cols = rows[new], cols[new]
+        if not len(rows):
+            return
+        self.sources[rows, cols] = True
+        d_row, d_col, distance = disk_offsets(self.radius)
+        stamp_rows, stamp_cols, values = self._inside((rows[:, None] + d_row).ravel(),
+                                                      (cols[:, None] + d_col).ravel(),
+                                                      np.tile(distance, len(rows)))
+        np.minimum.at(self.distance, (stamp_rows, stamp_cols), values)
+        self.zone[stamp_rows, stamp_cols] = True
+        self.version += 1
+
+    def remove(self, rows, cols):
+        """Drop source cells and re-inflate the window around them."""
+        rows, cols = self._inside(rows, cols)
+        if not len(rows) or not self.sources[rows, cols].any():
+            return
+        self.sources[rows, cols] = False
+        reach = int(np.floor(self.radius))
+        window = (max(0, int(rows.min()) - reach), max(0, int(cols.min()) - reach),
+                  min(self.shape[0], int(rows.max()) + reach + 1),
+                  min(self.shape[1], int(cols.max()) + reach + 1))
+        row0, col0, row1, col1 = window
+        self.distance[row0:row1, col0:col1] = inflate(self.sources, self.radius, window)
+        self.zone[row0:row1, col0:col1] = np.isfinite(self.distance[row0:row1, col0:col1])
+        self.version += 1
+
+    def cost(self):
+        """Float raster falling from 1 on a source to 0 past the radius."""
+        return np.clip(1 - self.distance / (self.radius + 1), 0, 1)
+
+    def _inside(self, rows, cols, *extra):
+        # Drop cells off the raster, along with any matching per-cell arrays
+        rows = np.asarray(rows, dtype=np.int64).ravel()
+        cols = np.asarray(cols, dtype=np.int64).ravel()
+        keep = (rows >= 0) & (rows < self.shape[0]) & (cols >= 0) & (cols < self.shape[1])
+        return (rows[keep], cols[keep]) + tuple(e[keep] for e in extra)
+
+
+class CostMap:
+    """Static walls, fire hazards and person targets as separate layers.
+
+    Walls come from the blueprint mask (or the SLAM occupancy map); fires
+    from temperature events or the red-mask detector; people from person
+    detections. blocked() merges walls and fire zones into the obstacle mask
+    the planner expects, and is only rebuilt when a layer changed. Person
+    zones never block: they mark cells that count as having reached the
+    target.
+
+    `resolution` (cells per meter) and `origin` (world x, y of cell (0, 0))
+    let world-frame events, such as SlamPipeline poses, be added directly.
+    """
+
+    def __init__(self, walls, fire_radius=FIRE_RADIUS, person_radius=PERSON_RADIUS,
+                 wall_radius=0.0, resolution=None, origin=(0.0, 0.0)):
+        walls = np.asarray(walls, dtype=bool)
+        self.shape = walls.shape
+        self.resolution = resolution
+        self.origin = np.asarray(origin, dtype=float)
+        self.walls = Layer(self.shape, wall_radius)
+        self.fire = Layer(self.shape, fire_radius)
+        self.person = Layer(self.shape, person_radius)
+        self.walls.set(walls)
+        self._blocked = None
+
+    @property
+    def layers(self):
+        return {'walls': self.walls, 'fire': self.fire, 'person': self.person}
+
+    @property
+    def version(self):
+        # Changes whenever a layer that affects blocked() changes
+        return (self.walls.version, self.fire.version)
+
+    def world_to_cell(self, xy):
+        if self.resolution is None:
+            raise ValueError("CostMap has no resolution for world coordinates")
+        cells = np.floor((np.asarray(xy, dtype=float) - self.origin) * self.resolution).astype(np.int64)
+        return cells[..., 1], cells[..., 0]
+
+    def add_fire(self, rows, cols):
+        self.fire.add(rows, cols)
+
+    def add_fire_at(self, xy):
+        self.fire.add(*self.world_to_cell(xy))
+
+    def add_temperature_events(self, poses):
+        """Fire at the (x, y) of each SlamPipeline temperature event pose."""
+        poses = np.asarray(poses, dtype=float).reshape(-1, 3)
+        self.add_fire_at(poses[:, :2])
+
+    def add_person(self, rows, cols):
+        self.person.add(rows, cols)
+
+    def add_person_at(self, xy):
+        self.person.add(*self.world_to_cell(xy))
+
+    def blocked(self):
+        """Obstacle mask for the planner: walls plus fire zones."""
+        if self._blocked is None or self._blocked[0] != self.version:
+            mask = self.walls.zone | self.fire.zone
+            mask.setflags(write=False)
+            self._blocked = (self.version, mask)
+        return self._blocked[1]
+
+    def is_free(self, row, col):
+        """True if (row, col) is on the map, not a wall and not in a fire zone."""
+        return (0 <= row < self.shape[0] and 0 <= col < self.shape[1]
+                and not self.walls.zone[row, col] and not self.fire.zone[row, col])
+
+    def in_fire_zone(self, row, col):
+        return (row, col) in self.fire
+
+    def at_person(self, row, col):
+        return (row, col) in self.person
@@ -0,0 +1,179 @@
+import numpy as np
+
+from pose_graph import SpatialIndex
+
+# Detections of one kind closer than this (meters) are taken to be the same
+# person or fire, provided they were also close in time
+MERGE_RADIUS = {'temperature': 1.5, 'person': 1.0}
+MERGE_WINDOW = 60.0
+
+# Chance that a single positive packet is a true detection
+DETECTION_CONFIDENCE = {'temperature': 0.6, 'person': 0.5}
+
+
+class EventCluster:
+    """One person or hot spot, merged from every detection of it.
+
+    Each detection is anchored to the pose graph node it was made from
+    (plus an optional offset in that node's frame), so the position is the
+    mean of the anchors' current poses and follows re-optimization.
+    Confidence combines the detections as independent evidence.
+    """
+
+    __slots__ = ('id', 'kind', 'position', 'count', 'first_time', 'last_time', 'anchors', '_log_miss')
+
+    def __init__(self, id, kind, time):
+        self.id = id
+        self.kind = kind
+        self.position = np.zeros(2)
+        self.count = 0
+        self.first_time = time
+        self.last_time = time
+        # node -> [detections, summed offset x, summed offset y]
+        self.anchors = {}
+        self._log_miss = 0.0
+
+    @property
+    def confidence(self):
+        return 1.0 - np.exp(self._log_miss)
+
+    def to_dict(self):
+        return {'id': self.id, 'type': self.kind, 'pose': [float(v) for v in self.position],
+                'count': self.count, 'confidence': float(self.confidence),
+                'first_time': self.first_time, 'last_time': self.last_time}
+
+
+class EventStore:
+    """Temperature and person detections, deduplicated and spatially indexed.
+
+    add() looks up clusters of the same kind within `radius` that were seen
+    within `window` seconds (a SpatialIndex, so only nearby buckets are
+    visited) and folds the detection into the nearest one; otherwise it
+    starts a new cluster. A person who stays in view for hundreds of sweeps
+    is therefore one event whose count and confidence grow.
+
+    update_poses() takes the {node: pose} dict returned by
+    PoseGraph.optimize(), moves the clusters anchored to those nodes and
+    merges any that now overlap.
+    """
+
+    def __init__(self, radius=None, window=MERGE_WINDOW, cell_size=2.0):
+        self.radius = dict(MERGE_RADIUS, **(radius or {}))
+        self.window = window
+        self.clusters = {}
+        self.index = SpatialIndex(cell_size)
+        self._node_poses = {}
+        self._node_clusters = {}
+        self._positions = {}
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self.clusters)
+
+    def add(self, kind, time, node, pose, confidence=None, offset=(0.0, 0.0)):
+        """Record one detection made from graph node `node` at `pose`. Returns its cluster."""
+        if kind not in self.radius:
+            raise ValueError(f"Unknown event kind: {kind}")
+        confidence = DETECTION_CONFIDENCE[kind] if confidence is None else confidence
+        pose = np.asarray(pose, dtype=float)
+        self._node_poses[node] = pose.copy()
+        xy = _transform(pose, offset)
+
+        cluster = None
+        candidates = [self.clusters[i] for i in self.index.query(xy, self.radius[kind], self._positions)]
+        candidates = [c for c in candidates if c.kind == kind and self._in_window(c, time, time)]
+        if candidates:
+            cluster = min(candidates, key=lambda c: np.hypot(*(c.position - xy)))
+        else:
+            cluster = EventCluster(self._next_id, kind, time)
+            self._next_id += 1
+            self.clusters[cluster.id] = cluster
+
+        anchor = cluster.anchors.setdefault(node, [0, 0.0, 0.0])
+        anchor[0] += 1
+        anchor[1] += offset[0]
+        anchor[2] += offset[1]
+        self._node_clusters.setdefault(node, set()).add(cluster.id)
+        cluster.count += 1
+        cluster.first_time = min(cluster.first_time, time)
+        cluster.last_time = max(cluster.last_time, time)
+        cluster._log_miss += np.log1p(-min(confidence, 1.0 - 1e-12))
+        self._relocate(cluster)
+        return cluster
+
+    def update_poses(self, moved):
+        """Follow a pose graph optimization; `moved` maps node -> new pose."""
+        affected = set()
+        for node, pose in moved.items():
+            if node in self._node_poses:
+                self._node_poses[node] = np.asarray(pose, dtype=float).copy()
+                affected |= self._node_clusters[node]
+        for cluster_id in sorted(affected):
+            if cluster_id in self.clusters:
+                self._relocate(self.clusters[cluster_id])
+        for cluster_id in sorted(affected):
+            if cluster_id in self.clusters:
+                self._merge_neighbours(self.clusters[cluster_id])
+        return affected
+
+    def within(self, xy, radius, kind=None):
+        """Clusters within `radius` meters of xy."""
+        ids = self.index.query(xy, radius, self._positions)
+        return [self.clusters[i] for i in ids if kind is None or self.clusters[i].kind == kind]
+
+    def in_box(self, low, high, kind=None):
+        """Clusters inside the axis-aligned box low..high (world x, y)."""
+        ids = self.index.query_box(low, high, self._positions)
+        return [self.clusters[i] for i in ids if kind is None or self.clusters[i].kind == kind]
+
+    def events(self, kind=None):
+        return [c for c in self.clusters.values() if kind is None or c.kind == kind]
+
+    def positions(self, kind):
+        """(N, 2) world positions of one kind, e.g. for CostMap or RescueRouter."""
+        events = self.events(kind)
+        return np.array([c.position for c in events]).reshape(len(events), 2)
+
+    def _in_window(self, cluster, first_time, last_time):
+        if self.window is None:
+            return True
+        return (first_time - self.window <= cluster.last_time and
+                cluster.first_time - self.window <= last_time)
+
+    def _relocate(self, cluster):
+        total = np.zeros(2)
+        for node, (count, ox, oy) in cluster.anchors.items():
+            pose = self._node_poses[node]
+            c, s = np.cos(pose[2]), np.sin(pose[2])
+            total += count * pose[:2] + (c * ox - s * oy, s * ox + c * oy)
+        cluster.position = total / cluster.count
+        self._positions[cluster.id] = cluster.position
+        self.index.insert(cluster.id, cluster.position)
+
+    def _merge_neighbours(self, cluster):
+        # Optimization can pull two clusters of the same thing together
+        for other in self.within(cluster.position, self.radius[cluster.kind], cluster.kind):
+            if other is cluster or not self._in_window(other, cluster.first_time, cluster.last_time):
+                continue
+            keep, drop = (cluster, other) if cluster.id < other.id else (other, cluster)
+            for node, (count, ox, oy) in drop.anchors.items():
+                anchor = keep.anchors.setdefault(node, [0, 0.0, 0.0])
+                anchor[0] += count
+                anchor[1] += ox
+                anchor[2] += oy
+                self._node_clusters[node].discard(drop.id)
+                self._node_clusters[node].add(keep.id)
+            keep.count += drop.count
+            keep.first_time = min(keep.first_time, drop.first_time)
+            keep.last_time = max(keep.last_time, drop.last_time)
+            keep._log_miss += drop._log_miss
+            del self.clusters[drop.id]
+            del self._positions[drop.id]
+            self.index.remove(drop.id)
+            self._relocate(keep)
+            return self._merge_neighbours(keep)
+
+
+def _transform(pose, offset):
+    c, s = np.cos(pose[2]), np.sin(pose[2])
+    return np.array([pose[0] + c * offset[0] - s * offset[1], pose[1] + s * offset[0] + c * offset[1]])
@@ -0,0 +1,449 @@
+import os
+import shutil
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from ingestion import ScanPair
+from wire_protocol import NUM_READINGS, SENSOR_DTYPE, IMU_DTYPE
+
+# Fixed-width columns of each stream. Every column is its own file in a
+# segment directory, so a replay only pages in the columns it reads. `time`
+# is the host clock the row was recorded at and must not decrease.
+STREAMS = {
+    'scans': np.dtype([
+        ('time', '<f8'),
+        ('device_id', 'i1'),
+        ('range', '<i2', (NUM_READINGS,)),
+        ('angle', '<i2', (NUM_READINGS,)),
+        ('temperature', '<f4'),
+        ('timestamp', '<i4'),
+        ('person', '?'),
+        ('imu', '<i8'),  # row of the paired IMU sample, -1 if unpaired
+    ]),
+    'imu': np.dtype([
+        ('time', '<f8'),
+        ('device_id', 'i1'),
+        ('gyro_z', '<f4'),
+        ('accel_x', '<f4'),
+        ('accel_y', '<f4'),
+    ]),
+    'poses': np.dtype([
+        ('time', '<f8'),
+        ('node', '<i4'),
+        ('x', '<f8'),
+        ('y', '<f8'),
+        ('theta', '<f8'),
+    ]),
+    'events': np.dtype([
+        ('time', '<f8'),
+        ('kind', 'u1'),
+        ('x', '<f8'),
+        ('y', '<f8'),
+        ('theta', '<f8'),
+    ]),
+}
+
+EVENT_KINDS = {'temperature': 0, 'person': 1}
+
+# One entry per sealed segment of a stream, appended to <stream>/index.bin
+INDEX_DTYPE = np.dtype([
+    ('segment', '<u4'),
+    ('first_row', '<u8'),
+    ('rows', '<u8'),
+    ('start', '<f8'),
+    ('end', '<f8'),
+])
+
+SEGMENT_ROWS = 1 << 16
+
+Segment = namedtuple('Segment', ['number', 'first_row', 'rows', 'start', 'end'])
+
+
+def _segment_dir(stream_dir, number):
+    return os.path.join(stream_dir, f'{number:06d}')
+
+
+def _column_path(segment_dir, column):
+    return os.path.join(segment_dir, f'{column}.col')
+
+
+class StreamWriter:
+    """Appends rows of one stream to fixed-width column files.
+
+    Rows are collected in a small buffer and written column by column on
+    flush(). A segment is sealed (its index entry written) after
+    `segment_rows` rows, and the next row starts a new segment directory.
+    """
+
+    def __init__(self, directory, dtype, segment_rows=SEGMENT_ROWS, buffer_rows=64):
+        self.directory = directory
+        self.dtype = dtype
+        self.segment_rows = segment_rows
+        self._buffer = np.zeros(buffer_rows, dtype=dtype)
+        self._buffered = 0
+        self._files = None
+        self._segment = Segment(0, 0, 0, None, None)
+        self.rows = 0
+        self.last_time = -np.inf
+        os.makedirs(directory, exist_ok=True)
+        self._index = open(os.path.join(directory, 'index.bin'), 'ab')
+        self._resume()
+
+    def _resume(self):
+        # Continue after the last sealed segment of an existing log
+        index = FlightLog.read_index(self.directory)
+        if len(index):
+            last = index[-1]
+            self._segment = Segment(int(last['segment']) + 1, int(last['first_row'] + last['rows']),
+                                    0, None, None)
+            self.rows = self._segment.first_row
+            self.last_time = float(last['end'])
+        if os.path.isdir(_segment_dir(self.directory, self._segment.number)):
+            raise ValueError(f"Unsealed segment in {self.directory}; open it with FlightLog and repair() first")
+
+    def append(self, row):
+        """Queue one row (a dict or record of the stream's columns); returns its row number."""
+        t = float(row['time'])
+        if t < self.last_time:
+            raise ValueError(f"Time went backwards in {self.directory}: {t} < {self.last_time}")
+        record = self._buffer[self._buffered]
+        for name in self.dtype.names:
+            record[name] = row[name]
+        self._buffered += 1
+        self.last_time = t
+        number = self.rows
+        self.rows += 1
+        if self._buffered == len(self._buffer):
+            self.flush()
+        return number
+
+    def flush(self):
+        while self._buffered:
+            if self._files is None:
+                self._open_segment()
+            room = self.segment_rows - self._segment.rows
+            count = min(room, self._buffered)
+            chunk = self._buffer[:count]
+            for name in self.dtype.names:
+                f = self._files[name]
+                f.write(np.ascontiguousarray(chunk[name]).tobytes())
+                f.flush()
+            self._segment = self._segment._replace(
+                rows=self._segment.rows + count,
+                start=float(chunk['time'][0]) if self._segment.start is None else self._segment.start,
+                end=float(chunk['time'][-1]))
+            self._buffer[:self._buffered - count] = self._buffer[count:self._buffered]
+            self._buffered -= count
+            if self._segment.rows == self.segment_rows:
+                self._seal()
+
+    def _open_segment(self):
+        path = _segment_dir(self.directory, self._segment.number)
+        os.makedirs(path)
+        self._files = {name: open(_column_path(path, name), 'ab') for name in self.dtype.names}
+
+    def _seal(self):
+        for f in self._files.values():
+            f.close()
+        self._files = None
+        segment = self._segment
+        entry = np.array([(segment.number, segment.first_row, segment.rows, segment.start, segment.end)],
+                         dtype=INDEX_DTYPE)
+        self._index.write(entry.tobytes())
+        self._index.flush()
+        self._segment = Segment(segment.number + 1, segment.first_row + segment.rows, 0, None, None)
+
+    def close(self):
+        self.flush()
+        if self._files is not None:
+            self._seal()
+        self._index.close()
+
+
+class FlightLogWriter:
+    """Incremental writer of a flight log directory.
+
+    Each stream in STREAMS gets its own sub-directory of numbered segment
+    directories plus an index of sealed segments by time. Everything is
+    appended as the flight happens and flushed every `buffer_rows` rows,
+    so a crash loses at most that many rows per stream; FlightLog.repair()
+    seals whatever the last segment holds.
+    """
+
+    def __init__(self, directory, segment_rows=SEGMENT_ROWS, buffer_rows=64):
+        self.directory = directory
+        self.streams = {name: StreamWriter(os.path.join(directory, name), dtype, segment_rows, buffer_rows)
+                        for name, dtype in STREAMS.items()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, stream, **row):
+        return self.streams[stream].append(row)
+
+    def append_pair(self, pair):
+        """Log a ScanPair from IngestionService; returns the scan's row number."""
+        imu_row = -1
+        if pair.imu is not None:
+            imu = pair.imu
+            imu_row = self.append('imu', time=pair.host_time, device_id=imu['device_id'],
+                                  gyro_z=imu['gyro_z'], accel_x=imu['accel_x'], accel_y=imu['accel_y'])
+        scan = pair.scan
+        return self.append('scans', time=pair.host_time, device_id=scan['device_id'],
+                           range=scan['range'], angle=scan['angle'], temperature=scan['temperature'],
+                           timestamp=scan['timestamp'], person=scan['personDetectedFlag'], imu=imu_row)
+
+    def append_pose(self, t, node, pose):
+        return self.append('poses', time=t, node=node, x=pose[0], y=pose[1], theta=pose[2])
+
+    def append_event(self, t, kind, pose):
+        return self.append('events', time=t, kind=EVENT_KINDS[kind], x=pose[0], y=pose[1], theta=pose[2])
+
+    def flush(self):
+        for stream in self.streams.values():
+            stream.flush()
+
+    def close(self):
+        for stream in self.streams.values():
+            stream.close()
+
+
+class StreamReader:
+    """Memory-mapped columns of one stream, addressed by row or time."""
+
+    def __init__(self, directory, dtype):
+        self.directory = directory
+        self.dtype = dtype
+        self.segments = [Segment(int(e['segment']), int(e['first_row']), int(e['rows']),
+                                 float(e['start']), float(e['end']))
+                         for e in FlightLog.read_index(directory)]
+        self.sealed = len(self.segments)
+        tail = self._unsealed_segment()
+        if tail is not None:
+            self.segments.append(tail)
+        self._maps = {}
+        self._starts = np.array([s.start for s in self.segments])
+        self._first_rows = np.array([s.first_row for s in self.segments], dtype=np.int64)
+
+    def _unsealed_segment(self):
+        # A segment still being written (or cut short by a crash) has no index
+        # entry; its usable length is the shortest column
+        number = self.segments[-1].number + 1 if self.segments else 0
+        path = _segment_dir(self.directory, number)
+        if not os.path.isdir(path):
+            return None
+        rows = min((os.path.getsize(p) // self.dtype[name].itemsize if os.path.exists(p) else 0)
+                   for name in self.dtype.names for p in [_column_path(path, name)])
+        if not rows:
+            return None
+        first_row = self.segments[-1].first_row + self.segments[-1].rows if self.segments else 0
+        times = np.memmap(_column_path(path, 'time'), dtype='<f8', mode='r', shape=(rows,))
+        return Segment(number, first_row, rows, float(times[0]), float(times[-1]))
+
+    def __len__(self):
+        return self.segments[-1].first_row + self.segments[-1].rows if self.segments else 0
+
+    def time_range(self):
+        if not self.segments:
+            return None
+        return self.segments[0].start, self.segments[-1].end
+
+    def column(self, segment_index, name):
+        """Read-only memmap of one column of one segment (opened on first use)."""
+        key = (segment_index, name)
+        if key not in self._maps:
+            segment = self.segments[segment_index]
+            field = self.dtype[name]
+            self._maps[key] = np.memmap(_column_path(_segment_dir(self.directory, segment.number), name),
+                                        dtype=field.base, mode='r', shape=(segment.rows,) + field.shape)
+        return self._maps[key]
+
+    def segment_slices(self, start=-np.inf, end=np.inf, columns=None):
+        """Yield {column: view} for the rows with start <= time < end, segment by segment."""
+        columns = columns or self.dtype.names
+        first = max(int(np.searchsorted(self._starts, start, side='right')) - 1, 0)
+        for i in range(first, len(self.segments)):
+            segment = self.segments[i]
+            if segment.start >= end:
+                break
+            if segment.end < start:
+                continue
+            times = self.column(i, 'time')
+            lo = int(np.searchsorted(times, start, side='left'))
+            hi = int(np.searchsorted(times, end, side='left'))
+            if lo < hi:
+                yield {name: self.column(i, name)[lo:hi] for name in columns}
+
+    def read(self, start=-np.inf, end=np.inf, columns=None):
+        """Rows with start <= time < end as {column: array}.
+
+        Views straight into the mapped files when the range falls inside one
+        segment; a range that spans segments is concatenated.
+        """
+        columns = columns or self.dtype.names
+        parts = list(self.segment_slices(start, end, columns))
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return {name: np.empty((0,) + self.dtype[name].shape, dtype=self.dtype[name].base)
+                    for name in columns}
+        return {name: np.concatenate([part[name] for part in parts]) for name in columns}
+
+    def take(self, rows, columns=None):
+        """Rows by global row number as {column: array}."""
+        columns = columns or self.dtype.names
+        rows = np.asarray(rows, dtype=np.int64)
+        segments = np.searchsorted(self._first_rows, rows, side='right') - 1
+        out = {name: np.empty((len(rows),) + self.dtype[name].shape, dtype=self.dtype[name].base)
+               for name in columns}
+        for i in np.unique(segments):
+            mask = segments == i
+            local = rows[mask] - self._first_rows[i]
+            for name in columns:
+                out[name][mask] = self.column(int(i), name)[local]
+        return out
+
+
+class FlightLog:
+    """Read side of a flight log directory written by FlightLogWriter.
+
+    Opening only reads each stream's small segment index and sizes the
+    unsealed tail segment; column files are memory-mapped on first access
+    and sliced with a binary search on the time column, so even a
+    multi-hour flight opens instantly and a time window costs only the
+    pages it touches.
+    """
+
+    def __init__(self, directory):
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"No flight log at {directory}")
+        self.directory = directory
+        self._load()
+
+    def _load(self):
+        self.streams = {name: StreamReader(os.path.join(self.directory, name), dtype)
+                        for name, dtype in STREAMS.items()}
+
+    def __getitem__(self, stream):
+        return self.streams[stream]
+
+    @staticmethod
+    def read_index(stream_dir):
+        path = os.path.join(stream_dir, 'index.bin')
+        if not os.path.exists(path):
+            return np.empty(0, dtype=INDEX_DTYPE)
+        # Ignore a partially written last entry
+        count = os.path.getsize(path) // INDEX_DTYPE.itemsize
+        return np.fromfile(path, dtype=INDEX_DTYPE, count=count)
+
+    def time_range(self):
+        ranges = [r for r in (s.time_range() for s in self.streams.values()) if r is not None]
+        if not ranges:
+            return None
+        return min(r[0] for r in ranges), max(r[1] for r in ranges)
+
+    def read(self, stream, start=-np.inf, end=np.inf, columns=None):
+        return self.streams[stream].read(start, end, columns)
+
+    def pairs(self, start=-np.inf, end=np.inf):
+        """Replay scans in a time range as ScanPairs, for SlamPipeline or other consumers."""
+        imu_stream = self.streams['imu']
+        for part in self.streams['scans'].segment_slices(start, end):
+            imu_rows = part['imu']
+            paired = imu_rows >= 0
+            imus = imu_stream.take(imu_rows[paired]) if paired.any() else None
+            scans = np.zeros(len(imu_rows), dtype=SENSOR_DTYPE)
+            for name in ('device_id', 'range', 'angle', 'temperature', 'timestamp'):
+                scans[name] = part[name]
+            scans['personDetectedFlag'] = part['person']
+            imu_records = np.zeros(int(paired.sum()), dtype=IMU_DTYPE)
+            if imus is not None:
+                for name in IMU_DTYPE.names:
+                    imu_records[name] = imus[name]
+            j = 0
+            for i in range(len(scans)):
+                imu = None
+                if paired[i]:
+                    imu = imu_records[j]
+                    j += 1
+                yield ScanPair(float(part['time'][i]), scans[i], imu)
+
+    def repair(self):
+        """Seal the unsealed tail segment of every stream so writing can resume."""
+        for reader in self.streams.values():
+            if reader.sealed == len(reader.segments):
+                # Nothing usable was written to the tail; drop its directory
+                number = reader.segments[-1].number + 1 if reader.segments else 0
+                shutil.rmtree(_segment_dir(reader.directory, number), ignore_errors=True)
+                continue
+            segment = reader.segments[-1]
+            path = _segment_dir(reader.directory, segment.number)
+            # Drop any partial row past the shortest column
+            for column in reader.dtype.names:
+                column_path = _column_path(path, column)
+                with open(column_path, 'ab') as f:
+                    f.truncate(segment.rows * reader.dtype[column].itemsize)
+            entry = np.array([tuple(segment)], dtype=INDEX_DTYPE)
+            with open(os.path.join(reader.directory, 'index.bin'), 'ab') as f:
+                f.write(entry.tobytes())
+        self._load()
+
+
+def flight_log_consumer(writer):
+    """IngestionService consumer that logs every pair."""
+
+    def consume(pair):
+        writer.append_pair(pair)
+        return True
+
+    return consume
+
+
+def flight_log_hook(writer):
+    """SlamPipeline hook that logs the new poses and events of each step."""
+    seen = {'nodes': 0, 'temperature': 0, 'person': 0}
+
+    def hook(slam, pair, accepted):
+        poses = slam.poses
+        for node in range(seen['nodes'], slam.graph.num_nodes):
+            writer.append_pose(pair.host_time, node, poses[node])
+        seen['nodes'] = slam.graph.num_nodes
+        for kind, events in (('temperature', slam.temperature_events), ('person', slam.person_events)):
+            for pose in events[seen[kind]:]:
+                writer.append_event(pair.host_time, kind, pose)
+            seen[kind] = len(events)
+
+    return hook
+
+
+def benchmark(hours=2.0, rate=10.0, directory=None):
+    """Write `hours` of scans at `rate` Hz, then time opening and slicing the log."""
+    import tempfile
+    directory = directory or tempfile.mkdtemp(prefix='flight_log_')
+    rows = int(hours * 3600 * rate)
+    scan = np.zeros((), dtype=SENSOR_DTYPE)
+    scan['range'] = np.arange(NUM_READINGS)
+    imu = np.zeros((), dtype=IMU_DTYPE)
+
+    started = time.perf_counter()
+    with FlightLogWriter(directory) as writer:
+        for i in range(rows):
+            writer.append_pair(ScanPair(i / rate, scan, imu))
+    write_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    log = FlightLog(directory)
+    open_time = time.perf_counter() - started
+    started = time.perf_counter()
+    window = log.read('scans', 1800.0, 1860.0, columns=('time', 'range'))
+    slice_time = time.perf_counter() - started
+
+    print(f"{rows} scans ({hours} h at {rate} Hz): write {write_time:.2f} s "
+          f"({rows / write_time:.0f} rows/s), open {open_time * 1000:.2f} ms, "
+          f"60 s slice ({len(window['time'])} rows) {slice_time * 1000:.2f} ms")
+    return directory
@@ -0,0 +1,378 @@
+import asyncio
+import itertools
+import logging
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from metrics import METRICS
+from wire_protocol import StreamDecoder, FRAME_SCAN, FRAME_IMU, FRAME_PAIR, INVALID_DISTANCE
+
+# One lidar sweep with the IMU sample sent after it. `host_time` is the
+# event loop's monotonic clock when the scan arrived; `imu` is None when no
+# IMU packet showed up within the pairing window.
+ScanPair = namedtuple('ScanPair', ['host_time', 'scan', 'imu'])
+
+logger = logging.getLogger(__name__)
+
+# Names for services created without one, so their metric series stay apart
+_service_ids = itertools.count(1)
+
+DECODE_SECONDS = METRICS.histogram('ingestion_decode_seconds', "Time to decode one chunk of the receiver stream")
+QUEUE_SECONDS = METRICS.histogram('ingestion_queue_seconds', "Time from a scan's arrival until it is dispatched")
+CONSUMER_SECONDS = METRICS.histogram('ingestion_consumer_seconds', "Time all consumers spent on one scan pair")
+
+# stats() key -> (metric name, kind, help) exported by IngestionService
+_EXPORTED_STATS = {
+    'bytes_read': ('ingestion_bytes_read_total', 'counter', "Bytes read from the receiver"),
+    'frames': ('ingestion_frames_total', 'counter', "Binary frames decoded"),
+    'json_lines': ('ingestion_json_lines_total', 'counter', "JSON lines decoded"),
+    'crc_errors': ('ingestion_crc_errors_total', 'counter', "Binary frames failing their CRC"),
+    'invalid_lines': ('ingestion_invalid_lines_total', 'counter', "Lines that were neither JSON nor status text"),
+    'dropped_lines': ('receiver_dropped_packets_total', 'counter',
+                      "'Dropping packet' reports from the receiver firmware"),
+    'unpaired_scans': ('ingestion_unpaired_scans_total', 'counter', "Scans released without an IMU packet"),
+    'orphan_imus': ('ingestion_orphan_imus_total', 'counter', "IMU packets discarded without a scan"),
+    'dropped': ('ingestion_dropped_total', 'counter', "Scan pairs dropped because the ring buffer was full"),
+    'dispatched': ('ingestion_dispatched_total', 'counter', "Scan pairs handed to the consumers"),
+    'consumer_errors': ('ingestion_consumer_errors_total', 'counter', "Exceptions raised by consumers"),
+}
+
+
+class RingBuffer:
+    """Fixed-size FIFO that never grows.
+
+    When full, `overflow` decides whether the oldest queued item is evicted
+    ('drop_oldest', keeps the live map current) or the new item is refused
+    ('drop_newest'). Either way the loss is counted rather than hidden.
+    """
+
+    def __init__(self, capacity, overflow='drop_oldest'):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        if overflow not in ('drop_oldest', 'drop_newest'):
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.capacity = capacity
+        self.overflow = overflow
+        self._slots = [None] * capacity
+        self._head = 0
+        self._size = 0
+        self.pushed = 0
+        self.dropped = 0
+        self.full_events = 0
+        self.high_water = 0
+
+    def __len__(self):
+        return self._size
+
+    def push(self, item):
+        """Queue an item. Returns False if it had to be dropped."""
+        if self._size == self.capacity:
+            self.full_events += 1
+            self.dropped += 1
+            if self.overflow == 'drop_newest':
+                return False
+            self._slots[self._head] = None
+            self._head = (self._head + 1) % self.capacity
+            self._size -= 1
+        self._slots[(self._head + self._size) % self.capacity] = item
+        self._size += 1
+        self.pushed += 1
+        self.high_water = max(self.high_water, self._size)
+        return True
+
+    def pop(self):
+        """Remove and return the oldest item, or None if empty."""
+        if not self._size:
+            return None
+        item = self._slots[self._head]
+        self._slots[self._head] = None
+        self._head = (self._head + 1) % self.capacity
+        self._size -= 1
+        return item
+
+
+class PacketPairer:
+    """Pairs scan and IMU packets by host arrival time.
+
+    The transmitter sends the IMU packet right after each scan, so a scan is
+    matched with an IMU packet arriving within `window` seconds of it (in
+    either order). Scans without a partner are released unpaired once the
+    window expires; IMU packets without a scan are discarded.
+    """
+
+    def __init__(self, window=0.5):
+        self.window = window
+        self._scan = None
+        self._imu = None
+        self.paired = 0
+        self.unpaired_scans = 0
+        self.orphan_imus = 0
+
+    def add_scan(self, host_time, scan):
+        out = self.flush(host_time)
+        if self._scan is not None:
+            out.append(self._release_scan())
+        if self._imu is not None:
+            _, imu = self._imu
+            self._imu = None
+            self.paired += 1
+            out.append(ScanPair(host_time, scan, imu))
+            return out
+        self._scan = (host_time, scan)
+        return out
+
+    def add_imu(self, host_time, imu):
+        out = self.flush(host_time)
+        if self._scan is not None:
+            scan_time, scan = self._scan
+            self._scan = None
+            self.paired += 1
+            out.append(ScanPair(scan_time, scan, imu))
+            return out
+        if self._imu is not None:
+            self.orphan_imus += 1
+        self._imu = (host_time, imu)
+        return out
+
+    def flush(self, now):
+        """Release whatever has waited longer than the pairing window."""
+        out = []
+        if self._scan is not None and now - self._scan[0] > self.window:
+            out.append(self._release_scan())
+        if self._imu is not None and now - self._imu[0] > self.window:
+            self._imu = None
+            self.orphan_imus += 1
+        return out
+
+    def _release_scan(self):
+        scan_time, scan = self._scan
+        self._scan = None
+        self.unpaired_scans += 1
+        return ScanPair(scan_time, scan, None)
+
+
+def scan_dict(pair):
+    """Convert a ScanPair into the dict accepted by RoomMapper.process_scan."""
+    scan = pair.scan
+    ranges = np.asarray(scan['range'])
+    valid = ranges != INVALID_DISTANCE
+    count = int(valid.sum())
+    imu = pair.imu
+    accel_x = float(imu['accel_x']) if imu is not None else 0.0
+    accel_y = float(imu['accel_y']) if imu is not None else 0.0
+    gyro_z = float(imu['gyro_z']) if imu is not None else 0.0
+    return {
+        "timestamp": int(scan['timestamp']),
+        "dataCount": count,
+        "distances": (ranges[valid] * 10).tolist(),  # cm -> mm
+        "angles": np.asarray(scan['angle'])[valid].tolist(),
+        "accelX": [accel_x] * count,
+        "accelY": [accel_y] * count,
+        "gyroZ": [gyro_z] * count,
+        "isPassable": [True] * count,
+        "humanDetected": bool(scan['personDetectedFlag']),
+        "temperature": float(scan['temperature'])
+    }
+
+
+def process_scan_consumer(mapper):
+    """Adapt anything with a RoomMapper-style process_scan(dict) method."""
+    return lambda pair: mapper.process_scan(scan_dict(pair))
+
+
+def _configure_tty(fd, baud_rate):
+    import termios
+    import tty
+
+    tty.setraw(fd)
+    if baud_rate:
+        attrs = termios.tcgetattr(fd)
+        speed = getattr(termios, f'B{baud_rate}')
+        attrs[4] = attrs[5] = speed
+        termios.tcsetattr(fd, termios.TCSANOW, attrs)
+
+
+async def serial_source(port, baud_rate=115200, chunk_size=4096):
+    """Yield raw chunks from a serial port or pty without blocking the loop."""
+    loop = asyncio.get_running_loop()
+
+    if os.name == 'nt':
+        # No fd readiness API for COM ports on Windows: read on a thread
+        import serial
+        ser = serial.Serial(port, baud_rate, timeout=0.1)
+        try:
+            while True:
+                data = await loop.run_in_executor(None, ser.read, max(ser.in_waiting, 1))
+                if data:
+                    yield data
+        finally:
+            ser.close()
+        return
+
+    fd = os.open(port, os.O_RDONLY | os.O_NOCTTY | os.O_NONBLOCK)
+    if os.isatty(fd):
+        _configure_tty(fd, baud_rate)
+    chunks = asyncio.Queue()
+
+    def on_readable():
+        try:
+            data = os.read(fd, chunk_size)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''  # pty peer closed
+        if not data:
+            loop.remove_reader(fd)
+        chunks.put_nowait(data)
+
+    loop.add_reader(fd, on_readable)
+    try:
+        while True:
+            data = await chunks.get()
+            if not data:
+                return
+            yield data
+    finally:
+        loop.remove_reader(fd)
+        os.close(fd)
+
+
+async def file_source(path, chunk_size=4096):
+    """Yield a recorded stream from disk, a stand-in for the serial port."""
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                return
+            yield data
+            await asyncio.sleep(0)
+
+
+class IngestionService:
+    """Reads the receiver stream and hands paired scans to consumers.
+
+    The reader task decodes chunks as they arrive and queues pairs in a
+    RingBuffer; the dispatcher task drains the buffer into every consumer
+    (a callable taking a ScanPair). A slow consumer therefore costs dropped
+    scans, counted in stats(), never a stalled serial read.
+
+    The counters are exported with a `service` label set to `name` (the
+    drone id under the supervisor) until stop() is called.
+    """
+
+    def __init__(self, source, consumers=(), capacity=256, pair_window=0.5,
+                 overflow='drop_oldest', name=None):
+        self.source = source
+        self.name = name if name is not None else f'ingestion-{next(_service_ids)}'
+        self.consumers = list(consumers)
+        self.buffer = RingBuffer(capacity, overflow)
+        self.pairer = PacketPairer(pair_window)
+        self.decoder = StreamDecoder()
+        self.bytes_read = 0
+        self.dispatched = 0
+        self.consumer_errors = 0
+        self._ready = asyncio.Event()
+        self._done = False
+        METRICS.add_collector(self.collect_metrics)
+
+    async def run(self):
+        """Run until the source is exhausted and the buffer is drained."""
+        self._done = False
+        dispatcher = asyncio.create_task(self._dispatch())
+        expirer = asyncio.create_task(self._expire())
+        try:
+            await self._read()
+        finally:
+            self._done = True
+            expirer.cancel()
+            self._ready.set()
+            await dispatcher
+
+    async def _read(self):
+        loop = asyncio.get_running_loop()
+        async for chunk in self.source:
+            self.bytes_read += len(chunk)
+            now = loop.time()
+            with DECODE_SECONDS.time():
+                batch = self.decoder.feed(chunk)
+            index = {FRAME_SCAN: 0, FRAME_IMU: 0, FRAME_PAIR: 0}
+            for frame_type in batch.order:
+                i = index[frame_type]
+                index[frame_type] += 1
+                if frame_type == FRAME_PAIR:
+                    pair = batch.pairs[i]
+                    self._queue([ScanPair(now, pair['scan'], pair['imu'])])
+                elif frame_type == FRAME_SCAN:
+                    self._queue(self.pairer.add_scan(now, batch.scans[i]))
+                else:
+                    self._queue(self.pairer.add_imu(now, batch.imus[i]))
+        self._queue(self.pairer.flush(float('inf')))
+
+    async def _expire(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.pairer.window)
+            self._queue(self.pairer.flush(loop.time()))
+
+    def _queue(self, pairs):
+        for pair in pairs:
+            self.buffer.push(pair)
+        if pairs:
+            self._ready.set()
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while True:
+                pair = self.buffer.pop()
+                if pair is None:
+                    break
+                QUEUE_SECONDS.observe(loop.time() - pair.host_time)
+                with CONSUMER_SECONDS.time():
+                    for consumer in self.consumers:
+                        try:
+                            consumer(pair)
+                        except Exception:
+                            self.consumer_errors += 1
+                            logger.exception("Consumer %r failed on a scan pair", consumer)
+                self.dispatched += 1
+                # Let the reader run between scans
+                await asyncio.sleep(0)
+            if self._done and not len(self.buffer):
+                return
+
+    def stop(self):
+        """Stop exporting this service's metrics."""
+        METRICS.remove_collector(self.collect_metrics)
+
+    def stats(self):
+        return {
+            'bytes_read': self.bytes_read,
+            'frames': self.decoder.frames,
+            'json_lines': self.decoder.json_lines,
+            'crc_errors': self.decoder.crc_errors,
+            'invalid_lines': self.decoder.invalid_lines,
+            'dropped_lines': self.decoder.dropped_lines,
+            'paired': self.pairer.paired,
+            'unpaired_scans': self.pairer.unpaired_scans,
+            'orphan_imus': self.pairer.orphan_imus,
+            'queued': self.buffer.pushed,
+            'dropped': self.buffer.dropped,
+            'buffer_full_events': self.buffer.full_events,
+            'buffer_high_water': self.buffer.high_water,
+            'dispatched': self.dispatched,
+            'consumer_errors': self.consumer_errors,
+        }
+
+    def collect_metrics(self):
+        """stats() as [(name, kind, help, value)] for the metrics registry."""
+        stats = self.stats()
+        labels = {'service': self.name}
+        out = [(name, kind, help, stats[key], labels) for key, (name, kind, help) in _EXPORTED_STATS.items()]
+        out.append(('ingestion_buffer_depth', 'gauge', "Scan pairs waiting in the ring buffer", len(self.buffer),
+                    labels))
+        return out
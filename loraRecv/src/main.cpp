@@ -14,6 +14,15 @@
 #define RESET    12
 #define BUSY     13
 
+// Set to 1 to forward packets as CRC-checked binary frames instead of JSON
+// lines (see wire_protocol.py for the host-side decoder)
+#define BINARY_FRAMES 0
+
+#define FRAME_SYNC_0 0xAA
+#define FRAME_SYNC_1 0x55
+#define FRAME_SCAN   1
+#define FRAME_IMU    2
+
 
 struct sensor_data {
   int8_t device_id;
@@ -62,6 +71,30 @@ void setFlag(void) {
   receivedFlag = true;
 }
 
+// CRC-16/CCITT-FALSE, continued from a previous value
+uint16_t crc16(const uint8_t *data, size_t length, uint16_t crc = 0xFFFF) {
+  for (size_t i = 0; i < length; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (int bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+// Write one frame: sync, type, length (LE), payload, crc16 (LE)
+void writeFrame(uint8_t type, const uint8_t *payload, uint16_t length) {
+  uint8_t header[5] = {FRAME_SYNC_0, FRAME_SYNC_1, type,
+                       (uint8_t)(length & 0xFF), (uint8_t)(length >> 8)};
+  uint16_t crc = crc16(header + 2, 3);
+  crc = crc16(payload, length, crc);
+  uint8_t trailer[2] = {(uint8_t)(crc & 0xFF), (uint8_t)(crc >> 8)};
+
+  Serial.write(header, sizeof(header));
+  Serial.write(payload, length);
+  Serial.write(trailer, sizeof(trailer));
+}
+
 void setup(){
 
     Serial.begin(115200);  // Initalize serial port
@@ -100,7 +133,43 @@ void setup(){
   }
 }
 
+// Forward a single packet as soon as it arrives. Scan and IMU packets are
+// paired by the host (ingestion.py), so nothing here waits on the radio.
+void forwardPacket() {
+  size_t length = radio.getPacketLength();
+
+  if (length == sizeof(packet1.buffer)) {
+    int state = radio.readData(packet1.buffer, sizeof(packet1.buffer));
+    if (state == RADIOLIB_ERR_NONE && packet1.data.device_id == 1) {
+      writeFrame(FRAME_SCAN, packet1.buffer, sizeof(packet1.buffer));
+      return;
+    }
+  }
+
+  else if (length == sizeof(packet2.buffer)) {
+    int state = radio.readData(packet2.buffer, sizeof(packet2.buffer));
+    if (state == RADIOLIB_ERR_NONE && packet2.data.device_id == 2) {
+      writeFrame(FRAME_IMU, packet2.buffer, sizeof(packet2.buffer));
+      return;
+    }
+  }
+
+  else {
+    // Clear the unexpected packet from the radio buffer
+    uint8_t scratch[256];
+    radio.readData(scratch, min(length, sizeof(scratch)));
+  }
+
+  Serial.println("Packet invalid or unknown ID. Dropping packet.");
+}
+
 void loop() {
+#if BINARY_FRAMES
+  if (receivedFlag) {
+    receivedFlag = false;
+    forwardPacket();
+  }
+#else
   if (receivedFlag) {
     // Reset flag
     receivedFlag = false;
@@ -157,4 +226,5 @@ void loop() {
       Serial.println("First packet invalid or not ID1. Dropping packet.");
     }
   }
-}
+#endif
+}
\ No newline at end of file
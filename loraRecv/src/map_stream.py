@@ -0,0 +1,220 @@
+import base64
+import json
+import threading
+import zlib
+from collections import deque, namedtuple
+
+import numpy as np
+
+from metrics import METRICS
+
+UPDATE_SECONDS = METRICS.histogram('map_stream_update_seconds', "Encoding and publishing one live map delta")
+TILES_SENT = METRICS.counter('map_stream_tiles_total', "Tiles published in live map deltas")
+
+StreamMessage = namedtuple('StreamMessage', ['seq', 'data'])
+
+
+def encode_tile(data, previous=None):
+    """zlib-compressed XOR of a tile against the client's previous copy, as base64."""
+    raw = np.ascontiguousarray(data).view(np.uint8)
+    if previous is not None:
+        raw = raw ^ np.ascontiguousarray(previous).view(np.uint8)
+    return base64.b64encode(zlib.compress(raw.tobytes(), 6)).decode('ascii')
+
+
+def decode_tile(encoded, size, previous=None):
+    """Inverse of encode_tile: the new int8 tile."""
+    raw = np.frombuffer(zlib.decompress(base64.b64decode(encoded)), dtype=np.uint8)
+    if previous is not None:
+        raw = raw ^ np.ascontiguousarray(previous).view(np.uint8).reshape(-1)
+    return raw.view(np.int8).reshape(size, size)
+
+
+def sse_format(message, event='map'):
+    return f"id: {message.seq}\nevent: {event}\ndata: {message.data}\n\n"
+
+
+class MapStream:
+    """Sequence of map deltas shared by every client following a flight.
+
+    update() is called by the producer after each SLAM step. It looks up the
+    tiles the OccupancyGrid wrote since the previous update, XORs each
+    against the copy last sent and zlib-compresses the result. Unchanged
+    cells XOR to zero, so a tile where a handful of cells moved compresses
+    to a few dozen bytes. The message (tiles, latest pose, new events) is
+    serialized once with the next sequence number and kept in a short
+    history, so serving N clients costs N socket writes, not N encodes.
+
+    A client passes the last sequence number it applied. If that is still in
+    the history it gets the messages after it; otherwise (first connect, or
+    fell too far behind) it gets a snapshot of every tile against zeros.
+    Tile deltas are only meaningful applied in order.
+    """
+
+    def __init__(self, grid=None, history=256):
+        self.seq = 0
+        self._history = deque(maxlen=history)
+        self._sent = {}
+        self._revision = 0
+        self._pose = None
+        self._snapshot = None
+        self._condition = threading.Condition()
+        self.grid = None
+        if grid is not None:
+            self.attach(grid)
+
+    def attach(self, grid):
+        """Follow a (new) OccupancyGrid; clients are resynchronized with a snapshot."""
+        with self._condition:
+            self.grid = grid
+            self._sent = {}
+            self._revision = 0
+            self._history.clear()
+            self._snapshot = None
+            self.seq += 1
+            self._condition.notify_all()
+
+    def _header(self):
+        return {'seq': self.seq,
+                'resolution': self.grid.resolution if self.grid is not None else None,
+                'tile_size': self.grid.tiles.tile_size if self.grid is not None else None}
+
+    def update(self, pose=None, events=()):
+        """Publish changed tiles, the latest pose and new events. Returns the message."""
+        with self._condition, UPDATE_SECONDS.time():
+            tiles = []
+            if self.grid is not None:
+                store = self.grid.tiles
+                for key in store.dirty_tiles(self._revision):
+                    data = store.tiles[key].data.copy()
+                    tiles.append({'key': list(key), 'data': encode_tile(data, self._sent.get(key))})
+                    self._sent[key] = data
+                self._revision = store.revision
+                TILES_SENT.inc(len(tiles))
+            if pose is not None:
+                self._pose = [float(v) for v in pose]
+            if not tiles and pose is None and not events:
+                return None
+
+            self.seq += 1
+            body = self._header()
+            body.update({'delta': True, 'tiles': tiles, 'pose': self._pose,
+                         'events': [dict(event) for event in events]})
+            message = StreamMessage(self.seq, json.dumps(body, separators=(',', ':')))
+            self._history.append(message)
+            self._condition.notify_all()
+            return message
+
+    def snapshot(self):
+        """Every tile as last published, encoded against zeros."""
+        with self._condition:
+            if self._snapshot is None or self._snapshot.seq != self.seq:
+                body = self._header()
+                body.update({'delta': False, 'pose': self._pose, 'events': [],
+                             'tiles': [{'key': list(key), 'data': encode_tile(data)}
+                                       for key, data in self._sent.items()]})
+                self._snapshot = StreamMessage(self.seq, json.dumps(body, separators=(',', ':')))
+            return self._snapshot
+
+    def messages_since(self, seq):
+        """Messages a client at `seq` needs to catch up (a snapshot if it cannot)."""
+        with self._condition:
+            if seq is not None and seq == self.seq:
+                return []
+            if seq is not None and self._history and self._history[0].seq <= seq + 1 <= self.seq:
+                return [m for m in self._history if m.seq > seq]
+            return [self.snapshot()]
+
+    def wait(self, seq, timeout=None):
+        """Block until a message after `seq` exists; returns False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.seq != seq, timeout)
+
+    def follow(self, seq=None, keepalive=15.0):
+        """Generator of Server-Sent Events text, for a streaming HTTP response."""
+        while True:
+            messages = self.messages_since(seq)
+            for message in messages:
+                yield sse_format(message)
+                seq = message.seq
+            if not self.wait(seq, keepalive):
+                yield ": keepalive\n\n"
+
+
+def stream_hook(stream):
+    """SlamPipeline hook that publishes each step to a MapStream."""
+    seen = {'temperature': 0, 'person': 0}
+
+    def hook(slam, pair, accepted):
+        if stream.grid is not slam.grid:
+            stream.attach(slam.grid)
+        events = []
+        for kind, poses in (('temperature', slam.temperature_events), ('person', slam.person_events)):
+            for pose in poses[seen[kind]:]:
+                events.append({'type': kind, 'pose': [float(v) for v in pose]})
+            seen[kind] = len(poses)
+        pose = slam.poses[-1] if slam.graph.num_nodes else None
+        stream.update(pose, events)
+
+    return hook
+
+
+class SharedMapFeed:
+    """Keeps a MapStream current from a SharedMap, in a process that does not run SLAM.
+
+    poll() publishes the tiles, latest pose and newly detected events of
+    the latest snapshot once its generation moves on; a new epoch (the
+    SLAM process started a new grid) re-attaches the stream, so clients
+    resynchronize from a snapshot. start() polls every `interval` seconds
+    from a daemon thread.
+    """
+
+    def __init__(self, shared, stream, interval=0.1):
+        from shared_map import SharedGrid
+
+        self.shared = shared
+        self.stream = stream
+        self.interval = interval
+        self.grid = SharedGrid(shared)
+        self._generation = 0
+        self._epoch = None
+        self._sent_events = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll(self):
+        """Publish the latest snapshot if it is new; returns the message, if any."""
+        with self._lock:
+            snapshot = self.shared.snapshot()
+            if snapshot is None or snapshot.generation == self._generation:
+                return None
+            if snapshot.epoch != self._epoch or self.stream.grid is not self.grid:
+                self.stream.attach(self.grid)
+                self._epoch = snapshot.epoch
+                self._sent_events = set()
+            self._generation = snapshot.generation
+            pose = snapshot.poses[-1].tolist() if len(snapshot.poses) else None
+            # Clients append events, so each merged event goes out once
+            events = [event for event in snapshot.event_dicts() if event['id'] not in self._sent_events]
+            self._sent_events.update(event['id'] for event in events)
+            del snapshot
+            return self.stream.update(pose, events)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except RuntimeError:
+                # The writer kept lapping the reader; try again next time
+                continue
@@ -41,6 +41,8 @@ class MatlabControl:
         font = pygame.font.Font(None, 36)
         start_button = pygame.Rect(100, 60, 120, 50)
         stop_button = pygame.Rect(280, 60, 120, 50)
+        # Cap the redraw rate; the window is static between clicks
+        clock = pygame.time.Clock()
 
         while self.running:
             screen.fill((30, 30, 30))
@@ -65,6 +67,7 @@ class MatlabControl:
                         self.matlab_running = False
 
             pygame.display.flip()
+            clock.tick(30)
 
         pygame.quit()
 
@@ -0,0 +1,275 @@
+import bisect
+import os
+import threading
+import time
+import weakref
+from contextlib import nullcontext
+
+# Latency buckets (seconds) from 100 µs to 10 s, roughly 2.5x apart
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+_NULL_TIMER = nullcontext()
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Timer:
+    """Context manager that observes its duration into a histogram."""
+
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, registry, name, help, labels=None):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.label_values = labels or {}
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        """The child series with these label values (created on first use)."""
+        key = tuple(sorted(labels.items()))
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._child(dict(key)))
+        return child
+
+    def _series(self):
+        # This metric itself when it was ever touched, plus its labelled children
+        series = [self] if self._used() else []
+        return series + [self._children[key] for key in sorted(self._children)]
+
+
+class Counter(_Metric):
+    """Monotonic count, e.g. packets dropped."""
+
+    kind = 'counter'
+
+    def __init__(self, registry, name, help, labels=None):
+        super().__init__(registry, name, help, labels)
+        self.value = 0
+
+    def _child(self, labels):
+        return Counter(self.registry, self.name, self.help, labels)
+
+    def _used(self):
+        return self.value or not self._children
+
+    def inc(self, amount=1):
+        if self.registry.enabled:
+            with self._lock:
+                self.value += amount
+
+    def _lines(self):
+        return [f'{self.name}{_label_text(s.label_values)} {_number(s.value)}' for s in self._series()]
+
+
+class Gauge(Counter):
+    """Value that goes up and down, e.g. queue depth."""
+
+    kind = 'gauge'
+
+    def _child(self, labels):
+        return Gauge(self.registry, self.name, self.help, labels)
+
+    def set(self, value):
+        if self.registry.enabled:
+            self.value = value
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observations, e.g. stage latency in seconds."""
+
+    kind = 'histogram'
+
+    def __init__(self, registry, name, help, labels=None, buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, help, labels)
+        self.buckets = tuple(buckets)
+        # The last slot counts observations above the largest bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def _child(self, labels):
+        return Histogram(self.registry, self.name, self.help, labels, self.buckets)
+
+    def _used(self):
+        return self.count or not self._children
+
+    def observe(self, value):
+        if self.registry.enabled:
+            i = bisect.bisect_left(self.buckets, value)
+            with self._lock:
+                self.counts[i] += 1
+                self.sum += value
+                self.count += 1
+
+    def time(self):
+        """`with histogram.time():` records the block's wall-clock duration."""
+        return _Timer(self) if self.registry.enabled else _NULL_TIMER
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (None if empty)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        running = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            running += count
+            if running >= target:
+                return bound
+        return float('inf')
+
+    def _lines(self):
+        lines = []
+        for s in self._series():
+            with s._lock:
+                counts, total, count = list(s.counts), s.sum, s.count
+            running = 0
+            for bound, n in zip(s.buckets + (float('inf'),), counts):
+                running += n
+                labels = dict(s.label_values, le=_number(float(bound)))
+                lines.append(f'{self.name}_bucket{_label_text(labels)} {running}')
+            lines.append(f'{self.name}_sum{_label_text(s.label_values)} {_number(total)}')
+            lines.append(f'{self.name}_count{_label_text(s.label_values)} {count}')
+        return lines
+
+
+class Metrics:
+    """Registry of counters, gauges and histograms, exported as Prometheus text.
+
+    Hot paths hold a metric object and call inc()/observe()/time(); with
+    `enabled` off each call is a single attribute check and time() hands
+    back a shared no-op context. Values other components already count
+    (decoder CRC errors, ring buffer drops, ...) are not duplicated: a
+    collector registered with add_collector() reports them at scrape time,
+    and samples of the same name and labels from several collectors are
+    summed.
+    """
+
+    def __init__(self, enabled=True, prefix='hexit_'):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, **kwargs):
+        name = self.prefix + name
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(self, name, help, **kwargs)
+            elif not isinstance(metric, cls) or metric.kind != cls.kind:
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help=''):
+        return self._get(Counter, name, help)
+
+    def gauge(self, name, help=''):
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name, help='', buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def add_collector(self, collect):
+        """Register a callable returning [(name, kind, help, value[, labels])] at scrape time.
+
+        Bound methods are held weakly, so a collector goes away with its object.
+        """
+        ref = weakref.WeakMethod(collect) if hasattr(collect, '__self__') else (lambda: collect)
+        with self._lock:
+            self._collectors.append(ref)
+
+    def remove_collector(self, collect):
+        """Unregister a collector added with add_collector()."""
+        with self._lock:
+            self._collectors = [ref for ref in self._collectors if ref() not in (None, collect)]
+
+    def _collected(self):
+        totals = {}
+        with self._lock:
+            self._collectors = [ref for ref in self._collectors if ref() is not None]
+            collectors = [ref() for ref in self._collectors]
+        for collect in collectors:
+            if collect is None:
+                continue
+            for name, kind, help, value, *labels in collect():
+                entry = totals.setdefault(self.prefix + name, [kind, help, {}])
+                key = tuple(labels[0].items()) if labels and labels[0] else ()
+                entry[2][key] = entry[2].get(key, 0) + value
+        return totals
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        for name, metric in metrics:
+            series = metric._lines()
+            if not series:
+                continue
+            lines.append(f'# HELP {name} {metric.help}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            lines.extend(series)
+        for name, (kind, help, values) in sorted(self._collected().items()):
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(f'{name}{_label_text(dict(key))} {_number(value)}' for key, value in sorted(values.items()))
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry; HEXIT_METRICS=0 starts with instrumentation off
+METRICS = Metrics(enabled=os.getenv('HEXIT_METRICS', '1') not in ('0', 'false', 'off'))
+
+
+def benchmark(calls=200000):
+    """Per-call overhead (ns) of a timed block with metrics on and off."""
+    registry = Metrics()
+    histogram = registry.histogram('benchmark_seconds')
+    out = {}
+    for enabled in (True, False):
+        registry.enabled = enabled
+        started = time.perf_counter()
+        for _ in range(calls):
+            with histogram.time():
+                pass
+        out['enabled_ns' if enabled else 'disabled_ns'] = (time.perf_counter() - started) / calls * 1e9
+    started = time.perf_counter()
+    for _ in range(calls):
+        pass
+    out['empty_loop_ns'] = (time.perf_counter() - started) / calls * 1e9
+    return out
+
+
+if __name__ == '__main__':
+    print(benchmark())
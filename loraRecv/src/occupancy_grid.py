@@ -0,0 +1,166 @@
+import numpy as np
+
+from tiled_map import TiledMap, TILE_SIZE, LOG_ODDS_SCALE, quantize
+
+# Inverse sensor model, as log-odds of MATLAB's insertRay defaults
+# (free 0.4, occupied 0.7)
+LOG_ODDS_MISS = float(np.log(0.4 / 0.6))
+LOG_ODDS_HIT = float(np.log(0.7 / 0.3))
+
+# Cell keys pack (row, col) into one int64 so a scan's cells can be uniqued
+_KEY_OFFSET = 1 << 30
+
+
+def to_probability(log_odds):
+    return 1.0 - 1.0 / (1.0 + np.exp(log_odds))
+
+
+def _cell_keys(rows, cols):
+    return ((rows + _KEY_OFFSET) << 32) | (cols + _KEY_OFFSET)
+
+
+def _key_cells(keys):
+    return (keys >> 32) - _KEY_OFFSET, (keys & 0xFFFFFFFF) - _KEY_OFFSET
+
+
+class OccupancyGrid:
+    """Log-odds occupancy grid updated one scan at a time.
+
+    Replaces rebuilding an occupancyMap from every historical scan after each
+    accepted scan. A new scan is ray cast once (all beams in one batch) and
+    added to the grid; the cells it touched are remembered so that, when pose
+    graph optimization moves its pose, the scan can be retracted and
+    re-inserted. Scans whose poses did not move are never touched again, so
+    the cost per scan does not grow with flight length.
+
+    Cells live in a TiledMap, so the grid has no fixed extent: cell (row, col)
+    covers world x in [col/res, (col+1)/res) and y in [row/res, (row+1)/res),
+    and tiles are allocated as the drone explores. Retraction is exact unless
+    a cell hit the int8 saturation limit in between.
+    """
+
+    def __init__(self, resolution=20, max_range=8.0, hit=LOG_ODDS_HIT, miss=LOG_ODDS_MISS,
+                 tile_size=TILE_SIZE):
+        self.resolution = resolution
+        self.max_range = max_range
+        self.hit = quantize(hit)
+        self.miss = quantize(miss)
+        self.tiles = TiledMap(tile_size)
+        self._scans = {}
+
+    def __len__(self):
+        return len(self._scans)
+
+    def __contains__(self, scan_id):
+        return scan_id in self._scans
+
+    @property
+    def version(self):
+        return self.tiles.revision
+
+    def world_to_cell(self, xy):
+        """World coordinates (..., 2) to integer (row, col) arrays."""
+        cells = np.floor(np.asarray(xy, dtype=float) * self.resolution).astype(np.int64)
+        return cells[..., 1], cells[..., 0]
+
+    def cell_to_world(self, rows, cols):
+        """Centers of the given cells in world coordinates."""
+        x = (np.asarray(cols) + 0.5) / self.resolution
+        y = (np.asarray(rows) + 0.5) / self.resolution
+        return np.stack([x, y], axis=-1)
+
+    def cast_rays(self, pose, ranges, angles):
+        """Ray cast all beams of a scan at once.
+
+        `ranges` are in meters and `angles` in radians in the sensor frame.
+        Returns packed keys of the free and occupied cells, each listed once.
+        Beams at or beyond max_range only clear space, like insertRay.
+        """
+        pose = np.asarray(pose, dtype=float)
+        ranges = np.asarray(ranges, dtype=float)
+        angles = np.asarray(angles, dtype=float)
+        keep = np.isfinite(ranges) & (ranges > 0)
+        ranges = ranges[keep]
+        angles = angles[keep] + pose[2]
+        if not len(ranges):
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+
+        is_hit = ranges < self.max_range
+        ranges = np.minimum(ranges, self.max_range)
+        directions = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+
+        # Sample every beam at half-cell steps; samples past a beam's end are masked
+        step = 0.5 / self.resolution
+        t = np.arange(0.0, ranges.max(), step)
+        inside = t[None, :] < ranges[:, None]
+        samples = pose[:2] + t[None, :, None] * directions[:, None, :]
+        free = _cell_keys(*self.world_to_cell(samples[inside]))
+
+        endpoints = pose[:2] + ranges[is_hit, None] * directions[is_hit]
+        occupied = np.unique(_cell_keys(*self.world_to_cell(endpoints)))
+        free = np.setdiff1d(free, occupied)
+        return free, occupied
+
+    def _apply(self, free, occupied, sign):
+        self.tiles.add(*_key_cells(free), sign * self.miss)
+        self.tiles.add(*_key_cells(occupied), sign * self.hit)
+
+    def insert_scan(self, scan_id, pose, ranges, angles):
+        """Add a scan taken at `pose` = (x, y, theta)."""
+        if scan_id in self._scans:
+            self.remove_scan(scan_id)
+        pose = np.asarray(pose, dtype=float)
+        free, occupied = self.cast_rays(pose, ranges, angles)
+        self._apply(free, occupied, 1)
+        self._scans[scan_id] = (pose, np.asarray(ranges, dtype=float),
+                                np.asarray(angles, dtype=float), free, occupied)
+
+    def remove_scan(self, scan_id):
+        """Retract a previously inserted scan."""
+        _, _, _, free, occupied = self._scans.pop(scan_id)
+        self._apply(free, occupied, -1)
+
+    def pose(self, scan_id):
+        return self._scans[scan_id][0]
+
+    def update_poses(self, poses, translation_tol=0.01, angle_tol=0.005):
+        """Re-insert only the scans whose optimized pose moved.
+
+        `poses` maps scan id to its new (x, y, theta). Returns the ids of the
+        scans that were moved.
+        """
+        moved = []
+        for scan_id, new_pose in poses.items():
+            entry = self._scans.get(scan_id)
+            if entry is None:
+                continue
+            old_pose, ranges, angles, _, _ = entry
+            new_pose = np.asarray(new_pose, dtype=float)
+            dtheta = np.arctan2(np.sin(new_pose[2] - old_pose[2]), np.cos(new_pose[2] - old_pose[2]))
+            if np.hypot(*(new_pose[:2] - old_pose[:2])) > translation_tol or abs(dtheta) > angle_tol:
+                self.remove_scan(scan_id)
+                self.insert_scan(scan_id, new_pose, ranges, angles)
+                moved.append(scan_id)
+        return moved
+
+    def log_odds_at(self, xy):
+        """Log-odds of the cells containing the given world points."""
+        return self.tiles.get(*self.world_to_cell(xy)) * LOG_ODDS_SCALE
+
+    def log_odds(self, bounds=None):
+        """Dense log-odds over `bounds` (cells) or everything mapped so far.
+
+        Returns the array and the world (x, y) of its lower-left corner.
+        """
+        data, (row, col) = self.tiles.to_dense(bounds)
+        return data * np.float32(LOG_ODDS_SCALE), (col / self.resolution, row / self.resolution)
+
+    def occupancy(self, bounds=None):
+        """Occupancy probabilities and the world origin of the array."""
+        log_odds, origin = self.log_odds(bounds)
+        return to_probability(log_odds), origin
+
+    def occupied_mask(self, threshold=0.65, bounds=None):
+        probability, origin = self.occupancy(bounds)
+        return probability > threshold, origin
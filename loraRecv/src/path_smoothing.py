@@ -0,0 +1,210 @@
+import time
+from collections import namedtuple
+
+import numpy as np
+
+SmoothResult = namedtuple('SmoothResult', [
+    'points', 'seconds', 'removed', 'length_before', 'length_after'])
+
+# Bound on (segments x crossings) handled in one vectorized batch
+_BATCH_CELLS = 1 << 21
+
+
+def path_length(points):
+    points = np.asarray(points, dtype=float)
+    return float(np.hypot(*np.diff(points, axis=0).T).sum()) if len(points) > 1 else 0.0
+
+
+def line_of_sight(blocked, starts, ends):
+    """For each segment starts[k] -> ends[k] (row, col), True if no blocked cell is touched.
+
+    Points use cell-centred coordinates: cell (r, c) spans [r - 0.5, r + 0.5)
+    and so on. Every segment is tested against its full supercover at once:
+    each crossing of a grid line contributes the cells on both sides of it,
+    and both off-diagonal cells when it passes exactly through a corner, so
+    a line may not squeeze between two diagonally touching obstacles. Cells
+    off the map count as blocked.
+    """
+    blocked = np.asarray(blocked, dtype=bool)
+    starts = np.atleast_2d(np.asarray(starts, dtype=float))
+    ends = np.atleast_2d(np.asarray(ends, dtype=float))
+    starts, ends = np.broadcast_arrays(starts, ends)
+    # A blocked border, so clamped off-map cells need no bounds test
+    padded = np.ones((blocked.shape[0] + 2, blocked.shape[1] + 2), dtype=bool)
+    padded[1:-1, 1:-1] = blocked
+    out = np.empty(len(starts), dtype=bool)
+    total = np.cumsum(np.abs(ends - starts).sum(axis=1) + 2)
+    first = 0
+    while first < len(starts):
+        # Grow the batch until it reaches the cell budget
+        used = total[first - 1] if first else 0.0
+        last = max(first + 1, int(np.searchsorted(total, used + _BATCH_CELLS)))
+        out[first:last] = _line_of_sight(padded, starts[first:last], ends[first:last])
+        first = last
+    return out
+
+
+def _line_of_sight(padded, a, b):
+    a = a + 0.5
+    b = b + 0.5
+    d = b - a
+    lo = np.floor(np.minimum(a, b)) + 1
+    hi = np.ceil(np.maximum(a, b)) - 1
+    counts = np.maximum(hi - lo + 1, 0).astype(np.int64)
+
+    # One entry per grid-line crossing, for both axes: owning segment and t
+    owner, t = [], []
+    for axis in (0, 1):
+        n = counts[:, axis]
+        segment = np.repeat(np.arange(len(a)), n)
+        step = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        t.append((lo[segment, axis] + step - a[segment, axis]) / d[segment, axis])
+        owner.append(segment)
+    crossing = np.concatenate(owner)
+    t = np.concatenate(t)[:, None]
+
+    # The cell entered at each crossing, plus the two off-diagonal cells
+    # that matter when the crossing is exactly a corner
+    delta = 1e-9
+    before = _padded_cells(padded, a[crossing] + (t - delta) * d[crossing])
+    after = _padded_cells(padded, a[crossing] + (t + delta) * d[crossing])
+    width = padded.shape[1]
+    flat = padded.reshape(-1)
+    hit = (flat[after[:, 0] * width + after[:, 1]]
+           | flat[before[:, 0] * width + after[:, 1]]
+           | flat[after[:, 0] * width + before[:, 1]])
+    clear = np.ones(len(a), dtype=bool)
+    clear[crossing[hit]] = False
+    first = _padded_cells(padded, a)
+    clear &= ~flat[first[:, 0] * width + first[:, 1]]
+    return clear
+
+
+def _padded_cells(padded, points):
+    # Cell-corner coordinates to indices into the padded grid, clamped to its border
+    cells = np.floor(points).astype(np.int64) + 1
+    np.clip(cells[:, 0], 0, padded.shape[0] - 1, out=cells[:, 0])
+    np.clip(cells[:, 1], 0, padded.shape[1] - 1, out=cells[:, 1])
+    return cells
+
+
+def shortcut_greedy(blocked, points, lookahead=64):
+    """Indices kept by jumping from each kept point to the farthest point it sees.
+
+    Visibility to the next `lookahead` points is checked in one batch; the
+    window moves on while everything in it is visible.
+    """
+    n = len(points)
+    keep = [0]
+    i = 0
+    while i < n - 1:
+        best = i + 1
+        lo = i + 1
+        while lo < n:
+            hi = min(n, lo + lookahead)
+            visible = line_of_sight(blocked, points[i], points[lo:hi])
+            bad = np.flatnonzero(~visible)
+            if bad.size:
+                best = max(best, lo + int(bad[0]) - 1)
+                break
+            best = hi - 1
+            lo = hi
+        keep.append(best)
+        i = best
+    return keep
+
+
+def shortcut_any_angle(blocked, points, window=32):
+    """Indices of the shortest chain of mutually visible path points.
+
+    Like Theta*'s parent-of-parent test, but as a post-process: every pair of
+    points at most `window` apart along the path is checked for line of
+    sight in one batch, and a dynamic program picks the cheapest chain. The
+    result is never longer than the greedy one within the same window, but
+    costs window x path length line checks, so greedy is the fast default.
+    """
+    n = len(points)
+    offsets = np.arange(1, min(window, n - 1) + 1)
+    first = np.concatenate([np.arange(n - o) for o in offsets])
+    second = np.concatenate([np.arange(o, n) for o in offsets])
+    visible = line_of_sight(blocked, points[first], points[second])
+    length = np.hypot(*(points[second] - points[first]).T)
+    # Adjacent points always link, so the chain can never get stuck
+    visible |= second - first == 1
+    first, second, length = first[visible], second[visible], length[visible]
+    order = np.argsort(second, kind='stable')
+    first, second, length = first[order], second[order], length[order]
+    bounds = np.searchsorted(second, np.arange(n + 1))
+
+    cost = np.full(n, np.inf)
+    parent = np.zeros(n, dtype=np.int64)
+    cost[0] = 0.0
+    for j in range(1, n):
+        lo, hi = bounds[j], bounds[j + 1]
+        candidates = cost[first[lo:hi]] + length[lo:hi]
+        best = int(np.argmin(candidates))
+        cost[j] = candidates[best]
+        parent[j] = first[lo + best]
+
+    keep = [n - 1]
+    while keep[-1]:
+        keep.append(int(parent[keep[-1]]))
+    return keep[::-1]
+
+
+def resample(points, spacing, spline=False):
+    """Points every `spacing` cells along a polyline, or a Catmull-Rom spline through it."""
+    points = np.asarray(points, dtype=float)
+    if len(points) < 2:
+        return points.copy()
+    if not spline or len(points) < 3:
+        # Per segment, so corners of the polyline are kept exactly
+        out = [points[:1]]
+        for p1, p2 in zip(points[:-1], points[1:]):
+            count = max(1, int(np.ceil(np.hypot(*(p2 - p1)) / spacing)))
+            t = (np.arange(1, count + 1) / count)[:, None]
+            out.append(p1 + (p2 - p1) * t)
+        return np.vstack(out)
+
+    padded = np.vstack([2 * points[0] - points[1], points, 2 * points[-1] - points[-2]])
+    out = [points[:1]]
+    for k in range(len(points) - 1):
+        p0, p1, p2, p3 = padded[k:k + 4]
+        count = max(1, int(np.ceil(np.hypot(*(p2 - p1)) / spacing)))
+        t = (np.arange(1, count + 1) / count)[:, None]
+        out.append(0.5 * (2 * p1 + (p2 - p0) * t + (2 * p0 - 5 * p1 + 4 * p2 - p3) * t ** 2
+                          + (3 * p1 - p0 - 3 * p2 + p3) * t ** 3))
+    return np.vstack(out)
+
+
+def smooth_path(blocked, cells, method='greedy', spacing=None, spline=False, window=None):
+    """Shortcut a grid path and optionally resample it.
+
+    Replaces shpath's iterative string tightening. `cells` is an (N, 2)
+    (row, col) path such as Route.cells; `method` is 'greedy' or
+    'any_angle'. With `spacing`, the shortcut path is resampled every
+    `spacing` cells, through a spline if `spline` is set; a spline that
+    would clip an obstacle falls back to straight segments.
+    """
+    started = time.perf_counter()
+    points = np.asarray(cells, dtype=float)
+    if len(points) > 2:
+        if method == 'greedy':
+            keep = shortcut_greedy(blocked, points, window or 64)
+        elif method == 'any_angle':
+            keep = shortcut_any_angle(blocked, points, window or 32)
+        else:
+            raise ValueError(f"Unknown smoothing method: {method}")
+        shortcut = points[keep]
+    else:
+        shortcut = points.copy()
+    removed = len(points) - len(shortcut)
+
+    result = shortcut
+    if spacing is not None:
+        result = resample(shortcut, spacing, spline)
+        if spline and not line_of_sight(blocked, result[:-1], result[1:]).all():
+            result = resample(shortcut, spacing)
+
+    return SmoothResult(result, time.perf_counter() - started, removed,
+                        path_length(points), path_length(result))
@@ -0,0 +1,526 @@
+"""Host-side person detection with the model the ESP32 camera runs.
+
+The int8 TFLite flatbuffer is pulled out of the C array in EloquentTinyML's
+person_detection_model.h and executed by a small NumPy interpreter that
+covers the ops this graph uses (CONV_2D, DEPTHWISE_CONV_2D, AVERAGE_POOL_2D,
+RESHAPE, SOFTMAX). The integer arithmetic follows TFLM's reference kernels
+(double-rounding requantization, gemmlowp fixed-point softmax), so the
+scores match the board bit for bit, but a whole batch of frames goes
+through each layer at once:
+
+    python person_detector.py frames.npy --threshold 180
+"""
+import argparse
+import os
+import re
+import struct
+import time
+from collections import namedtuple
+
+import numpy as np
+
+_REPO = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+MODEL_HEADER = os.path.join(_REPO, 'person_detection', 'lib', 'EloquentTinyML-main', 'src', 'eloquent_tinyml',
+                            'zoo', 'person_detection_model.h')
+TFLM_SOURCE = os.path.join(_REPO, 'person_detection', 'lib', 'tflm_esp32-2.0.0', 'src')
+
+FRAME_SIZE = 96
+# PersonDetection: a frame is a person when its score beats "no person" and this
+PERSON_THRESHOLD = 180
+# The graph has two outputs, (no person, person). The firmware's
+# notPersonScore() reads output 2, one past the end of the tensor.
+NO_PERSON_CLASS = 0
+PERSON_CLASS = 1
+
+# TFLite schema enums used here
+TENSOR_TYPES = {0: np.float32, 2: np.int32, 3: np.uint8, 4: np.int64, 7: np.int16, 9: np.int8}
+BUILTIN_OPS = {1: 'AVERAGE_POOL_2D', 3: 'CONV_2D', 4: 'DEPTHWISE_CONV_2D', 22: 'RESHAPE', 25: 'SOFTMAX'}
+PADDING = {0: 'SAME', 1: 'VALID'}
+ACTIVATIONS = {0: None, 1: 'RELU', 2: 'RELU_N1_TO_1', 3: 'RELU6'}
+
+Tensor = namedtuple('Tensor', ['name', 'shape', 'dtype', 'data', 'scale', 'zero_point'])
+Operator = namedtuple('Operator', ['op', 'inputs', 'outputs', 'options'])
+Model = namedtuple('Model', ['tensors', 'operators', 'inputs', 'outputs'])
+Detection = namedtuple('Detection', ['person', 'no_person', 'detected'])
+
+
+def extract_model(header=MODEL_HEADER):
+    """The flatbuffer bytes of the `unsigned char name[N] = {0x.., ...}` array in a C header."""
+    with open(header) as f:
+        text = f.read()
+    match = re.search(r'\[(\d+)\][^=]*=\s*\{([^}]*)\}', text)
+    if match is None:
+        raise ValueError(f"No byte array in {header}")
+    data = bytes(int(value, 16) for value in re.findall(r'0x([0-9a-fA-F]{1,2})', match.group(2)))
+    if len(data) != int(match.group(1)):
+        raise ValueError(f"{header} declares {match.group(1)} bytes but holds {len(data)}")
+    if data[4:8] != b'TFL3':
+        raise ValueError("Not a TFLite flatbuffer")
+    return data
+
+
+class _Table:
+    """Read-only view of one flatbuffer table."""
+
+    __slots__ = ('buf', 'pos', 'vtable', 'vtable_size')
+
+    def __init__(self, buf, pos):
+        self.buf = buf
+        self.pos = pos
+        self.vtable = pos - struct.unpack_from('<i', buf, pos)[0]
+        self.vtable_size = struct.unpack_from('<H', buf, self.vtable)[0]
+
+    def _field(self, index):
+        entry = 4 + 2 * index
+        if entry >= self.vtable_size:
+            return 0
+        offset = struct.unpack_from('<H', self.buf, self.vtable + entry)[0]
+        return self.pos + offset if offset else 0
+
+    def scalar(self, index, fmt, default=0):
+        pos = self._field(index)
+        return struct.unpack_from('<' + fmt, self.buf, pos)[0] if pos else default
+
+    def _target(self, index):
+        pos = self._field(index)
+        return pos + struct.unpack_from('<I', self.buf, pos)[0] if pos else 0
+
+    def table(self, index):
+        pos = self._target(index)
+        return _Table(self.buf, pos) if pos else None
+
+    def string(self, index):
+        pos = self._target(index)
+        if not pos:
+            return None
+        length = struct.unpack_from('<I', self.buf, pos)[0]
+        return self.buf[pos + 4:pos + 4 + length].decode()
+
+    def vector(self, index, dtype):
+        """A vector of scalars as a NumPy array (empty if absent)."""
+        pos = self._target(index)
+        if not pos:
+            return np.zeros(0, dtype=dtype)
+        length = struct.unpack_from('<I', self.buf, pos)[0]
+        return np.frombuffer(self.buf, dtype=np.dtype(dtype).newbyteorder('<'), count=length, offset=pos + 4)
+
+    def tables(self, index):
+        pos = self._target(index)
+        if not pos:
+            return []
+        length = struct.unpack_from('<I', self.buf, pos)[0]
+        elements = pos + 4 + 4 * np.arange(length)
+        return [_Table(self.buf, int(p) + struct.unpack_from('<I', self.buf, int(p))[0]) for p in elements]
+
+
+def _options(op, table):
+    if table is None:
+        return {}
+    if op == 'CONV_2D':
+        return {'padding': PADDING[table.scalar(0, 'b')], 'stride': (table.scalar(2, 'i'), table.scalar(1, 'i')),
+                'activation': ACTIVATIONS[table.scalar(3, 'b')],
+                'dilation': (table.scalar(5, 'i', 1), table.scalar(4, 'i', 1))}
+    if op == 'DEPTHWISE_CONV_2D':
+        return {'padding': PADDING[table.scalar(0, 'b')], 'stride': (table.scalar(2, 'i'), table.scalar(1, 'i')),
+                'depth_multiplier': table.scalar(3, 'i'), 'activation': ACTIVATIONS[table.scalar(4, 'b')],
+                'dilation': (table.scalar(6, 'i', 1), table.scalar(5, 'i', 1))}
+    if op == 'AVERAGE_POOL_2D':
+        return {'padding': PADDING[table.scalar(0, 'b')], 'stride': (table.scalar(2, 'i'), table.scalar(1, 'i')),
+                'filter': (table.scalar(4, 'i'), table.scalar(3, 'i')),
+                'activation': ACTIVATIONS[table.scalar(5, 'b')]}
+    if op == 'SOFTMAX':
+        return {'beta': table.scalar(0, 'f')}
+    if op == 'RESHAPE':
+        return {'new_shape': table.vector(0, np.int32).tolist()}
+    return {}
+
+
+def load_model(data):
+    """Parse the first subgraph of a TFLite flatbuffer into Tensors and Operators."""
+    root = _Table(data, struct.unpack_from('<I', data, 0)[0])
+    buffers = [buffer.vector(0, np.uint8) for buffer in root.tables(4)]
+    codes = []
+    for code in root.tables(1):
+        # builtin_code superseded the int8 deprecated_builtin_code past 127
+        builtin = max(code.scalar(0, 'b'), code.scalar(3, 'i'))
+        codes.append(BUILTIN_OPS.get(builtin, f'BUILTIN_{builtin}'))
+    subgraph = root.tables(2)[0]
+
+    tensors = []
+    for tensor in subgraph.tables(0):
+        dtype = TENSOR_TYPES[tensor.scalar(1, 'b')]
+        shape = tuple(int(d) for d in tensor.vector(0, np.int32))
+        raw = buffers[tensor.scalar(2, 'I')]
+        values = np.frombuffer(raw.tobytes(), dtype=np.dtype(dtype).newbyteorder('<')).reshape(shape) \
+            if len(raw) else None
+        quantization = tensor.table(4)
+        scale = quantization.vector(2, np.float32) if quantization else np.zeros(0, np.float32)
+        zero_point = quantization.vector(3, np.int64) if quantization else np.zeros(0, np.int64)
+        tensors.append(Tensor(tensor.string(3), shape, dtype, values, scale, zero_point))
+
+    operators = []
+    for operator in subgraph.tables(3):
+        op = codes[operator.scalar(0, 'I')]
+        if op not in BUILTIN_OPS.values():
+            raise ValueError(f"Unsupported operator {op}")
+        operators.append(Operator(op, operator.vector(1, np.int32).tolist(), operator.vector(2, np.int32).tolist(),
+                                  _options(op, operator.table(4))))
+    return Model(tensors, operators, subgraph.vector(1, np.int32).tolist(), subgraph.vector(2, np.int32).tolist())
+
+
+# Integer arithmetic of TFLM's reference kernels, on int64 arrays holding int32 values
+
+INT32_MIN = -(1 << 31)
+INT32_MAX = (1 << 31) - 1
+
+
+def _wrap32(x):
+    return ((x + (1 << 31)) & 0xFFFFFFFF) - (1 << 31)
+
+
+def _divide_toward_zero(x, divisor):
+    return np.where(x >= 0, x // divisor, -(-x // divisor))
+
+
+def saturating_rounding_doubling_high_mul(a, b):
+    a, b = np.asarray(a, dtype=np.int64), np.asarray(b, dtype=np.int64)
+    ab = a * b
+    nudge = np.where(ab >= 0, 1 << 30, 1 - (1 << 30))
+    high = _divide_toward_zero(ab + nudge, 1 << 31)
+    return np.where((a == b) & (a == INT32_MIN), INT32_MAX, high)
+
+
+def rounding_divide_by_pot(x, exponent):
+    x, exponent = np.asarray(x, dtype=np.int64), np.asarray(exponent, dtype=np.int64)
+    mask = (np.int64(1) << exponent) - 1
+    remainder = x & mask
+    threshold = (mask >> 1) + (x < 0)
+    return (x >> exponent) + (remainder > threshold)
+
+
+def multiply_by_quantized_multiplier(x, multiplier, shift):
+    """tflite::MultiplyByQuantizedMultiplier (double rounding), elementwise."""
+    shift = np.asarray(shift, dtype=np.int64)
+    left = np.maximum(shift, 0)
+    right = np.maximum(-shift, 0)
+    scaled = _wrap32(np.asarray(x, dtype=np.int64) << left)
+    return rounding_divide_by_pot(saturating_rounding_doubling_high_mul(scaled, multiplier), right)
+
+
+def quantize_multiplier(real):
+    """tflite::QuantizeMultiplier: (Q31 multiplier, power-of-two shift) of a double."""
+    if real == 0.0:
+        return 0, 0
+    fraction, shift = np.frexp(real)
+    # TfLiteRound is std::round: halves away from zero
+    q = int(np.sign(fraction) * np.floor(abs(fraction) * (1 << 31) + 0.5))
+    if q == 1 << 31:
+        q //= 2
+        shift += 1
+    if shift < -31:
+        return 0, 0
+    return q, int(shift)
+
+
+def _saturating_shift_left(x, exponent):
+    # SaturatingRoundingMultiplyByPOT with a positive exponent
+    threshold = (1 << (31 - exponent)) - 1
+    return np.where(x > threshold, INT32_MAX, np.where(x < -threshold, INT32_MIN, _wrap32(x << exponent)))
+
+
+def _fixed_mul(a, b):
+    return saturating_rounding_doubling_high_mul(a, b)
+
+
+def _exp_on_interval_between_negative_one_quarter_and_0_excl(a):
+    # Q0.31 in and out
+    constant_term = 1895147668
+    constant_1_over_3 = 715827883
+    x = _wrap32(a + (1 << 28))
+    x2 = _fixed_mul(x, x)
+    x3 = _fixed_mul(x2, x)
+    x4 = _fixed_mul(x2, x2)
+    x4_over_4 = rounding_divide_by_pot(x4, 2)
+    poly = rounding_divide_by_pot(_wrap32(_fixed_mul(_wrap32(x4_over_4 + x3), constant_1_over_3) + x2), 1)
+    return _wrap32(constant_term + _fixed_mul(constant_term, _wrap32(x + poly)))
+
+
+# exp(-2**k) in Q0.31 for the barrel shifter in gemmlowp::exp_on_negative_values
+_EXP_MULTIPLIERS = ((-2, 1672461947), (-1, 1302514674), (0, 790015084), (1, 290630308), (2, 39332535),
+                    (3, 720401), (4, 242))
+
+
+def exp_on_negative_values(a, integer_bits):
+    """gemmlowp::exp_on_negative_values of Q(integer_bits) raw values; result in Q0.31."""
+    a = np.asarray(a, dtype=np.int64)
+    fractional_bits = 31 - integer_bits
+    one_quarter = 1 << (fractional_bits - 2)
+    a_mod_quarter_minus_one_quarter = _wrap32((a & (one_quarter - 1)) - one_quarter)
+    result = _exp_on_interval_between_negative_one_quarter_and_0_excl(
+        _saturating_shift_left(a_mod_quarter_minus_one_quarter, integer_bits))
+    remainder = _wrap32(a_mod_quarter_minus_one_quarter - a)
+    for exponent, multiplier in _EXP_MULTIPLIERS:
+        if integer_bits > exponent:
+            bit = np.int64(1) << (fractional_bits + exponent)
+            result = np.where(remainder & bit, _fixed_mul(result, multiplier), result)
+    if integer_bits > 5:
+        result = np.where(a < -(1 << (36 - integer_bits)), 0, result)
+    return np.where(a == 0, INT32_MAX, result)
+
+
+def one_over_one_plus_x_for_x_in_0_1(a):
+    """gemmlowp Newton-Raphson 1 / (1 + a), Q0.31 in and out."""
+    a = np.asarray(a, dtype=np.int64)
+    half_denominator = _divide_toward_zero(a + INT32_MAX + np.where(a + INT32_MAX >= 0, 1, -1), 2)
+    # Q2.29 from here on
+    x = _wrap32(1515870810 + _fixed_mul(half_denominator, -1010580540))
+    for _ in range(3):
+        one_minus = _wrap32((1 << 29) - _fixed_mul(half_denominator, x))
+        x = _wrap32(x + _saturating_shift_left(_fixed_mul(x, one_minus), 2))
+    return _saturating_shift_left(x, 1)
+
+
+def _count_leading_zeros(x):
+    # frexp's exponent is the bit length; uint32 values are exact in float64
+    x = np.asarray(x, dtype=np.int64) & 0xFFFFFFFF
+    return 32 - np.frexp(x.astype(np.float64))[1].astype(np.int64)
+
+
+def _activation_range(activation, scale, zero_point, qmin=-128, qmax=127):
+    def quantize(value):
+        # float division and std::round, as in kernel_util's Quantize
+        q = np.float32(value) / np.float32(scale)
+        return zero_point + int(np.sign(q) * np.floor(abs(q) + np.float32(0.5)))
+    if activation == 'RELU':
+        return max(qmin, quantize(0.0)), qmax
+    if activation == 'RELU6':
+        return max(qmin, quantize(0.0)), min(qmax, quantize(6.0))
+    if activation == 'RELU_N1_TO_1':
+        return max(qmin, quantize(-1.0)), min(qmax, quantize(1.0))
+    return qmin, qmax
+
+
+def _padding(padding, size, kernel, stride, dilation=1):
+    """(output size, padding before, padding after) as in ComputePaddingHeightWidth."""
+    effective = (kernel - 1) * dilation + 1
+    if padding == 'SAME':
+        out = (size + stride - 1) // stride
+    else:
+        out = (size + stride - effective) // stride
+    total = max((out - 1) * stride + effective - size, 0)
+    return out, total // 2, total - total // 2
+
+
+def _windows(x, options, kernel):
+    """Zero-padded input and, per kernel tap, the strided slice each output reads."""
+    (kh, kw), (sh, sw) = kernel, options['stride']
+    dh, dw = options.get('dilation', (1, 1))
+    out_h, top, bottom = _padding(options['padding'], x.shape[1], kh, sh, dh)
+    out_w, left, right = _padding(options['padding'], x.shape[2], kw, sw, dw)
+    padded = np.pad(x, ((0, 0), (top, bottom), (left, right), (0, 0)))
+    taps = {}
+    for ky in range(kh):
+        for kx in range(kw):
+            y, x0 = ky * dh, kx * dw
+            taps[(ky, kx)] = padded[:, y:y + out_h * sh:sh, x0:x0 + out_w * sw:sw, :]
+    return taps, (top, left)
+
+
+class _Layer:
+    """One operator with its quantization parameters worked out up front (as Prepare does)."""
+
+    def __init__(self, model, operator):
+        self.op = operator.op
+        self.options = operator.options
+        self.inputs = operator.inputs
+        self.output = operator.outputs[0]
+        tensors = model.tensors
+        src, dst = tensors[operator.inputs[0]], tensors[self.output]
+        self.output_shape = dst.shape
+        if self.op in ('CONV_2D', 'DEPTHWISE_CONV_2D'):
+            weights = tensors[operator.inputs[1]]
+            bias = tensors[operator.inputs[2]] if len(operator.inputs) > 2 and operator.inputs[2] >= 0 else None
+            self.filter = weights.data.astype(np.int64)
+            self.bias = bias.data.astype(np.int64) if bias is not None else 0
+            self.input_offset = -int(src.zero_point[0])
+            self.output_offset = int(dst.zero_point[0])
+            channels = dst.shape[-1]
+            scales = weights.scale if len(weights.scale) > 1 else np.repeat(weights.scale, channels)
+            multipliers = [quantize_multiplier(float(src.scale[0]) * float(s) / float(dst.scale[0]))
+                           for s in scales]
+            self.multiplier = np.array([m for m, _ in multipliers], dtype=np.int64)
+            self.shift = np.array([s for _, s in multipliers], dtype=np.int64)
+            self.range = _activation_range(operator.options['activation'], dst.scale[0], self.output_offset)
+            if self.op == 'CONV_2D':
+                # (kh * kw * cin, cout) for one matmul per layer
+                cout, kh, kw, cin = self.filter.shape
+                self.matrix = self.filter.transpose(1, 2, 3, 0).reshape(kh * kw * cin, cout).astype(np.float64)
+        elif self.op == 'AVERAGE_POOL_2D':
+            self.range = _activation_range(operator.options['activation'], dst.scale[0], int(dst.zero_point[0]))
+        elif self.op == 'SOFTMAX':
+            if dst.zero_point[0] != -128 or dst.scale[0] != np.float32(1 / 256):
+                raise ValueError("int8 softmax output must have scale 1/256 and zero point -128")
+            # PreprocessSoftmaxScaling with 5 integer bits, then CalculateInputRadius
+            real = min(float(operator.options['beta']) * float(src.scale[0]) * (1 << 26), float(INT32_MAX))
+            self.multiplier, self.left_shift = quantize_multiplier(real)
+            radius = ((1 << 5) - 1) * (1 << 26) / (1 << self.left_shift)
+            self.diff_min = -int(np.floor(radius))
+
+    def __call__(self, x):
+        return getattr(self, '_' + self.op.lower())(x)
+
+    def _requantize(self, acc):
+        acc = multiply_by_quantized_multiplier(acc + self.bias, self.multiplier, self.shift) + self.output_offset
+        return np.clip(acc, *self.range).astype(np.int8)
+
+    def _conv_2d(self, x):
+        cout, kh, kw, cin = self.filter.shape
+        shifted = x.astype(np.float64) + self.input_offset
+        if (kh, kw) == (1, 1) and self.options['stride'] == (1, 1):
+            columns = shifted
+        else:
+            taps, _ = _windows(shifted, self.options, (kh, kw))
+            # Padding is zero after the offset, i.e. skipped like the reference loop
+            columns = np.concatenate([taps[(ky, kx)] for ky in range(kh) for kx in range(kw)], axis=-1)
+        # Products are at most 2**15 and there are far fewer than 2**37 of them,
+        # so float64 accumulation is exact and runs on BLAS
+        acc = (columns.reshape(-1, kh * kw * cin) @ self.matrix).reshape(columns.shape[:3] + (cout,))
+        return self._requantize(acc.astype(np.int64))
+
+    def _depthwise_conv_2d(self, x):
+        _, kh, kw, cout = self.filter.shape
+        multiplier = self.options['depth_multiplier']
+        shifted = x.astype(np.int32) + self.input_offset
+        if multiplier > 1:
+            shifted = np.repeat(shifted, multiplier, axis=-1)
+        taps, _ = _windows(shifted, self.options, (kh, kw))
+        acc = None
+        for (ky, kx), window in taps.items():
+            term = window * self.filter[0, ky, kx].astype(np.int32)
+            acc = term if acc is None else acc + term
+        return self._requantize(acc.astype(np.int64))
+
+    def _average_pool_2d(self, x):
+        kh, kw = self.options['filter']
+        ones = np.ones(x.shape[:3] + (1,), dtype=np.int32)
+        taps, _ = _windows(x.astype(np.int32), self.options, (kh, kw))
+        counts, _ = _windows(ones, self.options, (kh, kw))
+        acc = sum(taps.values())
+        count = sum(counts.values()).astype(np.int64)
+        acc = acc.astype(np.int64)
+        # Round half away from zero, with C integer division
+        acc = np.where(acc > 0, _divide_toward_zero(acc + count // 2, count),
+                       _divide_toward_zero(acc - count // 2, count))
+        return np.clip(acc, *self.range).astype(np.int8)
+
+    def _reshape(self, x):
+        return x.reshape((len(x),) + tuple(self.output_shape[1:]))
+
+    def _softmax(self, x):
+        x = x.astype(np.int64)
+        diff = x - x.max(axis=-1, keepdims=True)
+        valid = diff >= self.diff_min
+        rescaled = saturating_rounding_doubling_high_mul(_wrap32(diff << self.left_shift), self.multiplier)
+        exps = exp_on_negative_values(rescaled, 5)
+        # Accumulate in Q12.19
+        sum_of_exps = np.where(valid, rounding_divide_by_pot(exps, 12), 0).sum(axis=-1, keepdims=True)
+        sum_of_exps = _wrap32(sum_of_exps)
+        headroom_plus_one = _count_leading_zeros(sum_of_exps)
+        num_bits_over_unit = 12 - headroom_plus_one
+        shifted_sum_minus_one = _wrap32(((sum_of_exps & 0xFFFFFFFF) << headroom_plus_one) - (1 << 31))
+        shifted_scale = one_over_one_plus_x_for_x_in_0_1(shifted_sum_minus_one)
+        exponent = num_bits_over_unit + 31 - 8
+        out = rounding_divide_by_pot(_fixed_mul(shifted_scale, exps), exponent) - 128
+        return np.where(valid, np.clip(out, -128, 127), -128).astype(np.int8)
+
+
+class Interpreter:
+    """Batched NumPy execution of an int8 TFLite graph.
+
+    invoke() takes a batch of int8 input tensors (N x the model's input shape
+    without its batch dimension) and returns the int8 outputs; each layer
+    runs once for the whole batch. Pass keep=True to also get every
+    intermediate tensor, keyed by tensor index.
+    """
+
+    def __init__(self, data=None):
+        self.model = load_model(extract_model() if data is None else data)
+        self.layers = [_Layer(self.model, operator) for operator in self.model.operators]
+        self.input = self.model.tensors[self.model.inputs[0]]
+        self.output = self.model.tensors[self.model.outputs[0]]
+
+    def invoke(self, batch, keep=False):
+        batch = np.asarray(batch, dtype=np.int8).reshape((-1,) + self.input.shape[1:])
+        values = {self.model.inputs[0]: batch}
+        for layer in self.layers:
+            values[layer.output] = layer(values[layer.inputs[0]])
+            if not keep:
+                # Nothing in this graph reads a tensor twice
+                del values[layer.inputs[0]]
+        output = values[self.model.outputs[0]]
+        return (output, values) if keep else output
+
+
+class PersonDetector:
+    """Scores 96x96 greyscale frames exactly as the camera's PersonDetection does."""
+
+    def __init__(self, data=None, threshold=PERSON_THRESHOLD, batch_size=64):
+        self.interpreter = Interpreter(data)
+        self.threshold = threshold
+        self.batch_size = batch_size
+
+    def logits(self, frames):
+        """int8 softmax outputs for uint8 frames (N, 96, 96); pixels are shifted by -128 like run()."""
+        frames = np.asarray(frames, dtype=np.uint8).reshape(-1, FRAME_SIZE * FRAME_SIZE)
+        outputs = []
+        for start in range(0, len(frames), self.batch_size):
+            chunk = frames[start:start + self.batch_size]
+            outputs.append(self.interpreter.invoke((chunk.astype(np.int16) - 128).astype(np.int8)))
+        shape = (0,) + self.interpreter.output.shape[1:]
+        return np.concatenate(outputs) if outputs else np.zeros(shape, dtype=np.int8)
+
+    def detect(self, frames):
+        """Detection of (N,) person and no-person scores (0-255) and the on-board decision."""
+        logits = self.logits(frames)
+        logits = logits.reshape(len(logits), -1)
+        person = (logits[:, PERSON_CLASS].astype(np.int16) + 128).astype(np.uint8)
+        no_person = (logits[:, NO_PERSON_CLASS].astype(np.int16) + 128).astype(np.uint8)
+        return Detection(person, no_person, (person > no_person) & (person >= self.threshold))
+
+
+def benchmark(frames=64, batch_sizes=(1, 16, 64), seed=0):
+    """Frames per second of the NumPy interpreter at a few batch sizes."""
+    rng = np.random.default_rng(seed)
+    images = rng.integers(0, 256, (frames, FRAME_SIZE, FRAME_SIZE), dtype=np.uint8)
+    detector = PersonDetector()
+    out = {}
+    for batch_size in batch_sizes:
+        detector.batch_size = batch_size
+        started = time.perf_counter()
+        detector.detect(images)
+        out[f'batch_{batch_size}_fps'] = frames / (time.perf_counter() - started)
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('frames', nargs='?', help=".npy of uint8 (N, 96, 96) frames, or raw concatenated frames")
+    parser.add_argument('--threshold', type=int, default=PERSON_THRESHOLD)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--benchmark', action='store_true', help="time the interpreter instead")
+    args = parser.parse_args(argv)
+
+    if args.benchmark or not args.frames:
+        print(benchmark())
+        return
+    if args.frames.endswith('.npy'):
+        frames = np.load(args.frames)
+    else:
+        frames = np.fromfile(args.frames, dtype=np.uint8).reshape(-1, FRAME_SIZE, FRAME_SIZE)
+    detection = PersonDetector(threshold=args.threshold, batch_size=args.batch_size).detect(frames)
+    for i, (person, no_person, detected) in enumerate(zip(*detection)):
+        print(f"{i}\t{person}\t{no_person}\t{'PERSON' if detected else '-'}")
+
+
+if __name__ == '__main__':
+    main()
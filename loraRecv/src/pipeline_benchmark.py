@@ -0,0 +1,311 @@
+"""End-to-end throughput benchmark of the receiver pipeline.
+
+Replays a synthetic or recorded receiver stream (the exact bytes the
+receiver writes to serial, binary frames or JSON lines) at 1x, Nx or
+maximum speed through IngestionService -> SlamPipeline (scan matching,
+pose graph, mapping) -> planning, and writes per-stage latency
+percentiles, throughput and peak memory as JSON:
+
+    python pipeline_benchmark.py --scans 300 --speed max --output after.json
+    python pipeline_benchmark.py --input flight.bin --speed 4 --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+import numpy as np
+
+from costmap import CostMap
+from ingestion import IngestionService
+from planner import GridPlanner
+from slam_pipeline import SlamPipeline
+from wire_protocol import (StreamDecoder, encode_frame, SENSOR_DTYPE, IMU_DTYPE, FRAME_SCAN, FRAME_IMU,
+                           NUM_READINGS)
+
+# Room and path of the synthetic flight, as in test_slam_pipeline.py
+ROOM_HALF_SIZE = (4.0, 3.0)
+PATH_RADII = (2.5, 1.5)
+ANGLES_DEG = np.arange(0, 4 * NUM_READINGS, 4)
+
+PERCENTILES = (50, 90, 99)
+
+
+def room_ranges(pose, angles):
+    """Ranges (m) from `pose` to the walls of the synthetic room."""
+    directions = angles + pose[2]
+    dx, dy = np.cos(directions), np.sin(directions)
+    half_x, half_y = ROOM_HALF_SIZE
+    with np.errstate(divide='ignore'):
+        tx = np.where(dx > 0, (half_x - pose[0]) / dx, (-half_x - pose[0]) / dx)
+        ty = np.where(dy > 0, (half_y - pose[1]) / dy, (-half_y - pose[1]) / dy)
+    return np.minimum(np.abs(tx), np.abs(ty))
+
+
+def synthetic_stream(scans=300, rate=10.0, steps_per_lap=60, stream_format='binary', seed=0, persons=()):
+    """Timed chunks [(seconds, bytes)] of a drone circling the synthetic room.
+
+    One chunk per scan: a scan frame followed by its IMU frame, or one JSON
+    line carrying both, exactly as the receiver emits them. Scans whose
+    index is in `persons` carry the person detection flag.
+    """
+    rng = np.random.default_rng(seed)
+    angles = np.radians(ANGLES_DEG)
+    omega = 2 * np.pi / steps_per_lap * rate
+    chunks = []
+    for k in range(scans):
+        phase = 2 * np.pi * k / steps_per_lap
+        pose = np.array([PATH_RADII[0] * np.sin(phase), -PATH_RADII[1] * np.cos(phase), phase])
+        ranges = room_ranges(pose, angles) + rng.normal(0, 0.01, len(angles))
+        ranges_cm = np.clip(ranges * 100, 0, 899).astype(np.int16)
+        t = k / rate
+        if stream_format == 'json':
+            doc = {'device_id_1': 1, 'ranges': ranges_cm.tolist(), 'angles': ANGLES_DEG.tolist(),
+                   'temperature': 22.0, 'timestamp': int(t * 1000), 'personDetectedFlag': k in persons,
+                   'device_id_2': 2, 'rotation_z': omega, 'accel_x': 0.0, 'accel_y': 0.0}
+            chunks.append((t, (json.dumps(doc) + '\n').encode()))
+            continue
+        scan = np.zeros((), dtype=SENSOR_DTYPE)
+        scan['device_id'] = 1
+        scan['range'] = ranges_cm
+        scan['angle'] = ANGLES_DEG
+        scan['temperature'] = 22.0
+        scan['timestamp'] = int(t * 1000)
+        scan['personDetectedFlag'] = k in persons
+        imu = np.zeros((), dtype=IMU_DTYPE)
+        imu['device_id'] = 2
+        imu['gyro_z'] = omega
+        chunks.append((t, encode_frame(FRAME_SCAN, scan.tobytes()) + encode_frame(FRAME_IMU, imu.tobytes())))
+    return chunks
+
+
+def recorded_stream(path, chunk_size=4096):
+    """Timed chunks of a recorded receiver stream.
+
+    A chunk is due when the last scan completed in it was taken, by the
+    scans' own millisecond timestamps relative to the first scan.
+    """
+    decoder = StreamDecoder()
+    chunks = []
+    origin = None
+    t = 0.0
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            batch = decoder.feed(data)
+            stamps = np.concatenate([batch.scans['timestamp'], batch.pairs['scan']['timestamp']])
+            if len(stamps):
+                if origin is None:
+                    origin = stamps[0]
+                t = max(t, (stamps.max() - origin) / 1000)
+            chunks.append((t, data))
+    return chunks
+
+
+async def paced_source(chunks, speed=1.0):
+    """Yield timed chunks at `speed` times real time (None for as fast as possible)."""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    for t, data in chunks:
+        if speed:
+            delay = started + t / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        yield data
+        if not speed:
+            await asyncio.sleep(0)
+
+
+class StageTimer:
+    """Collects wall-clock durations per named stage."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def record(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    def wrap(self, obj, method, stage):
+        """Time every call of obj.method (an instance attribute shadows the method)."""
+        original = getattr(obj, method)
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+
+        setattr(obj, method, timed)
+
+    def summary(self):
+        out = {}
+        for stage, samples in self.samples.items():
+            ms = np.asarray(samples) * 1e3
+            entry = {'count': len(ms), 'mean_ms': float(ms.mean()), 'max_ms': float(ms.max())}
+            for p, value in zip(PERCENTILES, np.percentile(ms, PERCENTILES)):
+                entry[f'p{p}_ms'] = float(value)
+            out[stage] = entry
+        return out
+
+
+class InstrumentedPipeline:
+    """SlamPipeline plus a periodic return-home plan, timed stage by stage.
+
+    As an IngestionService consumer it also records how long each pair
+    waited in the ring buffer ('queue') and its total time from arrival
+    to mapped ('end_to_end').
+    """
+
+    def __init__(self, timer, plan_every=10):
+        self.timer = timer
+        self.plan_every = plan_every
+        self.slam = SlamPipeline()
+        self.scans = 0
+        self.plans = 0
+        self.plan_failures = 0
+        timer.wrap(self.slam.matcher, 'match', 'scan_matching')
+        timer.wrap(self.slam, '_detect_loop_closure', 'loop_closure')
+        timer.wrap(self.slam.graph, 'optimize', 'optimization')
+        timer.wrap(self.slam.grid, 'insert_scan', 'mapping')
+        timer.wrap(self.slam.grid, 'update_poses', 'remapping')
+
+    def __call__(self, pair):
+        # host_time is the event loop clock, i.e. time.monotonic()
+        self.timer.record('queue', time.monotonic() - pair.host_time)
+        started = time.perf_counter()
+        accepted = self.slam(pair)
+        self.timer.record('slam', time.perf_counter() - started)
+        self.scans += 1
+        if self.plan_every and accepted and self.scans % self.plan_every == 0:
+            self.plan_home()
+        self.timer.record('end_to_end', time.monotonic() - pair.host_time)
+        return accepted
+
+    def plan_home(self):
+        started = time.perf_counter()
+        grid = self.slam.grid
+        walls, origin = grid.occupied_mask()
+        costmap = CostMap(walls, resolution=grid.resolution, origin=origin)
+        poses = self.slam.poses
+        start = tuple(int(v) for v in costmap.world_to_cell(poses[-1, :2]))
+        home = tuple(int(v) for v in costmap.world_to_cell(poses[0, :2]))
+        try:
+            GridPlanner(costmap.blocked()).plan(start, home)
+            self.plans += 1
+        except ValueError:
+            # The pose fell on a cell the map currently marks occupied
+            self.plan_failures += 1
+        self.timer.record('planning', time.perf_counter() - started)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _max_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1 << 20) if sys.platform == 'darwin' else rss / 1024
+
+
+def run_benchmark(chunks, speed=None, plan_every=10, capacity=256, trace_memory=False):
+    """Replay timed chunks through the pipeline; returns the JSON-ready report."""
+    timer = StageTimer()
+    pipeline = InstrumentedPipeline(timer, plan_every)
+    service = IngestionService(paced_source(chunks, speed), [pipeline], capacity=capacity)
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    asyncio.run(service.run())
+    elapsed = time.perf_counter() - started
+    service.stop()
+    traced_peak = None
+    if trace_memory:
+        traced_peak = tracemalloc.get_traced_memory()[1] / (1 << 20)
+        tracemalloc.stop()
+
+    stats = service.stats()
+    duration = chunks[-1][0] - chunks[0][0] if chunks else 0.0
+    return {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'speed': speed or 'max',
+        'stream_seconds': duration,
+        'wall_seconds': elapsed,
+        'scans': pipeline.scans,
+        'throughput_scans_per_s': pipeline.scans / elapsed if elapsed else None,
+        'nodes': int(pipeline.slam.graph.num_nodes),
+        'loop_closures': len(pipeline.slam.loop_closures),
+        'plans': pipeline.plans,
+        'plan_failures': pipeline.plan_failures,
+        'stages': timer.summary(),
+        'memory': {'traced_peak_mb': traced_peak, 'max_rss_mb': _max_rss_mb()},
+        'ingestion': {key: stats[key] for key in ('bytes_read', 'dispatched', 'dropped', 'buffer_high_water',
+                                                  'consumer_errors')},
+    }
+
+
+def compare(report, baseline):
+    """Ratios of this report to a baseline: throughput (higher is better) and
+    per-stage p50/p99 latency (lower is better)."""
+    out = {'throughput': report['throughput_scans_per_s'] / baseline['throughput_scans_per_s']}
+    for stage, entry in report['stages'].items():
+        if stage in baseline['stages']:
+            before = baseline['stages'][stage]
+            out[stage] = {key: entry[key] / before[key] if before[key] else None
+                          for key in ('p50_ms', 'p99_ms')}
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--input', help="recorded receiver stream (default: synthetic)")
+    parser.add_argument('--scans', type=int, default=300, help="synthetic scans")
+    parser.add_argument('--rate', type=float, default=10.0, help="synthetic scan rate (Hz)")
+    parser.add_argument('--format', choices=('binary', 'json'), default='binary', help="synthetic stream format")
+    parser.add_argument('--speed', default='max', help="replay speed: 1, N or max")
+    parser.add_argument('--plan-every', type=int, default=10, help="plan home every N scans (0: never)")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="also report the tracemalloc peak (slows the run many times over)")
+    parser.add_argument('--output', help="write the JSON report here")
+    parser.add_argument('--compare', help="baseline JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    if args.input:
+        chunks = recorded_stream(args.input)
+    else:
+        chunks = synthetic_stream(args.scans, args.rate, stream_format=args.format)
+    speed = None if args.speed == 'max' else float(args.speed)
+    report = run_benchmark(chunks, speed, args.plan_every, trace_memory=args.trace_memory)
+    if args.compare:
+        with open(args.compare) as f:
+            report['compared_to'] = compare(report, json.load(f))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+import time
+from collections import namedtuple
+
+import numpy as np
+
+OptimizationStats = namedtuple('OptimizationStats', [
+    'seconds', 'iterations', 'active_nodes', 'active_edges', 'initial_error', 'final_error'])
+
+
+def wrap_angle(angle):
+    return (angle + np.pi) % (2 * np.pi) - np.pi
+
+
+def relative_pose(a, b):
+    """Pose of b expressed in the frame of a."""
+    c, s = np.cos(a[2]), np.sin(a[2])
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    return np.array([c * dx + s * dy, -s * dx + c * dy, wrap_angle(b[2] - a[2])])
+
+
+def compose(a, delta):
+    """Apply a relative pose `delta` to pose a."""
+    c, s = np.cos(a[2]), np.sin(a[2])
+    return np.array([a[0] + c * delta[0] - s * delta[1],
+                     a[1] + s * delta[0] + c * delta[1],
+                     wrap_angle(a[2] + delta[2])])
+
+
+class SpatialIndex:
+    """Uniform grid hash over node positions for radius queries.
+
+    A query only visits the buckets overlapping the search circle, so loop
+    closure candidate lookup does not scan every node of the graph.
+    """
+
+    def __init__(self, cell_size=2.0):
+        self.cell_size = cell_size
+        self._buckets = {}
+        self._where = {}
+
+    def _key(self, xy):
+        return int(np.floor(xy[0] / self.cell_size)), int(np.floor(xy[1] / self.cell_size))
+
+    def insert(self, item, xy):
+        key = self._key(xy)
+        old = self._where.get(item)
+        if old == key:
+            return
+        if old is not None:
+            self._buckets[old].discard(item)
+        self._buckets.setdefault(key, set()).add(item)
+        self._where[item] = key
+
+    def remove(self, item):
+        key = self._where.pop(item, None)
+        if key is not None:
+            self._buckets[key].discard(item)
+
+    def query(self, xy, radius, positions):
+        """Items within `radius` of xy; `positions` maps item -> current xy."""
+        reach = int(np.ceil(radius / self.cell_size))
+        cx, cy = self._key(xy)
+        found = []
+        for ix in range(cx - reach, cx + reach + 1):
+            for iy in range(cy - reach, cy + reach + 1):
+                for item in self._buckets.get((ix, iy), ()):
+                    p = positions[item]
+                    if (p[0] - xy[0]) ** 2 + (p[1] - xy[1]) ** 2 <= radius * radius:
+                        found.append(item)
+        return sorted(found)
+
+    def query_box(self, low, high, positions):
+        """Items with low <= xy <= high (both corners inclusive)."""
+        x0, y0 = self._key(low)
+        x1, y1 = self._key(high)
+        found = []
+        for ix in range(x0, x1 + 1):
+            for iy in range(y0, y1 + 1):
+                for item in self._buckets.get((ix, iy), ()):
+                    p = positions[item]
+                    if low[0] <= p[0] <= high[0] and low[1] <= p[1] <= high[1]:
+                        found.append(item)
+        return sorted(found)
+
+
+class PoseGraph:
+    """2D pose graph with an incremental sparse Levenberg-Marquardt solver.
+
+    Nodes are scan poses (x, y, theta); edges are relative pose measurements
+    with a 3x3 information matrix. optimize() only re-solves the part of the
+    trajectory touched by edges added since the last call: for sequential
+    odometry that is the newest node, for a loop closure it is the span of
+    nodes between the two ends of the loop. Everything older stays fixed.
+
+    The normal equations are kept as 3x3 blocks (one per node on the
+    diagonal, one per edge off it) and solved with block-Jacobi
+    preconditioned conjugate gradients, so cost follows the number of
+    active edges rather than the square of the number of nodes. Edges are
+    indexed by their newer node, so gathering the active ones does not scan
+    the whole graph, and a loop closure whose nodes are both older than the
+    re-solved span is left out like any other fixed edge.
+    """
+
+    def __init__(self, cell_size=2.0):
+        self._poses = np.zeros((64, 3))
+        self.num_nodes = 0
+        self.edges = []
+        # Per node, the indices of the edges it is the newer end of
+        self._edges_to = []
+        self.index = SpatialIndex(cell_size)
+        self.stats = []
+        self._dirty_from = None
+        self._optimized_nodes = 0
+
+    @property
+    def poses(self):
+        return self._poses[:self.num_nodes]
+
+    def add_node(self, pose):
+        if self.num_nodes == len(self._poses):
+            self._poses = np.concatenate([self._poses, np.zeros_like(self._poses)])
+        node = self.num_nodes
+        self._poses[node] = pose
+        self.num_nodes += 1
+        self._edges_to.append([])
+        self.index.insert(node, pose[:2])
+        return node
+
+    def add_edge(self, i, j, measurement, information):
+        """Constrain node j to sit at `measurement` in node i's frame."""
+        self.edges.append((i, j, np.asarray(measurement, dtype=float),
+                           np.asarray(information, dtype=float)))
+        self._edges_to[max(i, j)].append(len(self.edges) - 1)
+        # The older end stays fixed; everything after it may move
+        lowest = min(i, j) + 1
+        if self._dirty_from is None or lowest < self._dirty_from:
+            self._dirty_from = lowest
+
+    def loop_closure_candidates(self, node, radius, min_separation=20):
+        """Older nodes within `radius` of `node`, skipping its recent neighbours."""
+        pose = self._poses[node]
+        return [n for n in self.index.query(pose[:2], radius, self._poses)
+                if n < node - min_separation]
+
+    def optimize(self, max_iterations=10, full=False):
+        """Re-optimize the affected subgraph.
+
+        Returns a dict of node id -> new pose for every node that moved.
+        """
+        if self._dirty_from is None and not full:
+            return {}
+        started = time.perf_counter()
+        if full:
+            first = 0
+        else:
+            # Nodes added since the last call have never been optimized
+            first = min(self._dirty_from, self._optimized_nodes)
+        self._dirty_from = None
+        self._optimized_nodes = self.num_nodes
+
+        # Gauge: node 0 is always fixed, and so is anything older than `first`
+        first = max(first, 1)
+        active = np.arange(first, self.num_nodes)
+        if not len(active):
+            return {}
+        edges = [self.edges[k] for node in active for k in self._edges_to[node]]
+        if not edges:
+            return {}
+
+        ei = np.array([e[0] for e in edges])
+        ej = np.array([e[1] for e in edges])
+        measurements = np.array([e[2] for e in edges])
+        information = np.array([e[3] for e in edges])
+        var_i = ei - first  # negative -> fixed node
+        var_j = ej - first
+
+        poses = self._poses[:self.num_nodes].copy()
+        before = poses[active].copy()
+        error = self._error(poses, ei, ej, measurements, information)
+        initial_error = error
+        damping = 1e-4
+        iteration = 0
+        for iteration in range(1, max_iterations + 1):
+            residual, jac_i, jac_j = self._linearize(poses, ei, ej, measurements)
+            step = self._solve(len(active), var_i, var_j, residual, jac_i, jac_j,
+                               information, damping)
+            candidate = poses.copy()
+            candidate[active] += step
+            candidate[active, 2] = wrap_angle(candidate[active, 2])
+            new_error = self._error(candidate, ei, ej, measurements, information)
+            if new_error < error:
+                poses, error = candidate, new_error
+                damping = max(damping / 10, 1e-9)
+                if np.abs(step).max() < 1e-6:
+                    break
+            else:
+                damping *= 10
+                if damping > 1e6:
+                    break
+
+        self._poses[:self.num_nodes] = poses
+        moved = {}
+        for node, old in zip(active, before):
+            if np.any(np.abs(poses[node] - old) > 1e-9):
+                moved[int(node)] = poses[node].copy()
+                self.index.insert(int(node), poses[node, :2])
+        self.stats.append(OptimizationStats(time.perf_counter() - started, iteration,
+                                            len(active), len(edges), initial_error, error))
+        return moved
+
+    @staticmethod
+    def _residuals(poses, ei, ej, measurements):
+        pi, pj = poses[ei], poses[ej]
+        ci, si = np.cos(pi[:, 2]), np.sin(pi[:, 2])
+        cm, sm = np.cos(measurements[:, 2]), np.sin(measurements[:, 2])
+        dx, dy = pj[:, 0] - pi[:, 0], pj[:, 1] - pi[:, 1]
+        # Translation of j in i's frame, minus the measurement, in the measurement frame
+        lx = ci * dx + si * dy - measurements[:, 0]
+        ly = -si * dx + ci * dy - measurements[:, 1]
+        residual = np.stack([cm * lx + sm * ly, -sm * lx + cm * ly,
+                             wrap_angle(pj[:, 2] - pi[:, 2] - measurements[:, 2])], axis=1)
+        return residual, (ci, si, cm, sm, dx, dy)
+
+    def _error(self, poses, ei, ej, measurements, information):
+        residual, _ = self._residuals(poses, ei, ej, measurements)
+        return float(np.einsum('ni,nij,nj->', residual, information, residual))
+
+    def _linearize(self, poses, ei, ej, measurements):
+        residual, (ci, si, cm, sm, dx, dy) = self._residuals(poses, ei, ej, measurements)
+        n = len(ei)
+        # Rt = R_m^T R_i^T
+        rt = np.empty((n, 2, 2))
+        rt[:, 0, 0] = cm * ci - sm * si
+        rt[:, 0, 1] = cm * si + sm * ci
+        rt[:, 1, 0] = -sm * ci - cm * si
+        rt[:, 1, 1] = -sm * si + cm * ci
+        # d(R_i^T)/d(theta_i) applied to (t_j - t_i), rotated into the measurement frame
+        dlx = -si * dx + ci * dy
+        dly = -ci * dx - si * dy
+        jac_i = np.zeros((n, 3, 3))
+        jac_j = np.zeros((n, 3, 3))
+        jac_i[:, :2, :2] = -rt
+        jac_i[:, 0, 2] = cm * dlx + sm * dly
+        jac_i[:, 1, 2] = -sm * dlx + cm * dly
+        jac_i[:, 2, 2] = -1
+        jac_j[:, :2, :2] = rt
+        jac_j[:, 2, 2] = 1
+        return residual, jac_i, jac_j
+
+    @staticmethod
+    def _solve(num_vars, var_i, var_j, residual, jac_i, jac_j, information, damping,
+               tolerance=1e-10, max_cg=200):
+        # Assemble block-sparse normal equations H dx = -b
+        jti = np.einsum('nki,nkl->nil', jac_i, information)
+        jtj = np.einsum('nki,nkl->nil', jac_j, information)
+        h_ii = np.einsum('nil,nlj->nij', jti, jac_i)
+        h_jj = np.einsum('nil,nlj->nij', jtj, jac_j)
+        h_ij = np.einsum('nil,nlj->nij', jti, jac_j)
+        b_i = np.einsum('nil,nl->ni', jti, residual)
+        b_j = np.einsum('nil,nl->ni', jtj, residual)
+
+        diag = np.zeros((num_vars, 3, 3))
+        rhs = np.zeros((num_vars, 3))
+        act_i, act_j = var_i >= 0, var_j >= 0
+        np.add.at(diag, var_i[act_i], h_ii[act_i])
+        np.add.at(diag, var_j[act_j], h_jj[act_j])
+        np.add.at(rhs, var_i[act_i], -b_i[act_i])
+        np.add.at(rhs, var_j[act_j], -b_j[act_j])
+        diag += damping * (np.eye(3) + diag * np.eye(3))
+
+        both = act_i & act_j
+        off_i, off_j, off = var_i[both], var_j[both], h_ij[both]
+        off_t = np.transpose(off, (0, 2, 1))
+
+        def matvec(x):
+            y = np.einsum('nij,nj->ni', diag, x)
+            np.add.at(y, off_i, np.einsum('nij,nj->ni', off, x[off_j]))
+            np.add.at(y, off_j, np.einsum('nij,nj->ni', off_t, x[off_i]))
+            return y
+
+        preconditioner = np.linalg.inv(diag)
+        x = np.zeros((num_vars, 3))
+        r = rhs.copy()
+        z = np.einsum('nij,nj->ni', preconditioner, r)
+        p = z.copy()
+        rz = float((r * z).sum())
+        for _ in range(max_cg):
+            if float((r * r).sum()) < tolerance:
+                break
+            hp = matvec(p)
+            alpha = rz / float((p * hp).sum())
+            x += alpha * p
+            r -= alpha * hp
+            z = np.einsum('nij,nj->ni', preconditioner, r)
+            rz_new = float((r * z).sum())
+            p = z + (rz_new / rz) * p
+            rz = rz_new
+        return x
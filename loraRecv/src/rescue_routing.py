@@ -0,0 +1,219 @@
+from collections import namedtuple
+
+import numpy as np
+
+from planner import distance_field, descend
+
+RescuePlan = namedtuple('RescuePlan', ['order', 'cost', 'unreachable'])
+
+# 8-connected (drow, dcol, cost) steps
+STEPS = [(dr, dc, float(np.hypot(dr, dc))) for dr in (-1, 0, 1) for dc in (-1, 0, 1) if dr or dc]
+
+
+def nearest_neighbour(matrix, start=0):
+    """Open tour from `start` that always moves to the closest unvisited node."""
+    remaining = set(range(len(matrix))) - {start}
+    order = [start]
+    while remaining:
+        here = order[-1]
+        nxt = min(remaining, key=lambda node: matrix[here, node])
+        order.append(nxt)
+        remaining.discard(nxt)
+    return order
+
+
+def path_cost(order, matrix):
+    return float(sum(matrix[a, b] for a, b in zip(order[:-1], order[1:])))
+
+
+def two_opt(order, matrix):
+    """Improve an open tour by segment reversal, keeping its first node fixed.
+
+    Reversing order[i:j + 1] swaps the edges (i - 1, i) and (j, j + 1) for
+    (i - 1, j) and (i, j + 1); the tail edge is absent when j is the end.
+    """
+    order = list(order)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(order) - 1):
+            for j in range(i + 1, len(order)):
+                a, b = order[i - 1], order[i]
+                c = order[j]
+                before = matrix[a, b]
+                after = matrix[a, c]
+                if j + 1 < len(order):
+                    d = order[j + 1]
+                    before += matrix[c, d]
+                    after += matrix[b, d]
+                if after < before - 1e-9:
+                    order[i:j + 1] = order[i:j + 1][::-1]
+                    improved = True
+    return order
+
+
+class RescueRouter:
+    """Order in which to visit every detected person from the drone's cell.
+
+    One distance field is kept per person, never one search per pair: a
+    person's field gives its cost to every other person and, because moves
+    are symmetric, to wherever the drone currently is. The person-to-person
+    matrix is read out of the cached fields, and the visit order comes from
+    nearest neighbour followed by 2-opt.
+
+    When the cost map gains obstacles (a new fire), a field is recomputed
+    only if one of the newly blocked cells is no farther from that person
+    than the farthest target it serves; a shortest path of cost D never
+    passes a cell farther than D, so every other field is still exact up
+    to that distance. Each field remembers the radius it is exact to, and
+    is recomputed once a person or drone cell beyond it is queried. A new
+    person costs one search. Cells that become free invalidate all.
+
+    A person inside a fire zone is reported unreachable. A drone inside
+    one may still fly out of it: its costs are those of the cheapest way
+    out of the zone to a free cell, then that person's field from there.
+    """
+
+    def __init__(self, costmap):
+        self.costmap = costmap
+        self.persons = []
+        self._fields = []
+        self._radius = []
+        self._version = costmap.version
+        self._blocked = costmap.blocked()
+        self._escape = None
+        self.searches = 0
+
+    def __len__(self):
+        return len(self.persons)
+
+    def add_person(self, cell):
+        """Register a person at (row, col); returns their index."""
+        cell = (int(cell[0]), int(cell[1]))
+        self.costmap.add_person([cell[0]], [cell[1]])
+        self.persons.append(cell)
+        self._fields.append(None)
+        self._radius.append(np.inf)
+        return len(self.persons) - 1
+
+    def add_person_at(self, xy):
+        rows, cols = self.costmap.world_to_cell(np.asarray(xy, dtype=float))
+        return self.add_person((rows, cols))
+
+    def _sync(self, drone):
+        if self.costmap.version == self._version:
+            return
+        blocked = self.costmap.blocked()
+        if (self._blocked & ~blocked).any():
+            self._fields = [None] * len(self.persons)
+        else:
+            added = np.flatnonzero((blocked & ~self._blocked).reshape(-1))
+            cells = self.persons + [drone]
+            for index, field in enumerate(self._fields):
+                if field is None:
+                    continue
+                # Stale values only ever underestimate, so beyond the old
+                # radius they cannot stretch the new one
+                reach = max((field[row, col] for row, col in cells if np.isfinite(field[row, col])),
+                            default=0.0)
+                reach = min(reach, self._radius[index])
+                if (field.reshape(-1)[added] <= reach).any():
+                    self._fields[index] = None
+                else:
+                    self._radius[index] = reach
+        self._blocked = blocked
+        self._version = self.costmap.version
+        self._escape = None
+
+    def field(self, person, cells=(), exact=False):
+        """Distance field of a person, exact at each of `cells` (everywhere if `exact`)."""
+        field = self._fields[person]
+        if field is not None and np.isfinite(self._radius[person]):
+            rows, cols = np.array(list(cells), dtype=int).reshape(-1, 2).T
+            values = field[rows, cols]
+            # Unreachable stays unreachable as cells are only blocked
+            if exact or ((values > self._radius[person]) & np.isfinite(values)).any():
+                field = None
+        if field is None:
+            cell = self.persons[person]
+            if self._blocked[cell]:
+                # In a fire zone: nowhere leads there
+                field = np.full(self._blocked.shape, np.inf)
+            else:
+                field = distance_field(self._blocked, cell)
+                self.searches += 1
+            self._fields[person] = field
+            self._radius[person] = np.inf
+        return field
+
+    def escape(self, drone):
+        """Ways out of the fire zone around a drone standing in one.
+
+        Returns the cost of flying from the drone to each zone cell (inf
+        elsewhere), the cost to each free cell entered straight from the
+        zone (inf elsewhere), and the (drow, dcol) step it was entered by.
+        """
+        if self._escape is None or self._escape[0] != drone:
+            inside = distance_field(~self._blocked, drone)
+            rows, cols = inside.shape
+            exits = np.full((rows, cols), np.inf)
+            steps = np.zeros((rows, cols, 2), dtype=int)
+            for dr, dc, cost in STEPS:
+                # Free cell (r, c) entered from zone cell (r - dr, c - dc)
+                entered = np.full((rows, cols), np.inf)
+                entered[max(dr, 0):rows + min(dr, 0), max(dc, 0):cols + min(dc, 0)] = \
+                    inside[max(-dr, 0):rows + min(-dr, 0), max(-dc, 0):cols + min(-dc, 0)] + cost
+                better = (entered < exits) & ~self._blocked
+                exits[better] = entered[better]
+                steps[better] = (dr, dc)
+            self._escape = (drone, inside, exits, steps)
+        return self._escape[1:]
+
+    def matrix(self, drone):
+        """Costs between the drone (index 0) and every person (index 1..n)."""
+        drone = (int(drone[0]), int(drone[1]))
+        self._sync(drone)
+        cells = [drone] + self.persons
+        rows, cols = np.array(cells).T
+        matrix = np.zeros((len(cells), len(cells)))
+        trapped = bool(self._blocked[drone])
+        for person in range(len(self.persons)):
+            # Leaving a fire zone reads the field at every exit, not just at `cells`
+            field = self.field(person, cells, exact=trapped)
+            matrix[person + 1] = field[rows, cols]
+            if trapped:
+                matrix[person + 1, 0] = np.min(self.escape(drone)[1] + field)
+        matrix[0] = matrix[:, 0]
+        return matrix
+
+    def plan(self, drone):
+        """Visit order (person indices) from the drone's (row, col)."""
+        matrix = self.matrix(drone)
+        reachable = [0] + [n for n in range(1, len(matrix)) if np.isfinite(matrix[0, n])]
+        unreachable = [n - 1 for n in range(1, len(matrix)) if not np.isfinite(matrix[0, n])]
+        sub = matrix[np.ix_(reachable, reachable)]
+        order = two_opt(nearest_neighbour(sub), sub)
+        return RescuePlan([reachable[n] - 1 for n in order[1:]], path_cost(order, sub), unreachable)
+
+    def legs(self, plan, drone):
+        """(N, 2) cell paths for each leg of a plan, starting at the drone."""
+        legs = []
+        here = (int(drone[0]), int(drone[1]))
+        for person in plan.order:
+            if self._blocked[here]:
+                legs.append(self._escape_leg(person, here))
+            else:
+                # The person's field descends from `here` to the person; flip it
+                route = descend(self.field(person, [here]), here)
+                legs.append(route.cells[::-1])
+            here = self.persons[person]
+        return legs
+
+    def _escape_leg(self, person, drone):
+        # Out of the zone by the cheapest exit for this person, then down their field
+        inside, exits, steps = self.escape(drone)
+        field = self.field(person, exact=True)
+        exit_cell = np.unravel_index(np.argmin(exits + field), field.shape)
+        last = (exit_cell[0] - steps[exit_cell][0], exit_cell[1] - steps[exit_cell][1])
+        out = descend(inside, last).cells
+        return np.vstack([out, descend(field, exit_cell).cells[::-1]])
@@ -0,0 +1,146 @@
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from wire_protocol import INVALID_DISTANCE, NUM_READINGS
+
+# A spike is a reading this far (m) from the median of itself and its two
+# angular neighbours
+MAX_JUMP = 0.5
+
+
+class NormalizedScans(namedtuple('NormalizedScans', ['ranges', 'angles', 'points', 'counts'])):
+    """A batch of cleaned scans in fixed-width (B, N) arrays.
+
+    Row i holds counts[i] readings sorted by angle, then NaN. `ranges` are
+    in meters and `angles` in radians; `points` are the sensor-frame (x, y)
+    endpoints, NaN for beams beyond max_range, which only clear space.
+    """
+
+    __slots__ = ()
+
+    def scan(self, i):
+        """(ranges, angles, points) of one scan; points holds only the hits."""
+        count = self.counts[i]
+        points = self.points[i, :count]
+        return self.ranges[i, :count], self.angles[i, :count], points[np.isfinite(points[:, 0])]
+
+
+def _compact(keep, *arrays):
+    # Move each row's kept entries to the front (stable), NaN after them
+    order = np.argsort(~keep, axis=1, kind='stable')
+    keep = np.take_along_axis(keep, order, axis=1)
+    return keep, [np.where(keep, np.take_along_axis(a, order, axis=1), np.nan) for a in arrays]
+
+
+def normalize_scans(ranges, angles, min_range=0.1, max_range=8.0, max_jump=MAX_JUMP, voxel_size=0.05):
+    """Clean a batch of raw scans as the transmitter packs them.
+
+    `ranges` are in cm and `angles` in degrees, shape (B, N) (or (N,) for a
+    single scan). The transmitter appends its retrace readings out of
+    angular order, pads unused slots with INVALID_DISTANCE and writes
+    gyro-corrected angles, so per scan this:
+
+    - drops padding and readings below min_range,
+    - sorts by angle and averages readings taken at the same angle,
+    - drops range spikes with a 3-point median filter (`max_jump`, m),
+    - keeps the first reading in each `voxel_size` cell (None to skip),
+    - computes the Cartesian endpoints.
+
+    Every step works on the whole batch at once.
+    """
+    raw = np.atleast_2d(np.asarray(ranges))
+    angles = np.atleast_2d(np.asarray(angles, dtype=float))
+    batch, width = raw.shape
+    ranges = raw / 100.0
+    valid = (raw != INVALID_DISTANCE) & np.isfinite(ranges) & (ranges >= min_range)
+
+    # Sort by angle with the dropped readings last
+    order = np.argsort(np.where(valid, angles, np.inf), axis=1, kind='stable')
+    valid = np.take_along_axis(valid, order, axis=1)
+    ranges = np.take_along_axis(ranges, order, axis=1)
+    angles = np.take_along_axis(angles, order, axis=1)
+
+    # Merge runs of equal angles: group g of row b lands in slot b * width + g
+    repeat = np.zeros_like(valid)
+    repeat[:, 1:] = valid[:, 1:] & valid[:, :-1] & (angles[:, 1:] == angles[:, :-1])
+    group = np.cumsum(valid & ~repeat, axis=1) - 1
+    slots = (np.arange(batch)[:, None] * width + group)[valid]
+    counts = np.bincount(slots, minlength=batch * width).reshape(batch, width)
+    sums = np.bincount(slots, weights=ranges[valid], minlength=batch * width).reshape(batch, width)
+    merged = np.full((batch, width), np.nan)
+    merged.flat[slots] = angles[valid]
+    valid = counts > 0
+    with np.errstate(invalid='ignore'):
+        ranges = np.where(valid, sums / np.maximum(counts, 1), np.nan)
+    angles = merged
+
+    # Median of each reading and its neighbours; the ends are their own neighbour
+    previous = np.concatenate([ranges[:, :1], ranges[:, :-1]], axis=1)
+    following = np.concatenate([ranges[:, 1:], np.full((batch, 1), np.nan)], axis=1)
+    following = np.where(np.isnan(following), ranges, following)
+    median = np.sort(np.stack([previous, ranges, following]), axis=0)[1]
+    with np.errstate(invalid='ignore'):
+        valid &= ~(np.abs(ranges - median) > max_jump)
+    valid, (ranges, angles) = _compact(valid, ranges, angles)
+
+    angles = np.radians(angles)
+    points = np.stack([ranges * np.cos(angles), ranges * np.sin(angles)], axis=-1)
+    hit = valid & (ranges <= max_range)
+    points[~hit] = np.nan
+
+    if voxel_size:
+        # First hit per (scan, cell); beams past max_range are all kept
+        span = 2 * int(np.ceil(max_range / voxel_size)) + 3
+        cells = np.floor(np.nan_to_num(points) / voxel_size).astype(np.int64) + span // 2
+        keys = (np.arange(batch)[:, None] * span + cells[..., 0]) * span + cells[..., 1]
+        keep = valid & ~hit
+        _, first = np.unique(keys[hit], return_index=True)
+        keep.flat[np.flatnonzero(hit)[first]] = True
+        valid, (ranges, angles, x, y) = _compact(keep, ranges, angles, points[..., 0], points[..., 1])
+        points = np.stack([x, y], axis=-1)
+
+    return NormalizedScans(ranges, angles, points, valid.sum(axis=1))
+
+
+def synthetic_scans(count, seed=0):
+    """(ranges cm, angles deg) int16 scans shaped like the transmitter's packets.
+
+    A 0-176 degree sweep in 4 degree steps with a few retrace readings
+    appended out of order, an occasional spike, and INVALID_DISTANCE
+    padding in the slots left over.
+    """
+    rng = np.random.default_rng(seed)
+    sweep = np.arange(0, 180, 4)
+    ranges = np.full((count, NUM_READINGS), INVALID_DISTANCE, dtype=np.int16)
+    angles = np.zeros((count, NUM_READINGS), dtype=np.int16)
+    for i in range(count):
+        steps = rng.integers(36, 42)
+        a = sweep[:steps] + rng.integers(-2, 3)
+        r = 300 + 150 * np.sin(np.radians(a) * 2 + i) + rng.normal(0, 2, steps)
+        r[rng.integers(steps)] += 400
+        retrace = rng.choice(a, NUM_READINGS - steps - 1)
+        a = np.concatenate([a, retrace])
+        r = np.concatenate([r, 300 + 150 * np.sin(np.radians(retrace) * 2 + i)])
+        ranges[i, :len(r)] = np.clip(r, 1, INVALID_DISTANCE - 1)
+        angles[i, :len(a)] = a
+    return ranges, angles
+
+
+def benchmark(scans=2000, batch_size=256, seed=0):
+    """Scans/s normalized one at a time vs. in batches."""
+    ranges, angles = synthetic_scans(scans, seed)
+    started = time.perf_counter()
+    for i in range(scans):
+        normalize_scans(ranges[i], angles[i])
+    single = time.perf_counter() - started
+    started = time.perf_counter()
+    for i in range(0, scans, batch_size):
+        normalize_scans(ranges[i:i + batch_size], angles[i:i + batch_size])
+    batched = time.perf_counter() - started
+    return {'single_scans_per_s': scans / single, f'batch_{batch_size}_scans_per_s': scans / batched}
+
+
+if __name__ == '__main__':
+    print(benchmark())
@@ -0,0 +1,530 @@
+"""Live occupancy map, poses and events in shared memory.
+
+The SLAM process publishes into a named multiprocessing.shared_memory
+segment; every web worker attaches to the same name and reads NumPy views
+straight out of it, without pickling, pipes or files:
+
+    writer = SharedMap('hexit-map', create=True)     # ingestion side
+    writer.publish(slam.grid, slam.poses, [c.to_dict() for c in slam.events.events()])
+
+    reader = SharedMap('hexit-map')                  # each gunicorn worker
+    snapshot = reader.snapshot()
+    blocked, origin = snapshot.occupied_mask()
+
+serve() (or `python shared_map.py PORT --name hexit-map`) is the ingestion
+side in full: it creates the segment and publishes every SLAM step to it.
+
+The segment holds a small header and two slots. Each slot is a complete
+map (a fixed dense window of int8 log-odds cells, centered on the map
+origin, plus per-tile revisions), the pose array and the event table. A
+publish writes the slot the readers are *not* using and then points the
+header at it, so readers never wait for the writer. Each slot carries a
+seqlock counter: the writer makes it odd before touching the slot and even
+again after. A snapshot remembers the counter it started from;
+Snapshot.consistent() tells whether the writer has since come round to
+that slot again (two publishes later), in which case the views may be
+torn and the caller retries.
+
+Only changed tiles are copied into a slot, so a publish costs the tiles
+written since that slot was last filled, not the whole window.
+"""
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from tiled_map import TiledMap, TILE_SIZE, LOG_ODDS_SCALE
+from occupancy_grid import to_probability
+
+MAGIC = 0x48455849544D4150  # 'HEXITMAP'
+# Segment name when SHARED_MAP_NAME is not set
+DEFAULT_NAME = 'hexit-map'
+SLOTS = 2
+
+HEADER_DTYPE = np.dtype([
+    ('magic', '<u8'),
+    ('rows', '<i8'),
+    ('cols', '<i8'),
+    ('tile_size', '<i8'),
+    ('max_poses', '<i8'),
+    ('max_events', '<i8'),
+    # Number of publishes so far; the current slot is generation % SLOTS
+    ('generation', '<u8'),
+    # Bumped when the writer starts following a new grid
+    ('epoch', '<u8'),
+])
+
+SLOT_DTYPE = np.dtype([
+    ('seq', '<u8'),
+    ('generation', '<u8'),
+    ('epoch', '<u8'),
+    ('revision', '<i8'),
+    ('resolution', '<f8'),
+    ('time', '<f8'),
+    # (row_min, col_min, row_max, col_max) of the tiles mapped, global cells
+    ('bounds', '<i8', (4,)),
+    ('poses', '<i8'),
+    ('events', '<i8'),
+])
+
+EVENT_DTYPE = np.dtype([
+    ('id', '<i8'),
+    ('type', 'S16'),
+    ('x', '<f8'),
+    ('y', '<f8'),
+    ('count', '<i8'),
+    ('confidence', '<f8'),
+    ('first_time', '<f8'),
+    ('last_time', '<f8'),
+])
+
+
+def _aligned(size, alignment=64):
+    return -(-size // alignment) * alignment
+
+
+class _Layout:
+    # Byte offsets of everything in the segment, derived from the header fields
+
+    def __init__(self, rows, cols, tile_size, max_poses, max_events):
+        if rows % (2 * tile_size) or cols % (2 * tile_size):
+            raise ValueError("rows and cols must be multiples of twice the tile size")
+        self.rows, self.cols, self.tile_size = rows, cols, tile_size
+        self.max_poses, self.max_events = max_poses, max_events
+        self.tile_shape = (rows // tile_size, cols // tile_size)
+        # Global (row, col) of the window's first cell: the map origin sits in the middle
+        self.corner = (-rows // 2, -cols // 2)
+        self.meta = 0
+        self.cells = _aligned(SLOT_DTYPE.itemsize)
+        self.revisions = self.cells + _aligned(rows * cols)
+        self.poses = self.revisions + _aligned(8 * self.tile_shape[0] * self.tile_shape[1])
+        self.events = self.poses + _aligned(24 * max_poses)
+        self.slot_size = self.events + _aligned(EVENT_DTYPE.itemsize * max_events)
+        self.header_size = _aligned(HEADER_DTYPE.itemsize)
+        self.size = self.header_size + SLOTS * self.slot_size
+
+
+class _Slot:
+    """NumPy views of one slot."""
+
+    def __init__(self, buf, offset, layout):
+        def view(start, dtype, shape):
+            return np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset + start)
+
+        self.meta = view(layout.meta, SLOT_DTYPE, ())
+        self.cells = view(layout.cells, np.int8, (layout.rows, layout.cols))
+        self.revisions = view(layout.revisions, np.int64, layout.tile_shape)
+        self.poses = view(layout.poses, np.float64, (layout.max_poses, 3))
+        self.events = view(layout.events, EVENT_DTYPE, (layout.max_events,))
+
+
+def _readonly(array):
+    array = array.view()
+    array.setflags(write=False)
+    return array
+
+
+class _TileView:
+    __slots__ = ('data', 'revision')
+
+    def __init__(self, data, revision):
+        self.data = data
+        self.revision = revision
+
+
+class SharedTiles:
+    """The TiledMap interface TileRenderer and MapStream read, over a snapshot."""
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+        self.tile_size = snapshot.tile_size
+        self.revision = snapshot.revision
+        self.tiles = _TileMapping(snapshot)
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def dirty_tiles(self, since):
+        """Keys of tiles written after revision `since`."""
+        rows, cols = np.nonzero(self._snapshot.tile_revisions > since)
+        return [self._snapshot.tile_key(r, c) for r, c in zip(rows.tolist(), cols.tolist())]
+
+
+class _TileMapping:
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+
+    def __len__(self):
+        return int(np.count_nonzero(self._snapshot.tile_revisions))
+
+    def __getitem__(self, key):
+        tile = self._snapshot.tile(key)
+        if tile is None:
+            raise KeyError(key)
+        return tile
+
+    def __contains__(self, key):
+        return self._snapshot.tile(key) is not None
+
+
+class Snapshot:
+    """A consistent, zero-copy view of one published map.
+
+    `cells` is the whole int8 log-odds window; `poses` and `events` are the
+    published rows only. All arrays are read-only views into shared memory,
+    valid while consistent() is True.
+    """
+
+    def __init__(self, slot, seq, layout):
+        meta = slot.meta
+        self._meta = meta
+        self._seq = seq
+        self.generation = int(meta['generation'])
+        self.epoch = int(meta['epoch'])
+        self.revision = int(meta['revision'])
+        self.resolution = float(meta['resolution'])
+        self.time = float(meta['time'])
+        self.bounds = tuple(int(v) for v in meta['bounds'])
+        self.tile_size = layout.tile_size
+        self.corner = layout.corner
+        self.cells = _readonly(slot.cells)
+        self.tile_revisions = _readonly(slot.revisions)
+        self.poses = _readonly(slot.poses[:int(meta['poses'])])
+        self.events = _readonly(slot.events[:int(meta['events'])])
+
+    def consistent(self):
+        """True while the writer has not started overwriting this snapshot's slot."""
+        return int(self._meta['seq']) == self._seq
+
+    def tile_key(self, row, col):
+        """Global tile key of the window's tile at (row, col)."""
+        size = self.tile_size
+        return row + self.corner[0] // size, col + self.corner[1] // size
+
+    def tile(self, key):
+        """View of one tile by global key, or None if it was never written."""
+        size = self.tile_size
+        row, col = key[0] - self.corner[0] // size, key[1] - self.corner[1] // size
+        if not (0 <= row < self.tile_revisions.shape[0] and 0 <= col < self.tile_revisions.shape[1]):
+            return None
+        revision = int(self.tile_revisions[row, col])
+        if not revision:
+            return None
+        return _TileView(self.cells[row * size:(row + 1) * size, col * size:(col + 1) * size], revision)
+
+    @property
+    def tiles(self):
+        return SharedTiles(self)
+
+    def window(self, bounds=None):
+        """int8 view of `bounds` (global cells, default: everything mapped) and its corner."""
+        row_min, col_min, row_max, col_max = bounds or self.bounds
+        r0, c0 = self.corner
+        return self.cells[row_min - r0:row_max - r0, col_min - c0:col_max - c0], (row_min, col_min)
+
+    def occupied_mask(self, threshold=0.65, bounds=None):
+        """Like OccupancyGrid.occupied_mask: the mask and the world (x, y) of its corner."""
+        cells, (row, col) = self.window(bounds)
+        probability = to_probability(cells * np.float32(LOG_ODDS_SCALE))
+        return probability > threshold, (col / self.resolution, row / self.resolution)
+
+    def event_dicts(self):
+        """Events in EventCluster.to_dict() form."""
+        return [{'id': int(e['id']), 'type': e['type'].decode(), 'pose': [float(e['x']), float(e['y'])],
+                 'count': int(e['count']), 'confidence': float(e['confidence']),
+                 'first_time': float(e['first_time']), 'last_time': float(e['last_time'])}
+                for e in self.events]
+
+
+class SharedGrid:
+    """Stand-in for an OccupancyGrid that always reads the latest snapshot.
+
+    Hand it to TileRenderer (or MapStream) in a process that does not run
+    SLAM itself.
+    """
+
+    def __init__(self, shared):
+        self.shared = shared
+
+    @property
+    def tiles(self):
+        snapshot = self.shared.snapshot()
+        return snapshot.tiles if snapshot is not None else TiledMap(self.shared.tile_size)
+
+    @property
+    def resolution(self):
+        snapshot = self.shared.snapshot()
+        return snapshot.resolution if snapshot is not None else None
+
+    @property
+    def epoch(self):
+        snapshot = self.shared.snapshot()
+        return snapshot.epoch if snapshot is not None else 0
+
+
+# Segments created by this process
+_created = set()
+
+
+def _attach(name):
+    # Before 3.13 every process that attaches registers the segment with its
+    # resource tracker, which unlinks it when that process exits; a reader
+    # (a web worker being recycled) must not take the map down with it
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        memory = shared_memory.SharedMemory(name)
+        if memory.name not in _created:
+            resource_tracker.unregister(memory._name, 'shared_memory')
+        return memory
+
+
+class SharedMap:
+    """Named shared memory segment holding the live map, written by one process.
+
+    `rows` x `cols` cells around the map origin are shared; tiles outside
+    that window are not published (counted in `dropped_tiles`). With
+    create=False the sizes are read from the segment's header.
+    """
+
+    def __init__(self, name=None, create=False, rows=2048, cols=2048, tile_size=TILE_SIZE,
+                 max_poses=8192, max_events=1024):
+        if create:
+            layout = _Layout(rows, cols, tile_size, max_poses, max_events)
+            self.memory = shared_memory.SharedMemory(name, create=True, size=layout.size)
+            _created.add(self.memory.name)
+            self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.memory.buf)
+            self.header[()] = (0, rows, cols, tile_size, max_poses, max_events, 0, 0)
+        else:
+            self.memory = _attach(name)
+            self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.memory.buf)
+            layout = _Layout(int(self.header['rows']), int(self.header['cols']), int(self.header['tile_size']),
+                             int(self.header['max_poses']), int(self.header['max_events']))
+        self.layout = layout
+        self.name = self.memory.name
+        self.owner = create
+        self.slots = [_Slot(self.memory.buf, layout.header_size + i * layout.slot_size, layout)
+                      for i in range(SLOTS)]
+        if create:
+            # Readers check the magic last, so they never see a half-built header
+            self.header['magic'] = MAGIC
+        elif int(self.header['magic']) != MAGIC:
+            self.memory.close()
+            raise ValueError(f"Shared memory {name!r} does not hold a map")
+        self.dropped_tiles = 0
+        self._grid = None
+        self._stale = set()
+
+    @property
+    def tile_size(self):
+        return self.layout.tile_size
+
+    @property
+    def generation(self):
+        return int(self.header['generation'])
+
+    def publish(self, grid, poses=(), events=()):
+        """Copy the tiles `grid` changed, all poses and the event dicts into the spare slot."""
+        if not self.owner:
+            raise RuntimeError("Only the process that created the map can publish")
+        layout = self.layout
+        store = grid.tiles
+        if store.tile_size != layout.tile_size:
+            raise ValueError("Grid tile size does not match the shared map")
+        if grid is not self._grid:
+            self._grid = grid
+            self._stale = set(range(SLOTS))
+            self.header['epoch'] += 1
+
+        generation = self.generation + 1
+        index = generation % SLOTS
+        slot = self.slots[index]
+        meta = slot.meta
+        meta['seq'] += 1
+        if index in self._stale:
+            slot.cells[:] = 0
+            slot.revisions[:] = 0
+            meta['revision'] = 0
+            self._stale.discard(index)
+
+        size = layout.tile_size
+        base_row, base_col = layout.corner[0] // size, layout.corner[1] // size
+        for key in store.dirty_tiles(int(meta['revision'])):
+            row, col = key[0] - base_row, key[1] - base_col
+            if not (0 <= row < layout.tile_shape[0] and 0 <= col < layout.tile_shape[1]):
+                self.dropped_tiles += 1
+                continue
+            tile = store.tiles[key]
+            slot.cells[row * size:(row + 1) * size, col * size:(col + 1) * size] = tile.data
+            slot.revisions[row, col] = tile.revision
+        rows, cols = np.nonzero(slot.revisions)
+        if len(rows):
+            meta['bounds'] = ((rows.min() + base_row) * size, (cols.min() + base_col) * size,
+                              (rows.max() + base_row + 1) * size, (cols.max() + base_col + 1) * size)
+        else:
+            meta['bounds'] = (0, 0, 0, 0)
+
+        # The most recent poses and events when there are more than fit
+        poses = np.asarray(poses, dtype=float).reshape(-1, 3)[-layout.max_poses:]
+        slot.poses[:len(poses)] = poses
+        events = list(events)[-layout.max_events:]
+        for i, event in enumerate(events):
+            slot.events[i] = (event.get('id', 0), event['type'].encode()[:16], event['pose'][0], event['pose'][1],
+                       event.get('count', 1), event.get('confidence', 0.0), event.get('first_time', 0.0),
+                       event.get('last_time', 0.0))
+
+        meta['revision'] = store.revision
+        meta['resolution'] = grid.resolution
+        meta['time'] = time.time()
+        meta['poses'] = len(poses)
+        meta['events'] = len(events)
+        meta['epoch'] = self.header['epoch']
+        meta['generation'] = generation
+        meta['seq'] += 1
+        self.header['generation'] = generation
+        return generation
+
+    def snapshot(self, retries=100):
+        """The latest published map, or None if nothing was published yet."""
+        for _ in range(retries):
+            generation = self.generation
+            if not generation:
+                return None
+            slot = self.slots[generation % SLOTS]
+            seq = int(slot.meta['seq'])
+            # Odd: the writer is in this slot already (it lapped us); take the newer one
+            if seq & 1 or int(slot.meta['generation']) != generation:
+                continue
+            snapshot = Snapshot(slot, seq, self.layout)
+            if snapshot.consistent():
+                return snapshot
+        raise RuntimeError("Could not read a consistent map snapshot")
+
+    def close(self):
+        """Detach; the creator also removes the segment.
+
+        Snapshots taken from this map must have been dropped first.
+        """
+        self.slots = []
+        self.header = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+            _created.discard(self.name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SharedMapPublisher:
+    """SlamPipeline hook that publishes the map to a SharedMap.
+
+    Publishes at most once per `interval` seconds. A scan accepted inside
+    the interval is not lost: it goes out with the next call past the
+    interval, or with flush() when the stream ends.
+    """
+
+    def __init__(self, shared, interval=0.0):
+        self.shared = shared
+        self.interval = interval
+        self._last = float('-inf')
+        self._pending = None
+
+    def __call__(self, slam, pair, accepted):
+        if accepted:
+            self._pending = slam
+        if self._pending is not None and time.monotonic() - self._last >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """Publish the latest accepted scan if it has not been yet."""
+        slam, self._pending = self._pending, None
+        if slam is not None:
+            self._last = time.monotonic()
+            self.shared.publish(slam.grid, slam.poses, [cluster.to_dict() for cluster in slam.events.events()])
+
+
+def shared_map_hook(shared, interval=0.0):
+    """SlamPipeline hook that publishes the map to a SharedMap (see SharedMapPublisher)."""
+    return SharedMapPublisher(shared, interval)
+
+
+def serve(source, name=DEFAULT_NAME, interval=0.1, slam_kwargs=None, **map_kwargs):
+    """Ingestion side of the web map: run SLAM on `source`, publishing into a new SharedMap.
+
+    Web workers attach to the same `name` (SHARED_MAP_NAME). Returns when
+    the source ends, after publishing the last scan; the segment is
+    removed with it.
+    """
+    import asyncio
+    from ingestion import IngestionService
+    from slam_pipeline import SlamPipeline
+
+    slam = SlamPipeline(**(slam_kwargs or {}))
+    with SharedMap(name, create=True, **map_kwargs) as shared:
+        publisher = shared_map_hook(shared, interval)
+        slam.add_hook(publisher)
+        service = IngestionService(source, [slam], name=shared.name)
+        try:
+            asyncio.run(service.run())
+        finally:
+            publisher.flush()
+            service.stop()
+    return slam
+
+
+def benchmark(scans=60, reads=2000, seed=0):
+    """Publish cost per scan, and snapshot + occupied_mask cost in a reader."""
+    from occupancy_grid import OccupancyGrid
+
+    rng = np.random.default_rng(seed)
+    grid = OccupancyGrid(resolution=20)
+    angles = np.radians(np.arange(0, 360, 2))
+    with SharedMap(create=True) as writer:
+        reader = SharedMap(writer.name)
+        publish = 0.0
+        for k in range(scans):
+            grid.insert_scan(k, (k * 0.5, 3 * np.sin(k / 10), 0.0), rng.uniform(1, 8, len(angles)), angles)
+            started = time.perf_counter()
+            writer.publish(grid, np.zeros((k + 1, 3)))
+            publish += time.perf_counter() - started
+        started = time.perf_counter()
+        for _ in range(reads):
+            reader.snapshot()
+        snapshot_us = (time.perf_counter() - started) / reads * 1e6
+        started = time.perf_counter()
+        for _ in range(20):
+            reader.snapshot().occupied_mask()
+        mask_ms = (time.perf_counter() - started) / 20 * 1e3
+        reader.close()
+    return {'publish_ms_per_scan': publish / scans * 1e3, 'snapshot_us': snapshot_us,
+            'occupied_mask_ms': mask_ms, 'segment_mb': writer.layout.size / 2 ** 20}
+
+
+def main(argv=None):
+    import argparse
+    from ingestion import file_source, serial_source
+
+    parser = argparse.ArgumentParser(description="Map a receiver stream into shared memory for the web app")
+    parser.add_argument('port', nargs='?', help="receiver serial port, or a recorded stream with --replay")
+    parser.add_argument('--replay', action='store_true', help="read `port` as a recorded stream file")
+    parser.add_argument('--baud-rate', type=int, default=115200)
+    parser.add_argument('--name', default=os.getenv('SHARED_MAP_NAME', DEFAULT_NAME),
+                        help="shared memory segment name (the web app's SHARED_MAP_NAME)")
+    parser.add_argument('--interval', type=float, default=0.1, help="publish at most every N seconds")
+    parser.add_argument('--benchmark', action='store_true', help="print the publish/read benchmark instead")
+    args = parser.parse_args(argv)
+
+    if args.benchmark or args.port is None:
+        print(benchmark())
+        return
+    source = file_source(args.port) if args.replay else serial_source(args.port, args.baud_rate)
+    serve(source, args.name, args.interval)
+
+
+if __name__ == '__main__':
+    main()
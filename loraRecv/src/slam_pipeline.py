@@ -0,0 +1,272 @@
+import numpy as np
+
+from event_store import EventStore
+from imu_preintegration import ImuPreintegrator
+from metrics import METRICS
+from occupancy_grid import OccupancyGrid
+from pose_graph import PoseGraph, relative_pose, compose
+from scan_matcher import ScanMatcher, scan_points
+from scan_normalization import normalize_scans, MAX_JUMP
+
+# Same trigger as LidarSLAMSystem.processTemperature
+HIGH_TEMPERATURE = 34.0
+
+# The matcher searches this many standard deviations of the IMU prior
+# around the prediction, but never less than these windows
+PRIOR_SIGMAS = 3.0
+MIN_LINEAR_WINDOW = 0.1
+MIN_ANGULAR_WINDOW = np.radians(3)
+
+SCANS = METRICS.counter('slam_scans_total', "Scans offered to the SLAM pipeline")
+REJECTED_SCANS = METRICS.counter('slam_rejected_scans_total', "Scans with too few valid ranges to register")
+NORMALIZE_SECONDS = METRICS.histogram('slam_normalize_seconds', "Normalizing a batch of raw scans")
+PREINTEGRATE_SECONDS = METRICS.histogram('slam_preintegrate_seconds', "Preintegrating the IMU samples of a batch of scans")
+LOOP_CLOSURES = METRICS.counter('slam_loop_closures_total', "Loop closures accepted")
+MATCH_SECONDS = METRICS.histogram('slam_match_seconds', "Scan matching against the live map")
+LOOP_CLOSURE_SECONDS = METRICS.histogram('slam_loop_closure_seconds', "Loop closure search and match")
+OPTIMIZE_SECONDS = METRICS.histogram('slam_optimize_seconds', "Pose graph optimization")
+REMAP_SECONDS = METRICS.histogram('slam_remap_seconds', "Re-inserting scans whose poses moved")
+INSERT_SECONDS = METRICS.histogram('slam_insert_seconds', "Inserting the new scan into the map")
+
+
+def _frame_covariance(covariance, theta):
+    # Rotate the translational part of a world-frame covariance into a pose frame
+    c, s = np.cos(theta), np.sin(theta)
+    rotation = np.array([[c, s, 0], [-s, c, 0], [0, 0, 1]])
+    return rotation @ covariance @ rotation.T
+
+
+class SlamPipeline:
+    """Python counterpart of LidarSLAMSystem.
+
+    Each scan is registered with the correlative ScanMatcher against the
+    live map, added to the PoseGraph with its odometry edge, checked for a
+    loop closure against the nearest older node, and inserted into the
+    OccupancyGrid. Raw packets are cleaned first by normalize_scans().
+    After an optimization only the scans whose poses moved are re-inserted,
+    instead of re-fetching scansAndPoses and rebuilding the map from every
+    scan.
+
+    An instance is callable with a ScanPair, so it can be handed straight to
+    IngestionService as a consumer. Whatever else follows the map (flight
+    log, shared map, stream, tile renderer) registers a hook with
+    add_hook() instead of wrapping the pipeline, so each scan is processed
+    once however many outputs there are.
+    """
+
+    def __init__(self, max_range=8.0, min_range=0.1, resolution=20,
+                 loop_closure_threshold=0.6, loop_closure_search_radius=8.0,
+                 loop_closure_min_separation=20, max_jump=MAX_JUMP, voxel_size=None, imu_prior=True):
+        self.max_range = max_range
+        self.min_range = min_range
+        self.max_jump = max_jump
+        # Downsample scans to the map's cell size unless told otherwise
+        self.voxel_size = 1 / resolution if voxel_size is None else voxel_size
+        self.loop_closure_threshold = loop_closure_threshold
+        self.loop_closure_search_radius = loop_closure_search_radius
+        self.loop_closure_min_separation = loop_closure_min_separation
+
+        self.grid = OccupancyGrid(resolution, max_range)
+        self.matcher = ScanMatcher(resolution, max_range=max_range)
+        self.loop_matcher = ScanMatcher(resolution, max_range=max_range, linear_window=1.0,
+                                        angular_window=np.radians(30))
+        self.graph = PoseGraph(cell_size=loop_closure_search_radius / 2)
+        self.scans = []
+        self.loop_closures = []
+
+        # Every positive packet, and the same detections merged per person/hot spot
+        self.temperature_events = []
+        self.person_events = []
+        self.events = EventStore()
+
+        self.imu = ImuPreintegrator() if imu_prior else None
+        self.hooks = []
+
+        self._last_time = None
+        self._last_scan_time = None
+        self._motion = np.zeros(3)
+
+    @property
+    def poses(self):
+        return self.graph.poses
+
+    def add_hook(self, hook):
+        """Call hook(pipeline, pair, accepted) after each ScanPair is processed."""
+        self.hooks.append(hook)
+
+    def __call__(self, pair):
+        return self.process_pair(pair)
+
+    def process_pair(self, pair):
+        """Handle one ScanPair from the ingestion service."""
+        return self.process_pairs([pair])[0]
+
+    def process_pairs(self, pairs):
+        """Handle several ScanPairs in order, normalizing their scans and
+        preintegrating their IMU packets as one batch."""
+        with NORMALIZE_SECONDS.time():
+            scans = normalize_scans([pair.scan['range'] for pair in pairs],
+                                    [pair.scan['angle'] for pair in pairs],
+                                    self.min_range, self.max_range, self.max_jump, self.voxel_size)
+        with PREINTEGRATE_SECONDS.time():
+            preintegrated, intervals = self._preintegrate(pairs)
+        accepted = []
+        for i, pair in enumerate(pairs):
+            ranges, angles, points = scans.scan(i)
+            dt = 0.0 if self._last_time is None else pair.host_time - self._last_time
+            self._last_time = pair.host_time
+            gyro_z = float(pair.imu['gyro_z']) if pair.imu is not None else None
+
+            interval = intervals.get(i)
+            if interval is None or not self.graph.num_nodes:
+                accepted.append(self.add_scan(ranges, angles, self.predict(gyro_z, dt), points))
+            else:
+                delta, covariance = self.imu.motion(preintegrated, interval)
+                nodes = self.graph.num_nodes
+                accepted.append(self.add_scan(ranges, angles, compose(self.graph.poses[-1], delta), points,
+                                              covariance))
+                # The matched motion corrects velocity and biases for the next scan
+                matched = self._motion if self.graph.num_nodes > nodes else None
+                self.imu.update(preintegrated, interval, matched)
+            self.process_temperature(float(pair.scan['temperature']))
+            self.process_person_detection(bool(pair.scan['personDetectedFlag']))
+            for hook in self.hooks:
+                hook(self, pair, accepted[-1])
+        return accepted
+
+    def _preintegrate(self, pairs):
+        # The transmitter sends one IMU packet per sweep, so each packet is
+        # held over the interval since the previous scan. Scans are timed by
+        # their own millisecond timestamps, which replays keep, falling back
+        # to the arrival time.
+        times, gyro, accel, starts, intervals = [], [], [], [], {}
+        previous = self._last_scan_time
+        for i, pair in enumerate(pairs):
+            stamp = int(pair.scan['timestamp'])
+            now = stamp / 1000 if stamp else pair.host_time
+            if self.imu is not None and pair.imu is not None and previous is not None and now > previous:
+                intervals[i] = len(starts)
+                starts.append(len(times))
+                times += [previous, now]
+                gyro += [float(pair.imu['gyro_z'])] * 2
+                accel += [(float(pair.imu['accel_x']), float(pair.imu['accel_y']))] * 2
+            previous = now
+        self._last_scan_time = previous
+        if not starts:
+            return None, intervals
+        starts = np.array(starts)
+        return self.imu.integrate(times, gyro, accel, starts, starts + 1), intervals
+
+    def predict(self, gyro_z=None, dt=0.0):
+        """Constant-velocity prediction, with yaw from the gyro when available."""
+        if not self.graph.num_nodes:
+            return np.zeros(3)
+        motion = self._motion.copy()
+        if gyro_z is not None and dt > 0:
+            motion[2] = gyro_z * dt
+        return compose(self.graph.poses[-1], motion)
+
+    def add_scan(self, ranges, angles, predicted_pose=None, points=None, prior_covariance=None):
+        """Register and map one scan (meters, radians). Returns True if accepted.
+
+        `points` are the scan's sensor-frame endpoints when already computed.
+        `prior_covariance` (3x3, x y theta) narrows the search window around
+        `predicted_pose`; without it the matcher searches its full window.
+        """
+        SCANS.inc()
+        if points is None:
+            points = scan_points(ranges, angles, self.min_range, self.max_range)
+        if len(points) < 3:
+            REJECTED_SCANS.inc()
+            return False
+        predicted_pose = np.zeros(3) if predicted_pose is None else np.asarray(predicted_pose, dtype=float)
+
+        if not self.graph.num_nodes:
+            node = self.graph.add_node(predicted_pose)
+        else:
+            previous = self.graph.num_nodes - 1
+            previous_pose = self.graph.poses[previous]
+            with MATCH_SECONDS.time():
+                self.matcher.set_reference_grid(self.grid, predicted_pose)
+                result = self.matcher.match(points, predicted_pose, *self._search_window(prior_covariance))
+            node = self.graph.add_node(result.pose)
+            information = np.linalg.inv(_frame_covariance(result.covariance, previous_pose[2]))
+            self.graph.add_edge(previous, node, relative_pose(previous_pose, result.pose), information)
+            self._motion = relative_pose(previous_pose, result.pose)
+        self.scans.append((np.asarray(ranges, dtype=float), np.asarray(angles, dtype=float), points))
+
+        with LOOP_CLOSURE_SECONDS.time():
+            self._detect_loop_closure(node, points)
+        with OPTIMIZE_SECONDS.time():
+            moved = self.graph.optimize()
+        self.events.update_poses(moved)
+        moved.pop(node, None)
+        with REMAP_SECONDS.time():
+            self.grid.update_poses(moved)
+        with INSERT_SECONDS.time():
+            self.grid.insert_scan(node, self.graph.poses[node], ranges, angles)
+        return True
+
+    def _search_window(self, covariance):
+        if covariance is None:
+            return None, None
+        linear = PRIOR_SIGMAS * np.sqrt(np.linalg.eigvalsh(covariance[:2, :2])[-1])
+        angular = PRIOR_SIGMAS * np.sqrt(covariance[2, 2])
+        return (float(np.clip(linear, MIN_LINEAR_WINDOW, self.matcher.linear_window)),
+                float(np.clip(angular, MIN_ANGULAR_WINDOW, self.matcher.angular_window)))
+
+    def _detect_loop_closure(self, node, points):
+        pose = self.graph.poses[node]
+        candidates = self.graph.loop_closure_candidates(node, self.loop_closure_search_radius,
+                                                        self.loop_closure_min_separation)
+        if not candidates:
+            return
+        distances = [np.hypot(*(self.graph.poses[c, :2] - pose[:2])) for c in candidates]
+        candidate = candidates[int(np.argmin(distances))]
+
+        mask, origin = self._submap(candidate)
+        self.loop_matcher.set_reference(mask, origin)
+        result = self.loop_matcher.match(points, pose)
+        if result.score < self.loop_closure_threshold:
+            return
+        candidate_pose = self.graph.poses[candidate]
+        information = np.linalg.inv(_frame_covariance(result.covariance, candidate_pose[2]))
+        self.graph.add_edge(candidate, node, relative_pose(candidate_pose, result.pose), information)
+        self.loop_closures.append((candidate, node, result.score))
+        LOOP_CLOSURES.inc()
+
+    def _submap(self, center, neighbours=2):
+        # Rasterize the scans around a node into an occupied-cell mask
+        first = max(0, center - neighbours)
+        last = min(len(self.scans), center + neighbours + 1)
+        world = []
+        for node in range(first, last):
+            points = self.scans[node][2]
+            x, y, theta = self.graph.poses[node]
+            c, s = np.cos(theta), np.sin(theta)
+            world.append(np.column_stack([points[:, 0] * c - points[:, 1] * s + x,
+                                          points[:, 0] * s + points[:, 1] * c + y]))
+        world = np.concatenate(world)
+        resolution = self.grid.resolution
+        low = np.floor(world.min(axis=0) * resolution) - 1
+        cells = np.floor(world * resolution - low).astype(int)
+        mask = np.zeros(tuple(cells[:, ::-1].max(axis=0) + 2), dtype=bool)
+        mask[cells[:, 1], cells[:, 0]] = True
+        return mask, low / resolution
+
+    def process_temperature(self, temperature):
+        if temperature > HIGH_TEMPERATURE and self.graph.num_nodes:
+            self.temperature_events.append(self.graph.poses[-1].copy())
+            if self._add_event('temperature').count == 1:
+                print(f"High temperature detected: {temperature}°C")
+
+    def process_person_detection(self, detected):
+        if detected and self.graph.num_nodes:
+            self.person_events.append(self.graph.poses[-1].copy())
+            if self._add_event('person').count == 1:
+                print("Person detected!")
+
+    def _add_event(self, kind):
+        node = self.graph.num_nodes - 1
+        time = self._last_time if self._last_time is not None else float(node)
+        return self.events.add(kind, time, node, self.graph.poses[node])
@@ -0,0 +1,316 @@
+import asyncio
+import atexit
+import multiprocessing
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from ingestion import IngestionService, serial_source, file_source
+from slam_pipeline import SlamPipeline
+
+# One HEX-it unit: its id and the serial port (or pty, or recorded stream
+# file when `replay` is set) of its own receiver
+DroneSpec = namedtuple('DroneSpec', ['drone_id', 'port', 'baud_rate', 'replay'], defaults=(115200, False))
+
+
+def _source(spec):
+    if spec.replay:
+        return file_source(spec.port)
+    return serial_source(spec.port, spec.baud_rate)
+
+
+class _Publisher:
+    """Ingestion consumer in a drone process: runs SLAM and ships results.
+
+    Every `interval` seconds it sends the parent the tiles the map changed
+    since the last message, the latest pose, the merged events and the
+    ingestion counters. Only deltas cross the process boundary.
+    """
+
+    def __init__(self, drone_id, results, interval, slam_kwargs):
+        self.drone_id = drone_id
+        self.results = results
+        self.interval = interval
+        self.slam = SlamPipeline(**slam_kwargs)
+        self.service = None
+        self.scans = 0
+        self.started = time.time()
+        self._revision = 0
+        self._last_publish = 0.0
+
+    def __call__(self, pair):
+        accepted = self.slam(pair)
+        self.scans += 1
+        if time.monotonic() - self._last_publish >= self.interval:
+            self.publish()
+        return accepted
+
+    def publish(self, final=False):
+        self._last_publish = time.monotonic()
+        store = self.slam.grid.tiles
+        tiles = {key: store.tiles[key].data.copy() for key in store.dirty_tiles(self._revision)}
+        self._revision = store.revision
+        poses = self.slam.poses
+        self.results.put(('update', self.drone_id, {
+            'time': time.time(),
+            'started': self.started,
+            'scans': self.scans,
+            'nodes': int(self.slam.graph.num_nodes),
+            'pose': poses[-1].tolist() if len(poses) else None,
+            'resolution': self.slam.grid.resolution,
+            'tile_size': store.tile_size,
+            'tiles': tiles,
+            'events': [cluster.to_dict() for cluster in self.slam.events.events()],
+            'stats': self.service.stats() if self.service is not None else {},
+            'final': final,
+        }))
+
+
+def _drone_main(spec, results, stop, interval, capacity, slam_kwargs):
+    """Worker process: decode and map one drone's stream until it ends or `stop` is set."""
+    publisher = _Publisher(spec.drone_id, results, interval, slam_kwargs)
+
+    async def run():
+        service = IngestionService(_source(spec), [publisher], capacity=capacity, name=spec.drone_id)
+        publisher.service = service
+        task = asyncio.create_task(service.run())
+        while not task.done():
+            if stop.is_set():
+                task.cancel()
+                break
+            await asyncio.wait({task}, timeout=0.1)
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        finally:
+            service.stop()
+
+    try:
+        asyncio.run(run())
+        publisher.publish(final=True)
+    except Exception as e:
+        results.put(('error', spec.drone_id, repr(e)))
+
+
+class DroneState:
+    """What the supervisor knows about one drone, assembled from its updates."""
+
+    def __init__(self, drone_id):
+        self.drone_id = drone_id
+        self.pose = None
+        self.nodes = 0
+        self.scans = 0
+        self.resolution = None
+        self.tile_size = None
+        self.tiles = {}
+        self.events = []
+        self.stats = {}
+        self.error = None
+        self.finished = False
+        self.restarts = 0
+        self.updated = None
+        # Over the last update interval, and since the worker started
+        self.scans_per_s = 0.0
+        self.mean_scans_per_s = 0.0
+        self._rate_mark = None
+
+    def apply(self, update):
+        if self._rate_mark is not None:
+            then, scans = self._rate_mark
+            if update['time'] > then:
+                self.scans_per_s = (update['scans'] - scans) / (update['time'] - then)
+        self._rate_mark = (update['time'], update['scans'])
+        if update['time'] > update['started']:
+            self.mean_scans_per_s = update['scans'] / (update['time'] - update['started'])
+        self.pose = update['pose']
+        self.nodes = update['nodes']
+        self.scans = update['scans']
+        self.resolution = update['resolution']
+        self.tile_size = update['tile_size']
+        self.tiles.update(update['tiles'])
+        self.events = update['events']
+        self.stats = update['stats']
+        self.finished = update['final']
+        self.updated = update['time']
+
+    def restart(self):
+        # The new worker maps from scratch and counts from zero
+        self.restarts += 1
+        self.pose = None
+        self.nodes = 0
+        self.scans = 0
+        self.tiles = {}
+        self.events = []
+        self.stats = {}
+        self.finished = False
+        self.scans_per_s = 0.0
+        self.mean_scans_per_s = 0.0
+        self._rate_mark = None
+
+    def summary(self):
+        return {'drone_id': self.drone_id, 'pose': self.pose, 'nodes': self.nodes, 'scans': self.scans,
+                'scans_per_s': self.scans_per_s, 'mean_scans_per_s': self.mean_scans_per_s,
+                'tiles': len(self.tiles), 'events': len(self.events),
+                'dropped': self.stats.get('dropped', 0), 'bytes_read': self.stats.get('bytes_read', 0),
+                'finished': self.finished, 'error': self.error, 'restarts': self.restarts}
+
+
+class Registry:
+    """Thread-safe map and event registry keyed by drone id."""
+
+    def __init__(self):
+        self._drones = {}
+        self._lock = threading.Lock()
+
+    def _state(self, drone_id):
+        if drone_id not in self._drones:
+            self._drones[drone_id] = DroneState(drone_id)
+        return self._drones[drone_id]
+
+    def apply(self, kind, drone_id, payload):
+        with self._lock:
+            state = self._state(drone_id)
+            if kind == 'update':
+                state.apply(payload)
+            elif kind == 'error':
+                state.error = payload
+            elif kind == 'restart':
+                state.restart()
+
+    def drone(self, drone_id):
+        with self._lock:
+            return self._drones.get(drone_id)
+
+    def summary(self):
+        with self._lock:
+            return {drone_id: state.summary() for drone_id, state in sorted(self._drones.items())}
+
+    def events(self, kind=None):
+        """Merged events of every drone, each tagged with its drone_id."""
+        with self._lock:
+            return [dict(event, drone_id=drone_id)
+                    for drone_id, state in sorted(self._drones.items())
+                    for event in state.events if kind is None or event['type'] == kind]
+
+    def tiles(self, drone_id):
+        """{tile key: int8 log-odds} of one drone's map."""
+        with self._lock:
+            state = self._drones.get(drone_id)
+            return dict(state.tiles) if state else {}
+
+    def to_dense(self, drone_id):
+        """One drone's map as a dense int8 array and the (row, col) of its corner."""
+        with self._lock:
+            state = self._drones.get(drone_id)
+            if state is None or not state.tiles:
+                return np.zeros((0, 0), dtype=np.int8), (0, 0)
+            keys = np.array(list(state.tiles))
+            low = keys.min(axis=0)
+            size = state.tile_size
+            shape = (keys.max(axis=0) - low + 1) * size
+            dense = np.zeros(tuple(shape), dtype=np.int8)
+            for (tile_row, tile_col), data in state.tiles.items():
+                r, c = (tile_row - low[0]) * size, (tile_col - low[1]) * size
+                dense[r:r + size, c:c + size] = data
+            return dense, (int(low[0] * size), int(low[1] * size))
+
+
+class Supervisor:
+    """Runs one ingestion + SLAM worker process per drone.
+
+    Each DroneSpec gets its own process reading its own receiver, so a slow
+    map (or a noisy link) on one drone costs only that drone's queue, never
+    the others'. A collector thread folds their periodic updates into the
+    Registry. A worker that dies without finishing is restarted up to
+    `max_restarts` times.
+    """
+
+    def __init__(self, specs, interval=0.5, capacity=256, max_restarts=3, slam_kwargs=None):
+        ids = [spec.drone_id for spec in specs]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Drone ids must be unique")
+        self.specs = {spec.drone_id: spec for spec in specs}
+        self.interval = interval
+        self.capacity = capacity
+        self.max_restarts = max_restarts
+        self.slam_kwargs = slam_kwargs or {}
+        self.registry = Registry()
+        self._results = multiprocessing.Queue()
+        self._stop = multiprocessing.Event()
+        self._processes = {}
+        self._collector = None
+        self._closing = False
+
+    def start(self):
+        for drone_id in self.specs:
+            self._spawn(drone_id)
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+        # Stop before multiprocessing kills the workers at exit, or the
+        # collector would restart them
+        atexit.register(self.stop, 1.0)
+
+    def _spawn(self, drone_id):
+        process = multiprocessing.Process(
+            target=_drone_main, daemon=True,
+            args=(self.specs[drone_id], self._results, self._stop, self.interval, self.capacity,
+                  self.slam_kwargs))
+        process.start()
+        self._processes[drone_id] = process
+
+    def _collect(self):
+        while True:
+            try:
+                kind, drone_id, payload = self._results.get(timeout=0.1)
+            except queue.Empty:
+                if self._closing:
+                    return
+                self._check_workers()
+                continue
+            self.registry.apply(kind, drone_id, payload)
+
+    def _check_workers(self):
+        for drone_id, process in list(self._processes.items()):
+            if process.is_alive() or self._stop.is_set():
+                continue
+            state = self.registry.drone(drone_id)
+            if process.exitcode == 0 and state is not None and (state.finished or state.error):
+                continue
+            # Died (or has not reported) without finishing: give it another go
+            restarts = state.restarts if state is not None else 0
+            if restarts >= self.max_restarts:
+                continue
+            print(f"Drone {drone_id} worker exited with {process.exitcode}; restarting")
+            self.registry.apply('restart', drone_id, None)
+            self._spawn(drone_id)
+
+    def alive(self):
+        return {drone_id: process.is_alive() for drone_id, process in self._processes.items()}
+
+    def wait(self, timeout=None):
+        """Wait for every worker to finish (replayed streams end); True if they did."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            done = all(state['finished'] or state['error'] for state in self.registry.summary().values())
+            if done and len(self.registry.summary()) == len(self.specs):
+                return True
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        for process in self._processes.values():
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        # The collector drains the final updates, then exits
+        self._closing = True
+        if self._collector is not None:
+            self._collector.join(timeout)
+        atexit.unregister(self.stop)
@@ -0,0 +1,235 @@
+import json
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+from metrics import METRICS
+from tiled_map import LOG_ODDS_SCALE
+
+# Zoom 0 is full resolution (one TiledMap tile per image); each further
+# zoom level halves it, so a zoom-z image covers 2**z x 2**z map tiles
+LEVELS = 5
+
+# int8 log-odds -> 8-bit shade (white free, black occupied, grey unknown),
+# indexed with the raw byte so a whole tile converts with one lookup
+_values = np.arange(256, dtype=np.uint8).view(np.int8).astype(np.float64)
+SHADE_LUT = np.round(255 / (1 + np.exp(_values * LOG_ODDS_SCALE))).astype(np.uint8)
+UNKNOWN_SHADE = SHADE_LUT[0]
+
+RENDER_SECONDS = METRICS.histogram('tile_render_seconds', "Re-rendering the tiles changed in one frame")
+TILES_RENDERED = METRICS.counter('tile_rendered_total', "Tile images redrawn, all zoom levels")
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def _png_chunk(kind, data):
+    return (struct.pack('>I', len(data)) + kind + data +
+            struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+
+def encode_png(gray, level=6):
+    """8-bit greyscale PNG of a 2D uint8 array."""
+    height, width = gray.shape
+    header = struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)
+    # Filter type 0 (none) in front of every row
+    rows = np.zeros((height, width + 1), dtype=np.uint8)
+    rows[:, 1:] = gray
+    return (_PNG_SIGNATURE + _png_chunk(b'IHDR', header) +
+            _png_chunk(b'IDAT', zlib.compress(rows.tobytes(), level)) + _png_chunk(b'IEND', b''))
+
+
+def render_tile(data):
+    """Shade image of one TiledMap tile, flipped so +y (higher rows) is up."""
+    return SHADE_LUT[np.ascontiguousarray(data).view(np.uint8)][::-1]
+
+
+def downsample(children, size):
+    """Combine a parent's (up to) four child images into one of the same size.
+
+    `children` maps (dr, dc) in {0, 1}^2 to an image. Missing children are
+    unknown. 2x2 blocks keep their darkest pixel, so one-cell walls stay
+    visible at every zoom.
+    """
+    canvas = np.full((2 * size, 2 * size), UNKNOWN_SHADE, dtype=np.uint8)
+    for (dr, dc), image in children.items():
+        # Images are flipped: the upper child row goes in the top half
+        top = (1 - dr) * size
+        canvas[top:top + size, dc * size:(dc + 1) * size] = image
+    return canvas.reshape(size, 2, size, 2).min(axis=(1, 3))
+
+
+class TileRenderer:
+    """Multi-resolution tile pyramid of an OccupancyGrid, rendered incrementally.
+
+    render() asks the grid's TiledMap which tiles were written since the
+    previous frame, re-shades only those, then rebuilds only their parents
+    up the pyramid. Each image carries the frame it was last rendered in,
+    which serves as its HTTP ETag; PNG bytes are encoded on first request
+    and kept until the tile changes again. Frames keep counting across
+    attach(), so a tile of the next grid never reuses an ETag.
+
+    The trajectory and event markers are a separate vector layer
+    (overlay()) so they update without touching a single raster tile.
+    """
+
+    def __init__(self, grid=None, levels=LEVELS):
+        self.levels = levels
+        self._lock = threading.RLock()
+        self.grid = None
+        self.frame = 0
+        self.overlay_version = 0
+        if grid is not None:
+            self.attach(grid)
+        else:
+            self._reset()
+
+    def _reset(self):
+        self._revision = 0
+        # per zoom: key -> image, and key -> frame it was rendered in
+        self._images = [{} for _ in range(self.levels)]
+        self._versions = [{} for _ in range(self.levels)]
+        self._png = {}
+        self.rendered = 0
+        self._overlay = {'trajectory': [], 'events': []}
+        self.overlay_version += 1
+
+    def attach(self, grid):
+        """Render a (new) OccupancyGrid from scratch."""
+        with self._lock:
+            self.grid = grid
+            self._reset()
+
+    @property
+    def tile_size(self):
+        return self.grid.tiles.tile_size
+
+    def render(self):
+        """Re-render tiles written since the last frame. Returns the number of images redrawn."""
+        with self._lock:
+            if self.grid is None or self.grid.tiles.revision == self._revision:
+                return 0
+            with RENDER_SECONDS.time():
+                store = self.grid.tiles
+                dirty = set(store.dirty_tiles(self._revision))
+                self._revision = store.revision
+                self.frame += 1
+                count = 0
+                for key in dirty:
+                    self._store(0, key, render_tile(store.tiles[key].data))
+                    count += 1
+                size = store.tile_size
+                for zoom in range(1, self.levels):
+                    parents = {(r >> 1, c >> 1) for r, c in dirty}
+                    below = self._images[zoom - 1]
+                    for pr, pc in parents:
+                        children = {(dr, dc): below[(2 * pr + dr, 2 * pc + dc)]
+                                    for dr in (0, 1) for dc in (0, 1) if (2 * pr + dr, 2 * pc + dc) in below}
+                        self._store(zoom, (pr, pc), downsample(children, size))
+                        count += 1
+                    dirty = parents
+            TILES_RENDERED.inc(count)
+            self.rendered += count
+            return count
+
+    def _store(self, zoom, key, image):
+        self._images[zoom][key] = image
+        self._versions[zoom][key] = self.frame
+        self._png.pop((zoom, key), None)
+
+    def keys(self, zoom):
+        """(row, col) of every tile at one zoom, rendering pending changes first."""
+        with self._lock:
+            self.render()
+            return sorted(self._images[zoom])
+
+    def etag(self, zoom, x, y):
+        """Version tag of tile (zoom, x = column, y = row), or None if it does not exist."""
+        version = self._versions[zoom].get((y, x)) if 0 <= zoom < self.levels else None
+        return None if version is None else f'{zoom}.{x}.{y}.{version}'
+
+    def tile(self, zoom, x, y):
+        """(etag, shade image) of one tile, rendering pending changes first; None if empty."""
+        with self._lock:
+            self.render()
+            etag = self.etag(zoom, x, y)
+            if etag is None:
+                return None
+            return etag, self._images[zoom][(y, x)]
+
+    def png(self, zoom, x, y):
+        """(etag, PNG bytes) of one tile, or None if nothing was mapped there."""
+        with self._lock:
+            tile = self.tile(zoom, x, y)
+            if tile is None:
+                return None
+            etag, image = tile
+            cached = self._png.get((zoom, (y, x)))
+            if cached is None or cached[0] != etag:
+                cached = self._png[(zoom, (y, x))] = (etag, encode_png(image))
+            return cached
+
+    def update_overlay(self, trajectory=None, events=None):
+        """Replace the vector layer: trajectory as (N, 3) poses, events as dicts with 'type' and 'pose'."""
+        with self._lock:
+            if trajectory is not None:
+                self._overlay['trajectory'] = [[round(float(x), 3), round(float(y), 3)]
+                                               for x, y in np.asarray(trajectory)[:, :2]]
+            if events is not None:
+                self._overlay['events'] = [dict(event) for event in events]
+            self.overlay_version += 1
+
+    def overlay(self):
+        """(etag, JSON) of the vector layer in world meters."""
+        with self._lock:
+            body = dict(self._overlay, version=self.overlay_version,
+                        resolution=self.grid.resolution if self.grid is not None else None,
+                        tile_size=self.tile_size if self.grid is not None else None,
+                        levels=self.levels)
+            return f'overlay-{self.overlay_version}', json.dumps(body, separators=(',', ':'))
+
+
+def render_hook(renderer, render=True):
+    """SlamPipeline hook that keeps a TileRenderer current."""
+
+    def hook(slam, pair, accepted):
+        if renderer.grid is not slam.grid:
+            renderer.attach(slam.grid)
+        if accepted:
+            events = [cluster.to_dict() for cluster in slam.events.events()]
+            renderer.update_overlay(slam.poses, events)
+            if render:
+                renderer.render()
+
+    return hook
+
+
+def benchmark(scans=60, seed=0):
+    """Per-frame cost of dirty-tile rendering vs. re-rendering the whole pyramid."""
+    import time
+    from occupancy_grid import OccupancyGrid
+
+    rng = np.random.default_rng(seed)
+    grid = OccupancyGrid(resolution=20)
+    angles = np.radians(np.arange(0, 360, 2))
+    renderer = TileRenderer(grid)
+    incremental = full = 0.0
+    for k in range(scans):
+        pose = (k * 0.5, 3 * np.sin(k / 10), rng.uniform(-np.pi, np.pi))
+        grid.insert_scan(k, pose, rng.uniform(1, 8, len(angles)), angles)
+        started = time.perf_counter()
+        renderer.render()
+        incremental += time.perf_counter() - started
+        started = time.perf_counter()
+        TileRenderer(grid).render()
+        full += time.perf_counter() - started
+    return {
+        'tiles': len(grid.tiles),
+        'incremental_ms_per_frame': incremental / scans * 1e3,
+        'full_ms_per_frame': full / scans * 1e3,
+    }
+
+
+if __name__ == '__main__':
+    print(benchmark())
@@ -0,0 +1,125 @@
+import numpy as np
+
+TILE_SIZE = 64
+
+# int8 log-odds: one step is LOG_ODDS_SCALE, so +-127 covers the occupancyMap
+# saturation limits (probability 0.001 .. 0.999, log-odds +-6.9)
+LOG_ODDS_SCALE = 0.055
+QUANTIZED_MAX = 127
+
+
+def quantize(log_odds):
+    return int(round(log_odds / LOG_ODDS_SCALE))
+
+
+class Tile:
+    __slots__ = ('data', 'revision')
+
+    def __init__(self, size):
+        self.data = np.zeros((size, size), dtype=np.int8)
+        self.revision = 0
+
+
+class TiledMap:
+    """Sparse store of int8 log-odds cells in fixed-size square tiles.
+
+    Cells are addressed by global integer (row, col), negative included.
+    Tiles live in a dict keyed by (tile_row, tile_col) and are allocated the
+    first time a cell inside them is written, so memory follows the explored
+    area instead of a bounding box guessed up front.
+
+    Each write stamps the tiles it touched with the map's new revision.
+    Consumers (display, streaming) remember the revision they last saw and
+    ask for dirty_tiles(since=...) to re-process only what changed.
+    """
+
+    def __init__(self, tile_size=TILE_SIZE):
+        if tile_size & (tile_size - 1):
+            raise ValueError("tile_size must be a power of two")
+        self.tile_size = tile_size
+        self._shift = tile_size.bit_length() - 1
+        self.tiles = {}
+        self.revision = 0
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def nbytes(self):
+        return sum(tile.data.nbytes for tile in self.tiles.values())
+
+    def add(self, rows, cols, delta):
+        """Add `delta` (quantized units) to each given cell, saturating at +-127.
+
+        Cells must be unique within one call.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        if not len(rows):
+            return
+        self.revision += 1
+        for key, local_rows, local_cols in self._group(rows, cols):
+            tile = self.tiles.get(key)
+            if tile is None:
+                tile = self.tiles[key] = Tile(self.tile_size)
+            values = tile.data[local_rows, local_cols].astype(np.int16) + delta
+            tile.data[local_rows, local_cols] = np.clip(values, -QUANTIZED_MAX, QUANTIZED_MAX)
+            tile.revision = self.revision
+
+    def get(self, rows, cols):
+        """Quantized values at the given cells (0 where nothing is allocated)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        out = np.zeros(rows.shape, dtype=np.int8)
+        flat_rows, flat_cols = rows.reshape(-1), cols.reshape(-1)
+        flat_out = out.reshape(-1)
+        order = np.arange(flat_rows.size)
+        for key, local_rows, local_cols, index in self._group(flat_rows, flat_cols, order):
+            tile = self.tiles.get(key)
+            if tile is not None:
+                flat_out[index] = tile.data[local_rows, local_cols]
+        return out
+
+    def _group(self, rows, cols, *extra):
+        # Split cell arrays by tile so each tile is updated with one fancy index
+        tile_rows = rows >> self._shift
+        tile_cols = cols >> self._shift
+        mask = self.tile_size - 1
+        keys = tile_rows * (1 << 32) + tile_cols
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        ends = np.r_[starts[1:], len(keys)]
+        for start, end in zip(starts, ends):
+            index = order[start:end]
+            key = (int(tile_rows[index[0]]), int(tile_cols[index[0]]))
+            yield (key, rows[index] & mask, cols[index] & mask) + tuple(e[index] for e in extra)
+
+    def dirty_tiles(self, since):
+        """Keys of tiles written after revision `since`."""
+        return [key for key, tile in self.tiles.items() if tile.revision > since]
+
+    def bounds(self):
+        """(row_min, col_min, row_max, col_max) of allocated cells, end exclusive."""
+        if not self.tiles:
+            return 0, 0, 0, 0
+        keys = np.array(list(self.tiles))
+        size = self.tile_size
+        return (int(keys[:, 0].min()) * size, int(keys[:, 1].min()) * size,
+                (int(keys[:, 0].max()) + 1) * size, (int(keys[:, 1].max()) + 1) * size)
+
+    def to_dense(self, bounds=None):
+        """Copy a region (default: everything allocated) into a dense int8 array.
+
+        Returns the array and the global (row, col) of its first cell.
+        """
+        row_min, col_min, row_max, col_max = bounds or self.bounds()
+        out = np.zeros((row_max - row_min, col_max - col_min), dtype=np.int8)
+        size = self.tile_size
+        for (tile_row, tile_col), tile in self.tiles.items():
+            r0, c0 = tile_row * size, tile_col * size
+            top, left = max(r0, row_min), max(c0, col_min)
+            bottom, right = min(r0 + size, row_max), min(c0 + size, col_max)
+            if top < bottom and left < right:
+                out[top - row_min:bottom - row_min, left - col_min:right - col_min] = \
+                    tile.data[top - r0:bottom - r0, left - c0:right - c0]
+        return out, (row_min, col_min)
@@ -0,0 +1,217 @@
+import binascii
+import json
+from collections import namedtuple
+
+import numpy as np
+
+# Binary framing used by the receiver when built with BINARY_FRAMES=1:
+#
+#   0xAA 0x55 | type (u8) | length (u16 LE) | payload | crc16 (u16 LE)
+#
+# The CRC is CRC-16/CCITT-FALSE over type, length and payload. Payloads are
+# the raw structs from main.cpp, so the dtypes below mirror the ESP32 layout
+# (little endian, natural alignment) byte for byte.
+SYNC = b'\xaa\x55'
+HEADER_SIZE = 5
+CRC_SIZE = 2
+
+FRAME_SCAN = 1
+FRAME_IMU = 2
+FRAME_PAIR = 3
+
+NUM_READINGS = 45
+INVALID_DISTANCE = 900
+
+# Longest run of text we buffer while waiting for a newline
+MAX_LINE_LENGTH = 4096
+
+SENSOR_DTYPE = np.dtype([
+    ('device_id', 'i1'),
+    ('range', '<i2', (NUM_READINGS,)),
+    ('angle', '<i2', (NUM_READINGS,)),
+    ('temperature', '<f4'),
+    ('timestamp', '<i4'),
+    ('personDetectedFlag', '?'),
+], align=True)
+
+IMU_DTYPE = np.dtype([
+    ('device_id', 'i1'),
+    ('gyro_z', '<f4'),
+    ('accel_x', '<f4'),
+    ('accel_y', '<f4'),
+], align=True)
+
+# A scan packet followed by its IMU packet, as paired by the receiver
+PAIR_DTYPE = np.dtype([('scan', SENSOR_DTYPE), ('imu', IMU_DTYPE)])
+
+PAYLOAD_DTYPES = {
+    FRAME_SCAN: SENSOR_DTYPE,
+    FRAME_IMU: IMU_DTYPE,
+    FRAME_PAIR: PAIR_DTYPE,
+}
+
+# `order` lists the frame type of every decoded record in arrival order
+Batch = namedtuple('Batch', ['scans', 'imus', 'pairs', 'order'])
+
+
+def crc16(data, crc=0xFFFF):
+    """CRC-16/CCITT-FALSE, matching crc16() in the receiver firmware."""
+    return binascii.crc_hqx(data, crc)
+
+
+def encode_frame(frame_type, payload):
+    """Wrap a raw struct payload in a frame."""
+    payload = bytes(payload)
+    body = bytes([frame_type]) + len(payload).to_bytes(2, 'little') + payload
+    return SYNC + body + crc16(body).to_bytes(2, 'little')
+
+
+def encode_records(frame_type, records):
+    """Encode every record of a structured array as one frame each."""
+    records = np.ascontiguousarray(records, dtype=PAYLOAD_DTYPES[frame_type])
+    return b''.join(encode_frame(frame_type, record.tobytes()) for record in records)
+
+
+def json_to_pair(doc):
+    """Convert one JSON line from the receiver into a PAIR_DTYPE record."""
+    record = np.zeros((), dtype=PAIR_DTYPE)
+    scan = record['scan']
+    imu = record['imu']
+
+    ranges = np.full(NUM_READINGS, INVALID_DISTANCE, dtype=np.int16)
+    angles = np.zeros(NUM_READINGS, dtype=np.int16)
+    values = doc.get('ranges', [])[:NUM_READINGS]
+    ranges[:len(values)] = values
+    values = doc.get('angles', [])[:NUM_READINGS]
+    angles[:len(values)] = values
+
+    scan['device_id'] = doc.get('device_id_1', 1)
+    scan['range'] = ranges
+    scan['angle'] = angles
+    scan['temperature'] = doc.get('temperature', 0.0)
+    scan['timestamp'] = doc.get('timestamp', 0)
+    scan['personDetectedFlag'] = bool(doc.get('personDetectedFlag', False))
+
+    imu['device_id'] = doc.get('device_id_2', 2)
+    imu['gyro_z'] = doc.get('rotation_z', 0.0)
+    imu['accel_x'] = doc.get('accel_x', 0.0)
+    imu['accel_y'] = doc.get('accel_y', 0.0)
+    return record
+
+
+def _records(buf, offsets, dtype):
+    if not offsets:
+        return np.empty(0, dtype=dtype)
+    if len(offsets) == 1:
+        stride = dtype.itemsize
+    else:
+        stride = offsets[1] - offsets[0]
+        if any(b - a != stride for a, b in zip(offsets, offsets[1:])):
+            # Interleaved frame types: gather the payloads (one copy)
+            data = b''.join(buf[o:o + dtype.itemsize] for o in offsets)
+            return np.frombuffer(data, dtype=dtype)
+    # Evenly spaced frames are exposed in place as a strided view of the input
+    return np.ndarray((len(offsets),), dtype=dtype, buffer=buf,
+                      offset=offsets[0], strides=(stride,))
+
+
+class StreamDecoder:
+    """Incremental decoder for the receiver's serial stream.
+
+    Accepts binary frames and the legacy JSON lines interchangeably. Each call
+    to feed() returns the complete records found so far as structured arrays;
+    incomplete data is kept until the next call. Arrays decoded from binary
+    frames are read-only views into the fed bytes.
+    """
+
+    def __init__(self):
+        self._pending = b''
+        self.frames = 0
+        self.json_lines = 0
+        self.crc_errors = 0
+        self.invalid_lines = 0
+        self.dropped_lines = 0
+        self.skipped_bytes = 0
+
+    def feed(self, data):
+        buf = self._pending + bytes(data) if self._pending else bytes(data)
+        n = len(buf)
+        pos = 0
+        offsets = {FRAME_SCAN: [], FRAME_IMU: [], FRAME_PAIR: []}
+        json_pairs = []
+        order = []
+
+        while pos < n:
+            if buf[pos] == SYNC[0]:
+                if n - pos < HEADER_SIZE:
+                    break
+                frame_type = buf[pos + 2]
+                length = int.from_bytes(buf[pos + 3:pos + 5], 'little')
+                dtype = PAYLOAD_DTYPES.get(frame_type)
+                if buf[pos + 1] != SYNC[1] or dtype is None or length != dtype.itemsize:
+                    pos = self._resync(buf, pos)
+                    continue
+                end = pos + HEADER_SIZE + length + CRC_SIZE
+                if end > n:
+                    break
+                crc = int.from_bytes(buf[end - CRC_SIZE:end], 'little')
+                if crc16(buf[pos + 2:end - CRC_SIZE]) != crc:
+                    self.crc_errors += 1
+                    pos = self._resync(buf, pos)
+                    continue
+                offsets[frame_type].append(pos + HEADER_SIZE)
+                order.append(frame_type)
+                self.frames += 1
+                pos = end
+            else:
+                newline = buf.find(b'\n', pos)
+                sync = buf.find(SYNC, pos, newline if newline >= 0 else n)
+                if sync >= 0:
+                    # Binary garbage in front of the next frame
+                    self.skipped_bytes += sync - pos
+                    pos = sync
+                    continue
+                if newline < 0:
+                    if n - pos > MAX_LINE_LENGTH:
+                        self.skipped_bytes += n - pos
+                        pos = n
+                    break
+                line = buf[pos:newline].strip()
+                pos = newline + 1
+                if line.startswith(b'{'):
+                    try:
+                        json_pairs.append((len(offsets[FRAME_PAIR]), json_to_pair(json.loads(line))))
+                        order.append(FRAME_PAIR)
+                        self.json_lines += 1
+                    except (ValueError, TypeError, AttributeError):
+                        self.invalid_lines += 1
+                elif line:
+                    # Status text such as "... Dropping packet."
+                    self.dropped_lines += 1
+
+        self._pending = buf[pos:]
+
+        pairs = _records(buf, offsets[FRAME_PAIR], PAIR_DTYPE)
+        if json_pairs:
+            # Splice the JSON records in at their arrival positions
+            pairs = np.insert(pairs, [index for index, _ in json_pairs],
+                              np.stack([record for _, record in json_pairs]))
+        return Batch(
+            scans=_records(buf, offsets[FRAME_SCAN], SENSOR_DTYPE),
+            imus=_records(buf, offsets[FRAME_IMU], IMU_DTYPE),
+            pairs=pairs,
+            order=order,
+        )
+
+    def _resync(self, buf, pos):
+        # Skip a corrupt frame header up to the next sync marker
+        sync = buf.find(SYNC, pos + 1)
+        if sync < 0:
+            sync = len(buf) - 1 if buf[-1] == SYNC[0] else len(buf)
+        self.skipped_bytes += sync - pos
+        return sync
+
+
+def decode(data):
+    """Decode a complete buffer of frames and/or JSON lines in one call."""
+    return StreamDecoder().feed(data)
@@ -0,0 +1,543 @@
+import atexit
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from multiprocessing.connection import AuthenticationError, Client, Listener, wait
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SCRIPT = 'pathVisual.m'
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def script_path(script):
+    """Absolute path of a .m script in loraRecv/src; anything else is rejected."""
+    if os.path.basename(script) != script or not script.endswith('.m'):
+        raise ValueError(f"Invalid script name: {script}")
+    path = os.path.join(SCRIPT_DIR, script)
+    if not os.path.isfile(path):
+        raise ValueError(f"Unknown script: {script}")
+    return path
+
+
+class MatlabEngine:
+    """One MATLAB session, started when the worker process boots."""
+
+    def __init__(self):
+        import matlab.engine
+        self.eng = matlab.engine.start_matlab()
+
+    def run(self, script, cancelled, poll=0.1):
+        path = script_path(script)
+        future = self.eng.eval(f"run('{path}')", nargout=0, background=True)
+        while not future.done():
+            if cancelled.wait(poll):
+                future.cancel()
+                self.eng.eval("clear all; close all;", nargout=0)
+                raise JobCancelled()
+        future.result()
+        return {'script': script}
+
+    def quit(self):
+        self.eng.quit()
+
+
+class StubEngine:
+    """Stands in for MATLAB in tests and on machines without it.
+
+    `startup` mimics engine boot time and `duration` the run time of a
+    script; a run checks for cancellation every few milliseconds.
+    """
+
+    def __init__(self, startup=0.0, duration=0.05, fail=False):
+        time.sleep(startup)
+        self.duration = duration
+        self.fail = fail
+        self.runs = 0
+
+    def run(self, script, cancelled, poll=0.005):
+        started = time.perf_counter()
+        while time.perf_counter() - started < self.duration:
+            if cancelled.wait(poll):
+                raise JobCancelled()
+        if self.fail:
+            raise RuntimeError(f"{script} failed")
+        self.runs += 1
+        return {'script': script, 'pid': os.getpid(), 'runs': self.runs}
+
+    def quit(self):
+        pass
+
+
+ENGINES = {'matlab': MatlabEngine, 'stub': StubEngine}
+
+
+def _run_job(engine, conn, job_id, script, cancelled):
+    try:
+        result = engine.run(script, cancelled)
+        conn.send(('done', job_id, result))
+    except JobCancelled:
+        conn.send(('cancelled', job_id, None))
+    except Exception as e:
+        conn.send(('failed', job_id, repr(e)))
+
+
+def _worker_main(engine_cls, engine_kwargs, conn):
+    # The engine is started once per process, before any job arrives
+    try:
+        engine = engine_cls(**engine_kwargs)
+    except Exception as e:
+        conn.send(('broken', None, repr(e)))
+        return
+    conn.send(('ready', None, None))
+    cancelled = threading.Event()
+    runner = None
+    while True:
+        try:
+            command, job_id, script = conn.recv()
+        except EOFError:
+            break
+        if command == 'run':
+            cancelled.clear()
+            runner = threading.Thread(target=_run_job, args=(engine, conn, job_id, script, cancelled),
+                                      daemon=True)
+            runner.start()
+        elif command == 'cancel':
+            cancelled.set()
+        elif command == 'stop':
+            cancelled.set()
+            break
+    if runner is not None:
+        runner.join(1.0)
+    engine.quit()
+
+
+class Job:
+    __slots__ = ('id', 'script', 'state', 'result', 'error', 'submitted', 'started',
+                 'finished', 'worker', 'cancel_deadline')
+
+    def __init__(self, script):
+        self.id = uuid.uuid4().hex
+        self.script = script
+        self.state = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.worker = None
+        self.cancel_deadline = None
+
+    def to_dict(self):
+        return {'id': self.id, 'script': self.script, 'state': self.state,
+                'result': self.result, 'error': self.error, 'submitted': self.submitted,
+                'started': self.started, 'finished': self.finished}
+
+
+class _Worker:
+    __slots__ = ('process', 'conn', 'ready', 'job')
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.ready = False
+        self.job = None
+
+
+class WorkerPool:
+    """Pre-started engine processes behind a non-blocking job API.
+
+    start() spawns `size` worker processes, each of which boots its engine
+    straight away, so a request never waits for MATLAB to start. submit()
+    only records the job and returns its id; a dispatcher thread hands
+    queued jobs to idle workers and collects results. cancel() asks the
+    worker to stop the run; a worker that has not confirmed within
+    `cancel_timeout` seconds is terminated and replaced by a fresh one.
+    Finished jobs are kept (up to `history`) for status queries.
+    """
+
+    def __init__(self, size=1, engine=StubEngine, engine_kwargs=None, cancel_timeout=5.0,
+                 history=100):
+        self.size = size
+        self.engine = engine
+        self.engine_kwargs = engine_kwargs or {}
+        self.cancel_timeout = cancel_timeout
+        self.history = history
+        self._jobs = OrderedDict()
+        self._queue = deque()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._wake_r, self._wake_w = multiprocessing.Pipe(duplex=False)
+        self._dispatcher = None
+        self._closing = False
+        self.broken = None
+
+    @property
+    def started(self):
+        return self._dispatcher is not None
+
+    def start(self):
+        with self._lock:
+            if self._dispatcher is not None:
+                return
+            self._workers = [self._spawn() for _ in range(self.size)]
+            self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+            self._dispatcher.start()
+        # Runs before multiprocessing terminates its children, so the
+        # dispatcher does not respawn workers that are being killed
+        atexit.register(self.shutdown, 1.0)
+
+    def _spawn(self):
+        parent, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_worker_main,
+                                          args=(self.engine, self.engine_kwargs, child), daemon=True)
+        process.start()
+        child.close()
+        return _Worker(process, parent)
+
+    def _wake(self):
+        self._wake_w.send(None)
+
+    def submit(self, script=DEFAULT_SCRIPT):
+        """Queue a script run; returns the job id immediately."""
+        script_path(script)
+        job = Job(script)
+        with self._lock:
+            self._jobs[job.id] = job
+            if self.broken is not None and not self._workers:
+                self._finish(job, FAILED, error=f"No engine available: {self.broken}")
+            else:
+                self._queue.append(job)
+            self._trim()
+        self._wake()
+        return job.id
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def jobs(self):
+        with self._lock:
+            return [job.to_dict() for job in self._jobs.values()]
+
+    def active(self):
+        with self._lock:
+            return [job.id for job in self._jobs.values() if job.state in (QUEUED, RUNNING)]
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; False if it already finished."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state not in (QUEUED, RUNNING):
+                return False
+            if job.state == QUEUED:
+                self._queue.remove(job)
+                self._finish(job, CANCELLED)
+                return True
+            if job.cancel_deadline is None:
+                job.cancel_deadline = time.monotonic() + self.cancel_timeout
+                job.worker.conn.send(('cancel', job.id, None))
+        self._wake()
+        return True
+
+    def wait(self, job_id, timeout=None):
+        """Poll until a job finishes; returns its status."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            status = self.status(job_id)
+            if status is None or status['state'] not in (QUEUED, RUNNING):
+                return status
+            if deadline is not None and time.monotonic() > deadline:
+                return status
+            time.sleep(0.01)
+
+    def shutdown(self, timeout=5.0):
+        with self._lock:
+            self._closing = True
+            for job in list(self._queue):
+                self._finish(job, CANCELLED)
+            self._queue.clear()
+            workers = self._workers
+        self._wake()
+        if self._dispatcher is not None:
+            self._dispatcher.join(timeout)
+        for worker in workers:
+            try:
+                worker.conn.send(('stop', None, None))
+            except OSError:
+                pass
+        for worker in workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+        self._dispatcher = None
+        atexit.unregister(self.shutdown)
+
+    def _finish(self, job, state, result=None, error=None):
+        job.state = state
+        job.result = result
+        job.error = error
+        job.finished = time.time()
+        if job.worker is not None:
+            job.worker.job = None
+            job.worker = None
+
+    def _trim(self):
+        # Drop the oldest finished jobs past the history limit
+        excess = len(self._jobs) - self.history
+        for job_id in [j.id for j in self._jobs.values() if j.state not in (QUEUED, RUNNING)][:max(excess, 0)]:
+            del self._jobs[job_id]
+
+    def _assign(self):
+        for worker in self._workers:
+            if not self._queue:
+                return
+            if worker.ready and worker.job is None:
+                job = self._queue.popleft()
+                job.state = RUNNING
+                job.started = time.time()
+                job.worker = worker
+                worker.job = job
+                worker.conn.send(('run', job.id, job.script))
+
+    def _replace(self, worker):
+        worker.process.terminate()
+        worker.process.join()
+        worker.conn.close()
+        index = self._workers.index(worker)
+        self._workers[index] = self._spawn()
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                if self._closing:
+                    return
+                self._assign()
+                connections = [w.conn for w in self._workers]
+                deadlines = [w.job.cancel_deadline for w in self._workers
+                             if w.job is not None and w.job.cancel_deadline is not None]
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            for conn in wait(connections + [self._wake_r], timeout):
+                if conn is self._wake_r:
+                    conn.recv()
+                    continue
+                with self._lock:
+                    self._handle(conn)
+            with self._lock:
+                now = time.monotonic()
+                for worker in list(self._workers):
+                    job = worker.job
+                    if job is not None and job.cancel_deadline is not None and now > job.cancel_deadline:
+                        # The engine ignored the cancel request; restart it
+                        self._finish(job, CANCELLED)
+                        self._replace(worker)
+
+    def _handle(self, conn):
+        worker = next((w for w in self._workers if w.conn is conn), None)
+        if worker is None:
+            return
+        try:
+            event, job_id, payload = conn.recv()
+        except (EOFError, OSError):
+            if self._closing:
+                return
+            if worker.job is not None:
+                self._finish(worker.job, FAILED, error='Worker process exited')
+            self._replace(worker)
+            return
+        if event == 'ready':
+            worker.ready = True
+        elif event == 'broken':
+            # Respawning would fail the same way; retire the worker instead
+            print(f"Worker engine failed to start: {payload}")
+            self.broken = payload
+            self._workers.remove(worker)
+            worker.process.join(1.0)
+            worker.conn.close()
+            if not self._workers:
+                for job in self._queue:
+                    self._finish(job, FAILED, error=f"No engine available: {payload}")
+                self._queue.clear()
+        elif worker.job is not None and worker.job.id == job_id:
+            if event == 'done':
+                self._finish(worker.job, DONE, result=payload)
+            elif event == 'failed':
+                self._finish(worker.job, FAILED, error=payload)
+            elif event == 'cancelled':
+                self._finish(worker.job, CANCELLED)
+
+
+_POOL_METHODS = ('submit', 'status', 'jobs', 'active', 'cancel')
+
+
+def parse_address(address):
+    """'host:port' -> (host, port)."""
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def _answer(pool, conn):
+    # One client connection: (method, args) in, ('ok', result) or ('error', exception) out
+    with conn:
+        while True:
+            try:
+                method, args = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                if method not in _POOL_METHODS:
+                    raise ValueError(f"Unknown pool method: {method}")
+                conn.send(('ok', getattr(pool, method)(*args)))
+            except Exception as e:
+                conn.send(('error', e))
+
+
+def serve(address, authkey, **pool_kwargs):
+    """Run one WorkerPool in this process and serve it to PoolClients at `address`.
+
+    Blocks until the process is told to exit (SIGTERM included); the pool is
+    shut down on the way out.
+    """
+    import signal
+
+    pool = WorkerPool(**pool_kwargs)
+    # Engines are forked before the listening socket exists, so they do not hold it open
+    pool.start()
+    listener = Listener(address, authkey=authkey)
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except AuthenticationError:
+                continue
+            threading.Thread(target=_answer, args=(pool, conn), daemon=True).start()
+    finally:
+        listener.close()
+        pool.shutdown(1.0)
+
+
+class PoolClient:
+    """The WorkerPool API, forwarded to the one pool process serving `address`.
+
+    Each web worker holds a client, so they all see the same jobs whichever
+    of them a request lands on. Each thread connects on first use and
+    reconnects once if the pool process went away. With `spawn` (the pool's
+    size, engine name and cancel timeout) a client that finds no pool
+    starts one in its own session, so it outlives the web worker that
+    started it; when several race, one binds the address and the others
+    exit.
+    """
+
+    def __init__(self, address, authkey, spawn=None, connect_timeout=10.0):
+        self.address = address
+        self.authkey = authkey
+        self.spawn = spawn
+        self.connect_timeout = connect_timeout
+        self.process = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        deadline = None
+        while True:
+            try:
+                return Client(self.address, authkey=self.authkey)
+            except (ConnectionRefusedError, FileNotFoundError):
+                if self.spawn is None:
+                    raise
+                if deadline is None:
+                    with self._lock:
+                        if self.process is None or self.process.poll() is not None:
+                            self._start_server()
+                    deadline = time.monotonic() + self.connect_timeout
+                elif time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    def _start_server(self):
+        size, engine, cancel_timeout = self.spawn
+        host, port = self.address
+        command = [sys.executable, os.path.abspath(__file__), '--address', f'{host}:{port}', '--size', str(size),
+                   '--engine', engine, '--cancel-timeout', str(cancel_timeout)]
+        env = dict(os.environ, MATLAB_POOL_AUTHKEY=self.authkey.decode())
+        self.process = subprocess.Popen(command, env=env, start_new_session=True)
+
+    def _call(self, method, *args):
+        for attempt in range(2):
+            conn = getattr(self._local, 'conn', None)
+            if conn is None:
+                conn = self._local.conn = self._connect()
+            try:
+                conn.send((method, args))
+                outcome, value = conn.recv()
+                break
+            except (ConnectionError, EOFError):
+                # The pool process restarted; its jobs went with it
+                self._local.conn = None
+                conn.close()
+                if attempt:
+                    raise
+        if outcome == 'error':
+            raise value
+        return value
+
+    def submit(self, script=DEFAULT_SCRIPT):
+        return self._call('submit', script)
+
+    def status(self, job_id):
+        return self._call('status', job_id)
+
+    def jobs(self):
+        return self._call('jobs')
+
+    def active(self):
+        return self._call('active')
+
+    def cancel(self, job_id):
+        return self._call('cancel', job_id)
+
+    def wait(self, job_id, timeout=None):
+        """Poll until a job finishes; returns its status."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            status = self.status(job_id)
+            if status is None or status['state'] not in (QUEUED, RUNNING):
+                return status
+            if deadline is not None and time.monotonic() > deadline:
+                return status
+            time.sleep(0.01)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve one MATLAB worker pool to every web worker")
+    parser.add_argument('--address', default='127.0.0.1:6010', help="host:port to listen on")
+    parser.add_argument('--size', type=int, default=1, help="engine worker processes")
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='matlab')
+    parser.add_argument('--cancel-timeout', type=float, default=5.0)
+    args = parser.parse_args(argv)
+    # Taken from the environment so it does not show up in the process list
+    authkey = os.environ['MATLAB_POOL_AUTHKEY'].encode()
+    serve(parse_address(args.address), authkey, size=args.size, engine=ENGINES[args.engine],
+          cancel_timeout=args.cancel_timeout)
+
+
+if __name__ == '__main__':
+    main()
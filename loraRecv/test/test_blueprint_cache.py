@@ -0,0 +1,78 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# Add src directory to path to import the blueprint cache
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from blueprint_cache import BlueprintCache, otsu_threshold, preprocess
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+def blueprint_rgb():
+    # White floor, black walls, one red fire pixel and a green person
+    rgb = np.full((40, 50, 3), 255, dtype=np.uint8)
+    rgb[0, :] = rgb[-1, :] = rgb[:, 0] = rgb[:, -1] = 0
+    rgb[20, 5:45] = 0
+    rgb[10, 10] = (220, 30, 30)
+    rgb[30, 40] = (30, 220, 30)
+    return rgb
+
+class TestPreprocess(unittest.TestCase):
+    def test_masks(self):
+        result = preprocess(blueprint_rgb())
+        self.assertTrue(result['walls'][20, 10])
+        self.assertFalse(result['walls'][5, 5])
+        self.assertEqual(result['fire'].sum(), 1)
+        self.assertEqual(result['fire_zone'].sum(), 9)
+        np.testing.assert_array_equal(result['persons'], [[30, 40]])
+
+    def test_otsu_splits_two_levels(self):
+        gray = np.array([10] * 50 + [200] * 50, dtype=np.uint8)
+        level = otsu_threshold(gray)
+        self.assertTrue(10 <= level < 200)
+
+@unittest.skipIf(Image is None, "Pillow not installed")
+class TestBlueprintCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.image = os.path.join(self.directory, 'plan.png')
+        Image.fromarray(blueprint_rgb()).save(self.image)
+        self.cache_dir = os.path.join(self.directory, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip_and_hits(self):
+        cache = BlueprintCache(self.cache_dir)
+        blueprint = cache.load(self.image)
+        expected = preprocess(blueprint_rgb())
+        np.testing.assert_array_equal(blueprint.walls, expected['walls'])
+        np.testing.assert_array_equal(blueprint.fire_zone, expected['fire_zone'])
+        self.assertTrue(blueprint.wall_at(20, 10))
+        self.assertTrue(blueprint.in_fire(11, 11))
+        self.assertFalse(blueprint.in_fire(12, 12))
+        self.assertIsInstance(blueprint.packed['walls'], np.memmap)
+
+        # A fresh process reuses the stored entry, even for a renamed copy
+        copy = os.path.join(self.directory, 'copy.png')
+        shutil.copy(self.image, copy)
+        other = BlueprintCache(self.cache_dir)
+        np.testing.assert_array_equal(other.load(copy).blocked(), blueprint.blocked())
+        self.assertEqual((other.hits, other.misses), (1, 0))
+
+    def test_params_are_part_of_the_key(self):
+        cache = BlueprintCache(self.cache_dir)
+        cache.load(self.image)
+        cache.load(self.image, fire_radius=3.0)
+        self.assertEqual(cache.misses, 2)
+        with self.assertRaises(ValueError):
+            cache.load(self.image, blur=2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add src directory to path to import the cost map
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from costmap import CostMap, Layer, inflate
+
+class TestCostMap(unittest.TestCase):
+    def setUp(self):
+        walls = np.zeros((40, 60), dtype=bool)
+        walls[0, :] = walls[-1, :] = walls[:, 0] = walls[:, -1] = True
+        self.costmap = CostMap(walls)
+
+    def test_fire_blocks_its_3x3_neighbourhood(self):
+        self.costmap.add_fire([10], [20])
+        zone = np.argwhere(self.costmap.fire.zone)
+        self.assertEqual(len(zone), 9)
+        np.testing.assert_array_equal(zone.min(axis=0), [9, 19])
+        self.assertTrue(self.costmap.in_fire_zone(11, 21))
+        self.assertFalse(self.costmap.is_free(11, 21))
+        self.assertFalse(self.costmap.is_free(0, 5))
+        self.assertTrue(self.costmap.is_free(12, 20))
+        self.assertFalse(self.costmap.is_free(-1, 5))
+
+    def test_incremental_matches_full_inflation(self):
+        rng = np.random.default_rng(0)
+        layer = Layer((40, 60), radius=4.0)
+        rows, cols = rng.integers(0, 40, 300), rng.integers(0, 60, 300)
+        for start in range(0, 300, 50):
+            layer.add(rows[start:start + 50], cols[start:start + 50])
+        layer.remove(rows[:20], cols[:20])
+        expected = inflate(layer.sources, 4.0)
+        np.testing.assert_allclose(layer.distance, expected)
+        np.testing.assert_array_equal(layer.zone, np.isfinite(expected))
+
+    def test_blocked_rebuilt_only_on_change(self):
+        blocked = self.costmap.blocked()
+        self.assertIs(self.costmap.blocked(), blocked)
+        self.costmap.add_person([20], [30])
+        self.assertIs(self.costmap.blocked(), blocked)
+        self.assertTrue(self.costmap.at_person(22, 32))
+        self.costmap.add_fire([20], [10])
+        self.assertIsNot(self.costmap.blocked(), blocked)
+        self.assertTrue(self.costmap.blocked()[21, 11])
+
+    def test_world_events(self):
+        costmap = CostMap(np.zeros((40, 60), dtype=bool), resolution=10, origin=(-3.0, -2.0))
+        costmap.add_temperature_events([np.array([0.05, 0.05, 1.0])])
+        self.assertTrue(costmap.in_fire_zone(20, 30))
+
+if __name__ == '__main__':
+    unittest.main()
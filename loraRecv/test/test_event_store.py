@@ -0,0 +1,67 @@
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add src directory to path to import the event store
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from event_store import EventStore
+
+class TestEventStore(unittest.TestCase):
+    def test_repeated_detections_merge(self):
+        store = EventStore(window=10.0)
+        rng = np.random.default_rng(0)
+        # A person in view for 200 sweeps while the drone hovers
+        for t in range(200):
+            cluster = store.add('person', t * 0.05, t, [2.0, 1.0, 0.0] + rng.normal(0, 0.05, 3))
+        self.assertEqual(len(store), 1)
+        self.assertEqual(cluster.count, 200)
+        self.assertGreater(cluster.confidence, 0.999)
+        np.testing.assert_allclose(cluster.position, [2.0, 1.0], atol=0.02)
+        # A hot spot at the same place, a person elsewhere, the same place much later
+        store.add('temperature', 10.0, 200, [2.0, 1.0, 0.0])
+        store.add('person', 10.0, 201, [5.0, 1.0, 0.0])
+        store.add('person', 60.0, 202, [2.0, 1.0, 0.0])
+        self.assertEqual(len(store), 4)
+        self.assertEqual(len(store.events('person')), 3)
+        self.assertEqual(store.positions('temperature').shape, (1, 2))
+        with self.assertRaises(ValueError):
+            store.add('smoke', 0.0, 0, [0, 0, 0])
+
+    def test_radius_and_box_queries(self):
+        store = EventStore(radius={'person': 0.01}, window=None, cell_size=1.0)
+        rng = np.random.default_rng(1)
+        points = rng.uniform(-20, 20, (300, 2))
+        for i, (x, y) in enumerate(points):
+            store.add('person', float(i), i, [x, y, 0.0])
+        self.assertEqual(len(store), 300)
+        found = {c.id for c in store.within((3.0, -2.0), 6.0)}
+        expected = {i for i, p in enumerate(points) if np.hypot(p[0] - 3.0, p[1] + 2.0) <= 6.0}
+        self.assertEqual(found, expected)
+        found = {c.id for c in store.in_box((-5.0, 0.0), (4.0, 12.5), kind='person')}
+        expected = {i for i, p in enumerate(points) if -5 <= p[0] <= 4 and 0 <= p[1] <= 12.5}
+        self.assertEqual(found, expected)
+        self.assertEqual(store.within((3.0, -2.0), 6.0, kind='temperature'), [])
+
+    def test_follows_pose_graph_updates(self):
+        store = EventStore()
+        # Seen from two nodes whose drifted poses put it in two places
+        a = store.add('person', 0.0, 3, [0.0, 0.0, 0.0], offset=(1.0, 0.0))
+        b = store.add('person', 1.0, 9, [0.0, 2.0, np.pi / 2], offset=(1.0, 0.0))
+        self.assertEqual(len(store), 2)
+        np.testing.assert_allclose(b.position, [0.0, 3.0], atol=1e-9)
+        # Loop closure: node 9 really was next to node 3
+        affected = store.update_poses({9: np.array([1.0, -1.0, np.pi / 2]), 42: np.zeros(3)})
+        self.assertEqual(affected, {b.id})
+        self.assertEqual(len(store), 1)
+        merged = store.events()[0]
+        self.assertIs(merged, a)
+        self.assertEqual(merged.count, 2)
+        np.testing.assert_allclose(merged.position, [1.0, 0.0], atol=1e-9)
+        self.assertEqual([c.id for c in store.within((1.0, 0.0), 0.1)], [a.id])
+        # Later moves of either node still reach the merged cluster
+        store.update_poses({9: np.array([1.0, -1.2, np.pi / 2])})
+        np.testing.assert_allclose(merged.position, [1.0, -0.1], atol=1e-9)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# Add src directory to path to import the flight log
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from flight_log import FlightLog, FlightLogWriter, EVENT_KINDS, flight_log_consumer, flight_log_hook
+from ingestion import ScanPair
+from wire_protocol import SENSOR_DTYPE, IMU_DTYPE
+
+def make_pair(i, with_imu=True):
+    scan = np.zeros((), dtype=SENSOR_DTYPE)
+    scan['range'] = np.arange(45) + i
+    scan['angle'] = np.arange(0, 180, 4)
+    scan['timestamp'] = 1000 + i
+    scan['temperature'] = 20.0 + i % 10
+    scan['personDetectedFlag'] = i % 7 == 0
+    imu = None
+    if with_imu:
+        imu = np.zeros((), dtype=IMU_DTYPE)
+        imu['gyro_z'] = i * 0.5
+    return ScanPair(i * 0.1, scan, imu)
+
+class TestFlightLog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, count, segment_rows=100, buffer_rows=16, close=True):
+        writer = FlightLogWriter(self.directory, segment_rows, buffer_rows)
+        for i in range(count):
+            writer.append_pair(make_pair(i, with_imu=i % 3 != 0))
+        if close:
+            writer.close()
+        return writer
+
+    def test_time_slices_across_segments(self):
+        self.write(450)
+        log = FlightLog(self.directory)
+        scans = log['scans']
+        self.assertEqual(len(scans), 450)
+        self.assertEqual(len(scans.segments), 5)
+        # Inside one segment the result is a view of the mapped column
+        window = log.read('scans', 12.0, 15.0, columns=('time', 'timestamp'))
+        self.assertIsInstance(window['time'], np.memmap)
+        np.testing.assert_array_equal(window['timestamp'], np.arange(1120, 1150))
+        # Across segments it is concatenated
+        window = log.read('scans', 5.0, 25.05)
+        np.testing.assert_array_equal(window['timestamp'], np.arange(1050, 1251))
+        np.testing.assert_array_equal(window['range'][0], np.arange(45) + 50)
+        self.assertEqual(len(log.read('scans', 100.0, 200.0)['time']), 0)
+        np.testing.assert_allclose(log.time_range(), (0.0, 44.9))
+
+    def test_pairs_replay_what_was_written(self):
+        self.write(250)
+        pairs = list(FlightLog(self.directory).pairs(9.95, 20.0))
+        self.assertEqual(len(pairs), 100)
+        for pair, i in zip(pairs, range(100, 200)):
+            expected = make_pair(i, with_imu=i % 3 != 0)
+            self.assertAlmostEqual(pair.host_time, expected.host_time)
+            np.testing.assert_array_equal(pair.scan['range'], expected.scan['range'])
+            self.assertEqual(bool(pair.scan['personDetectedFlag']), i % 7 == 0)
+            if expected.imu is None:
+                self.assertIsNone(pair.imu)
+            else:
+                self.assertAlmostEqual(float(pair.imu['gyro_z']), i * 0.5)
+
+    def test_crash_keeps_flushed_rows_and_resumes(self):
+        writer = self.write(130, close=False)
+        # Simulate a crash halfway through writing one column
+        with open(os.path.join(self.directory, 'scans', '000001', 'range.col'), 'ab') as f:
+            f.write(b'\x01\x02\x03')
+        log = FlightLog(self.directory)
+        # 128 rows were flushed; the last 2 were still buffered
+        self.assertEqual(len(log['scans']), 128)
+        del writer
+        with self.assertRaises(ValueError):
+            FlightLogWriter(self.directory)
+        log.repair()
+        writer = FlightLogWriter(self.directory, segment_rows=100)
+        for i in range(128, 140):
+            writer.append_pair(make_pair(i))
+        with self.assertRaises(ValueError):
+            writer.append_pair(make_pair(0))
+        writer.close()
+        log = FlightLog(self.directory)
+        np.testing.assert_array_equal(log.read('scans')['timestamp'], np.arange(1000, 1140))
+
+    def test_consumer_and_hook_log_pairs_and_slam_output(self):
+        class FakeSlam:
+            def __init__(self):
+                self.poses = []
+                self.graph = self
+                self.num_nodes = 0
+                self.temperature_events = []
+                self.person_events = []
+                self.hooks = []
+
+            def __call__(self, pair):
+                self.poses.append(np.array([pair.host_time, 0.0, 0.0]))
+                self.num_nodes += 1
+                if pair.scan['personDetectedFlag']:
+                    self.person_events.append(self.poses[-1])
+                for hook in self.hooks:
+                    hook(self, pair, True)
+                return True
+
+        slam = FakeSlam()
+        with FlightLogWriter(self.directory) as writer:
+            slam.hooks.append(flight_log_hook(writer))
+            consume = flight_log_consumer(writer)
+            for i in range(20):
+                consume(make_pair(i))
+                slam(make_pair(i))
+        log = FlightLog(self.directory)
+        self.assertEqual(len(log.read('scans')['timestamp']), 20)
+        poses = log.read('poses')
+        np.testing.assert_array_equal(poses['node'], np.arange(20))
+        np.testing.assert_allclose(poses['x'], np.arange(20) * 0.1)
+        events = log.read('events')
+        np.testing.assert_array_equal(events['kind'], [EVENT_KINDS['person']] * 3)
+        np.testing.assert_allclose(events['x'], [0.0, 0.7, 1.4])
+
+if __name__ == '__main__':
+    unittest.main()
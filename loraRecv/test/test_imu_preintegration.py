@@ -0,0 +1,129 @@
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add src directory to path to import the IMU preintegration
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from imu_preintegration import preintegrate, integrate_samples, ImuPreintegrator
+from pose_graph import compose, relative_pose
+from slam_pipeline import SlamPipeline
+from ingestion import ScanPair
+from wire_protocol import SENSOR_DTYPE, IMU_DTYPE
+from pipeline_benchmark import room_ranges, ANGLES_DEG, PATH_RADII
+
+def samples(count, rng):
+    times = np.cumsum(rng.uniform(0.005, 0.015, count))
+    return times, rng.normal(0, 0.5, count), rng.normal(0, 1, (count, 2))
+
+def full_state(pre, i):
+    return np.r_[pre.delta[i], pre.velocity[i]]
+
+class TestImuPreintegration(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def test_matches_sample_by_sample_integration(self):
+        times, gyro, accel = samples(300, self.rng)
+        pre = preintegrate(times, gyro, accel)
+        pose, velocity = integrate_samples(times, gyro, accel)
+        np.testing.assert_allclose(pre.delta[0], pose, atol=1e-12)
+        np.testing.assert_allclose(pre.velocity[0], velocity, atol=1e-12)
+        self.assertAlmostEqual(pre.duration[0], times[-1] - times[0])
+
+        # Split into intervals, the pieces compose back into the whole
+        pieces = preintegrate(times, gyro, accel, ends=[100, 180, 299])
+        total, v = np.zeros(3), np.zeros(2)
+        for i in range(3):
+            step = pieces.delta[i].copy()
+            step[:2] += v * pieces.duration[i]
+            c, s = np.cos(step[2]), np.sin(step[2])
+            v = np.array([[c, s], [-s, c]]) @ (v + pieces.velocity[i])
+            total = compose(total, step)
+        np.testing.assert_allclose(total, pose, atol=1e-12)
+
+    def test_bias_jacobians(self):
+        times, gyro, accel = samples(200, self.rng)
+        pre = preintegrate(times, gyro, accel, ends=[120, 199])
+        eps = 1e-6
+        shifted = preintegrate(times, gyro, accel, ends=[120, 199], gyro_bias=eps)
+        for i in range(2):
+            np.testing.assert_allclose((full_state(shifted, i) - full_state(pre, i)) / eps,
+                                       pre.gyro_jacobian[i], rtol=1e-4, atol=1e-6)
+        for axis in range(2):
+            bias = np.zeros(2)
+            bias[axis] = eps
+            shifted = preintegrate(times, gyro, accel, ends=[120, 199], accel_bias=bias)
+            for i in range(2):
+                np.testing.assert_allclose((full_state(shifted, i) - full_state(pre, i)) / eps,
+                                           pre.accel_jacobian[i][:, axis], rtol=1e-4, atol=1e-6)
+
+    def test_covariance_matches_monte_carlo(self):
+        times, gyro, accel = samples(40, self.rng)
+        gyro_noise, accel_noise = 0.05, 0.2
+        pre = preintegrate(times, gyro, accel, gyro_noise=gyro_noise, accel_noise=accel_noise)
+        # 4000 noisy copies, integrated as 4000 intervals in one call
+        runs = 4000
+        dt = np.r_[np.diff(times), 1.0]
+        noisy_gyro = gyro + self.rng.normal(0, 1, (runs, 40)) * gyro_noise / np.sqrt(dt)
+        noisy_accel = accel + self.rng.normal(0, 1, (runs, 40, 2)) * accel_noise / np.sqrt(dt)[:, None]
+        starts = np.arange(runs) * 40
+        noisy = preintegrate(np.tile(times, runs), noisy_gyro.reshape(-1), noisy_accel.reshape(-1, 2),
+                             starts, starts + 39)
+        states = np.column_stack([noisy.delta, noisy.velocity])
+        np.testing.assert_allclose(np.cov(states.T), pre.covariance[0], rtol=0.15,
+                                   atol=0.05 * np.abs(pre.covariance[0]).max())
+
+    def test_learns_gyro_bias_from_matched_motion(self):
+        imu = ImuPreintegrator()
+        # Forward at 2 m/s turning at 1 rad/s, read by a gyro 0.05 rad/s off
+        truth = np.array([0.2, 0.0, 0.1])
+        gyro, accel = [1.05, 1.05], [(0, 2), (0, 2)]
+        matched = np.diag([0.005 ** 2, 0.005 ** 2, np.radians(0.1) ** 2])
+        first = imu.motion(imu.integrate([0.0, 0.1], gyro, accel))
+        for _ in range(300):
+            imu.update(imu.integrate([0.0, 0.1], gyro, accel), 0, truth, matched)
+        self.assertAlmostEqual(imu.gyro_bias, 0.05, delta=0.005)
+        np.testing.assert_allclose(imu.velocity, [2, 0], atol=0.15)
+        delta, covariance = imu.motion(imu.integrate([0.0, 0.1], gyro, accel))
+        np.testing.assert_allclose(delta, truth, atol=0.001)
+        # The prior tightens as the velocity settles
+        self.assertLess(covariance[0, 0], first[1][0, 0] / 10)
+
+    def test_prior_narrows_scan_matching(self):
+        # Once round the room at 10 scans/s, with a biased gyro
+        rng = np.random.default_rng(0)
+        angles = np.radians(ANGLES_DEG)
+        pairs, truth = [], []
+        for k in range(60):
+            phase = 2 * np.pi * k / 60
+            pose = np.array([PATH_RADII[0] * np.sin(phase), -PATH_RADII[1] * np.cos(phase), phase])
+            truth.append(pose)
+            scan = np.zeros((), dtype=SENSOR_DTYPE)
+            ranges = (room_ranges(pose, angles) + rng.normal(0, 0.01, len(angles))) * 100
+            scan['range'] = np.clip(ranges, 0, 899)
+            scan['angle'] = ANGLES_DEG
+            scan['timestamp'] = 100 * k + 1
+            imu = np.zeros((), dtype=IMU_DTYPE)
+            imu['gyro_z'] = 2 * np.pi / 6 + 0.05 + rng.normal(0, 0.02)
+            pairs.append(ScanPair(k / 10, scan, imu))
+        candidates = {}
+        for imu_prior in (False, True):
+            slam = SlamPipeline(imu_prior=imu_prior)
+            scored = []
+            match = slam.matcher.match
+            def counting(*args, **kwargs):
+                result = match(*args, **kwargs)
+                scored.append(result.candidates)
+                return result
+            slam.matcher.match = counting
+            for pair in pairs:
+                slam(pair)
+            errors = [np.hypot(*(relative_pose(truth[0], truth[i])[:2] - slam.poses[i][:2]))
+                      for i in range(len(pairs))]
+            self.assertLess(max(errors), 0.25)
+            candidates[imu_prior] = np.mean(scored)
+        self.assertLess(candidates[True], candidates[False] / 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import sys
+import os
+import asyncio
+import tempfile
+import numpy as np
+
+# Add src directory to path to import the ingestion service
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from ingestion import (IngestionService, RingBuffer, PacketPairer, file_source, serial_source,
+                       process_scan_consumer)
+from wire_protocol import encode_frame, SENSOR_DTYPE, IMU_DTYPE, FRAME_SCAN, FRAME_IMU
+
+class FakeMapper:
+    def __init__(self):
+        self.scans = []
+
+    def process_scan(self, data):
+        self.scans.append(data)
+
+class TestIngestion(unittest.TestCase):
+    def generate_stream(self, count):
+        chunks = []
+        for i in range(count):
+            scan = np.zeros((), dtype=SENSOR_DTYPE)
+            scan['device_id'] = 1
+            scan['range'] = 100
+            scan['range'][40:] = 900
+            scan['angle'] = np.arange(0, 180, 4)
+            scan['timestamp'] = 1000 * i
+            imu = np.zeros((), dtype=IMU_DTYPE)
+            imu['device_id'] = 2
+            imu['gyro_z'] = 0.1 * i
+            chunks.append(encode_frame(FRAME_SCAN, scan.tobytes()))
+            chunks.append(encode_frame(FRAME_IMU, imu.tobytes()))
+        return b''.join(chunks)
+
+    def test_ring_buffer_counts_drops(self):
+        buffer = RingBuffer(3)
+        for i in range(5):
+            buffer.push(i)
+        self.assertEqual(buffer.dropped, 2)
+        self.assertEqual([buffer.pop() for _ in range(4)], [2, 3, 4, None])
+
+        buffer = RingBuffer(2, overflow='drop_newest')
+        self.assertTrue(buffer.push('a'))
+        self.assertTrue(buffer.push('b'))
+        self.assertFalse(buffer.push('c'))
+        self.assertEqual(buffer.pop(), 'a')
+
+    def test_pairing_window(self):
+        pairer = PacketPairer(window=0.5)
+        self.assertEqual(pairer.add_scan(0.0, 'scan1'), [])
+        pair, = pairer.add_imu(0.1, 'imu1')
+        self.assertEqual((pair.scan, pair.imu), ('scan1', 'imu1'))
+        pairer.add_scan(1.0, 'scan2')
+        late, = pairer.add_imu(2.0, 'imu2')
+        self.assertIsNone(late.imu)
+        self.assertEqual(pairer.unpaired_scans, 1)
+
+    def test_file_source_feeds_room_mapper(self):
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(self.generate_stream(10))
+        mapper = FakeMapper()
+        try:
+            service = IngestionService(file_source(f.name, chunk_size=97),
+                                       [process_scan_consumer(mapper)])
+            asyncio.run(service.run())
+        finally:
+            os.unlink(f.name)
+        self.assertEqual(len(mapper.scans), 10)
+        self.assertEqual(mapper.scans[3]["dataCount"], 40)
+        self.assertEqual(mapper.scans[3]["distances"][0], 1000)
+        self.assertAlmostEqual(mapper.scans[3]["gyroZ"][0], 0.3, places=5)
+        self.assertEqual(service.stats()['paired'], 10)
+
+    @unittest.skipIf(os.name == 'nt', "pty stand-in needs a POSIX host")
+    def test_pty_source(self):
+        master, slave = os.openpty()
+        pairs = []
+
+        async def scenario():
+            service = IngestionService(serial_source(os.ttyname(slave), baud_rate=None),
+                                       [pairs.append])
+            task = asyncio.create_task(service.run())
+            await asyncio.sleep(0.1)  # let the port open in raw mode first
+            os.write(master, self.generate_stream(3))
+            while len(pairs) < 3:
+                await asyncio.sleep(0.01)
+            task.cancel()
+
+        try:
+            asyncio.run(asyncio.wait_for(scenario(), 5))
+        finally:
+            os.close(master)
+            os.close(slave)
+        self.assertEqual([int(p.scan['timestamp']) for p in pairs], [0, 1000, 2000])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+import sys
+import os
+import json
+import numpy as np
+
+# Add src directory to path to import the map stream
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from map_stream import MapStream, SharedMapFeed, decode_tile
+from occupancy_grid import OccupancyGrid
+
+class Client:
+    """Applies stream messages the way the browser does."""
+
+    def __init__(self):
+        self.tiles = {}
+        self.seq = None
+
+    def apply(self, message):
+        body = json.loads(message.data)
+        if not body['delta']:
+            self.tiles = {}
+        for tile in body['tiles']:
+            key = tuple(tile['key'])
+            previous = self.tiles.get(key) if body['delta'] else None
+            self.tiles[key] = decode_tile(tile['data'], body['tile_size'], previous)
+        self.seq = message.seq
+        return body
+
+class TestMapStream(unittest.TestCase):
+    def setUp(self):
+        self.grid = OccupancyGrid(resolution=10)
+        self.stream = MapStream(self.grid, history=4)
+        self.angles = np.radians(np.arange(0, 180, 4))
+
+    def scan(self, scan_id, x):
+        self.grid.insert_scan(scan_id, (x, 0, 0), np.full(45, 2.0), self.angles)
+        return self.stream.update(pose=(x, 0, 0), events=[{'type': 'person', 'pose': [x, 0, 0]}])
+
+    def assert_in_sync(self, client):
+        self.assertEqual(set(client.tiles), set(self.grid.tiles.tiles))
+        for key, tile in self.grid.tiles.tiles.items():
+            np.testing.assert_array_equal(client.tiles[key], tile.data)
+
+    def test_deltas_reproduce_the_grid(self):
+        client = Client()
+        for message in self.stream.messages_since(client.seq):
+            client.apply(message)
+        for step in range(3):
+            self.scan(step, step * 0.3)
+            for message in self.stream.messages_since(client.seq):
+                body = client.apply(message)
+            self.assertEqual(body['pose'], [step * 0.3, 0, 0])
+            self.assertEqual(len(body['events']), 1)
+            self.assert_in_sync(client)
+        # Only the tiles the last scan touched were sent
+        self.assertLessEqual(len(body['tiles']), len(self.grid.tiles))
+        self.assertEqual(self.stream.messages_since(client.seq), [])
+
+    def test_late_or_lagging_clients_get_a_snapshot(self):
+        for step in range(6):
+            self.scan(step, step * 0.2)
+        late = Client()
+        messages = self.stream.messages_since(None)
+        self.assertEqual(len(messages), 1)
+        late.apply(messages[0])
+        self.assert_in_sync(late)
+        # seq 1 has dropped out of the 4-message history
+        self.assertFalse(json.loads(self.stream.messages_since(1)[0].data)['delta'])
+        self.assertIs(self.stream.snapshot(), messages[0])
+
+    def test_follow_emits_server_sent_events(self):
+        self.scan(0, 0.0)
+        events = self.stream.follow(None, keepalive=0.01)
+        first = next(events)
+        self.assertTrue(first.startswith(f"id: {self.stream.seq}\nevent: map\ndata: {{"))
+        self.assertEqual(next(events), ": keepalive\n\n")
+
+    def test_feed_from_shared_map(self):
+        from shared_map import SharedMap
+
+        writer = SharedMap(create=True, rows=512, cols=512)
+        self.addCleanup(writer.close)
+        reader = SharedMap(writer.name)
+        self.addCleanup(reader.close)
+        stream = MapStream()
+        feed = SharedMapFeed(reader, stream)
+        self.assertIsNone(feed.poll())
+        client = Client()
+        person = {'id': 1, 'type': 'person', 'pose': [0.5, 0.0]}
+        for step in range(3):
+            self.grid.insert_scan(step, (step * 0.3, 0, 0), np.full(45, 2.0), self.angles)
+            writer.publish(self.grid, [(step * 0.3, 0, 0)], [person])
+            body = client.apply(feed.poll())
+            self.assertEqual(body['pose'], [step * 0.3, 0, 0])
+            # The merged event only once
+            self.assertEqual(len(body['events']), 1 if step == 0 else 0)
+            self.assert_in_sync(client)
+        self.assertIsNone(feed.poll())
+        # A new grid in the SLAM process resynchronizes clients
+        other = OccupancyGrid(resolution=10)
+        other.insert_scan(0, (5.0, 0, 0), np.full(45, 1.0), self.angles)
+        writer.publish(other, [(5.0, 0, 0)], [person])
+        self.assertEqual(len(json.loads(feed.poll().data)['events']), 1)
+        messages = stream.messages_since(client.seq)
+        self.assertFalse(client.apply(messages[0])['delta'])
+        self.grid = other
+        self.assert_in_sync(client)
+
+if __name__ == '__main__':
+    unittest.main()
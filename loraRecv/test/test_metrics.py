@@ -0,0 +1,128 @@
+import unittest
+import sys
+import os
+import gc
+import asyncio
+import numpy as np
+
+# Add src directory to path to import the metrics registry
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from metrics import Metrics, METRICS
+from ingestion import IngestionService
+from wire_protocol import encode_frame, SENSOR_DTYPE, IMU_DTYPE, FRAME_SCAN, FRAME_IMU
+
+def sample(text, line_start):
+    for line in text.splitlines():
+        if line.startswith(line_start + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+class TestMetrics(unittest.TestCase):
+    def test_prometheus_text(self):
+        metrics = Metrics()
+        packets = metrics.counter('packets_total', "Packets")
+        packets.inc()
+        packets.inc(2)
+        latency = metrics.histogram('stage_seconds', "Stage latency", buckets=(0.01, 0.1))
+        for value in (0.005, 0.05, 0.05, 3.0):
+            latency.labels(stage='match').observe(value)
+        text = metrics.render()
+        self.assertIn('# TYPE hexit_packets_total counter', text)
+        self.assertEqual(sample(text, 'hexit_packets_total'), 3)
+        # Buckets are cumulative and end with +Inf
+        self.assertEqual(sample(text, 'hexit_stage_seconds_bucket{stage="match",le="0.01"}'), 1)
+        self.assertEqual(sample(text, 'hexit_stage_seconds_bucket{stage="match",le="0.1"}'), 3)
+        self.assertEqual(sample(text, 'hexit_stage_seconds_bucket{stage="match",le="+Inf"}'), 4)
+        self.assertEqual(sample(text, 'hexit_stage_seconds_count{stage="match"}'), 4)
+        self.assertAlmostEqual(sample(text, 'hexit_stage_seconds_sum{stage="match"}'), 3.105)
+        self.assertEqual(latency.labels(stage='match').quantile(0.5), 0.1)
+        with self.assertRaises(ValueError):
+            metrics.histogram('packets_total')
+
+    def test_disabled_records_nothing(self):
+        metrics = Metrics(enabled=False)
+        counter = metrics.counter('events_total')
+        histogram = metrics.histogram('work_seconds')
+        counter.inc()
+        with histogram.time():
+            pass
+        self.assertEqual((counter.value, histogram.count), (0, 0))
+        metrics.enabled = True
+        with histogram.time():
+            pass
+        self.assertEqual(histogram.count, 1)
+
+    def test_collectors_are_summed_and_weak(self):
+        metrics = Metrics()
+
+        class Source:
+            def __init__(self, value):
+                self.value = value
+
+            def collect(self):
+                return [('errors_total', 'counter', "Errors", self.value)]
+
+        first, second = Source(2), Source(5)
+        metrics.add_collector(first.collect)
+        metrics.add_collector(second.collect)
+        self.assertEqual(sample(metrics.render(), 'hexit_errors_total'), 7)
+        del second
+        gc.collect()
+        self.assertEqual(sample(metrics.render(), 'hexit_errors_total'), 2)
+
+    def test_ingestion_exports_packet_losses(self):
+        scan = np.zeros((), dtype=SENSOR_DTYPE)
+        scan['range'] = 100
+        imu = np.zeros((), dtype=IMU_DTYPE)
+        good = encode_frame(FRAME_SCAN, scan.tobytes()) + encode_frame(FRAME_IMU, imu.tobytes())
+        corrupt = bytearray(encode_frame(FRAME_SCAN, scan.tobytes()))
+        corrupt[10] ^= 0xFF
+        stream = [good, bytes(corrupt), b'First packet invalid or not ID1. Dropping packet.\n', good]
+
+        async def source():
+            for chunk in stream:
+                yield chunk
+
+        service = IngestionService(source(), [lambda pair: None])
+        decoded = METRICS.histogram('ingestion_decode_seconds').count
+        asyncio.run(service.run())
+        collected = {name: value for name, kind, help, value, labels in service.collect_metrics()}
+        self.assertEqual(collected['ingestion_crc_errors_total'], 1)
+        self.assertEqual(collected['receiver_dropped_packets_total'], 1)
+        self.assertEqual(collected['ingestion_dispatched_total'], 2)
+        self.assertEqual(METRICS.histogram('ingestion_decode_seconds').count - decoded, len(stream))
+        self.assertIn('hexit_receiver_dropped_packets_total{service="%s"}' % service.name, METRICS.render())
+        service.stop()
+
+    def test_ingestion_series_per_service(self):
+        scan = np.zeros((), dtype=SENSOR_DTYPE)
+        scan['range'] = 100
+        imu = np.zeros((), dtype=IMU_DTYPE)
+        good = encode_frame(FRAME_SCAN, scan.tobytes()) + encode_frame(FRAME_IMU, imu.tobytes())
+
+        async def source(count):
+            for _ in range(count):
+                yield good
+
+        def failing(pair):
+            raise RuntimeError("boom")
+
+        services = [IngestionService(source(2), [failing], name='alpha'),
+                    IngestionService(source(3), [lambda pair: None], name='bravo')]
+        with self.assertLogs('ingestion', 'ERROR') as logs:
+            for service in services:
+                asyncio.run(service.run())
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn('boom', logs.output[0])
+        text = METRICS.render()
+        self.assertEqual(sample(text, 'hexit_ingestion_consumer_errors_total{service="alpha"}'), 2)
+        self.assertEqual(sample(text, 'hexit_ingestion_consumer_errors_total{service="bravo"}'), 0)
+        self.assertEqual(sample(text, 'hexit_ingestion_dispatched_total{service="bravo"}'), 3)
+        for service in services:
+            service.stop()
+        self.assertNotIn('service="alpha"', METRICS.render())
+        # Unnamed services get names of their own
+        self.assertNotEqual(IngestionService(source(0)).name, IngestionService(source(0)).name)
+
+if __name__ == '__main__':
+    unittest.main()
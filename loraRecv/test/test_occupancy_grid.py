@@ -0,0 +1,51 @@
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add src directory to path to import the occupancy grid
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from occupancy_grid import OccupancyGrid
+
+class TestOccupancyGrid(unittest.TestCase):
+    def setUp(self):
+        self.grid = OccupancyGrid(resolution=10)
+        self.angles = np.radians(np.arange(0, 180, 4))
+        self.ranges = np.full(45, 2.0)
+
+    def test_hits_and_free_space(self):
+        self.grid.insert_scan(0, (0, 0, 0), self.ranges, self.angles)
+        self.assertGreater(self.grid.log_odds_at([2.01, 0.0]), 0)
+        self.assertLess(self.grid.log_odds_at([1.0, 0.0]), 0)
+        mask, origin = self.grid.occupied_mask()
+        row, col = self.grid.world_to_cell(np.array([2.01, 0.0]) - origin)
+        self.assertTrue(mask[row, col])
+
+    def test_max_range_beams_do_not_mark_hits(self):
+        self.grid.insert_scan(0, (0, 0, 0), np.full(45, 9.0), self.angles)
+        self.assertFalse((self.grid.log_odds()[0] > 0).any())
+
+    def test_map_grows_past_the_old_fixed_extent(self):
+        self.grid.insert_scan(0, (-35.0, 60.0, np.pi), self.ranges, self.angles)
+        self.assertGreater(self.grid.log_odds_at([-36.99, 60.01]), 0)
+        self.assertLess(len(self.grid.tiles), 10)
+
+    def test_moved_pose_is_reinserted_exactly(self):
+        self.grid.insert_scan(0, (0, 0, 0), self.ranges, self.angles)
+        self.grid.insert_scan(1, (0.5, 0, 0), self.ranges, self.angles)
+        moved = self.grid.update_poses({0: (0, 0, 0), 1: (0.2, 0.1, 0.05)})
+        self.assertEqual(moved, [1])
+
+        expected = OccupancyGrid(resolution=10)
+        expected.insert_scan(0, (0, 0, 0), self.ranges, self.angles)
+        expected.insert_scan(1, (0.2, 0.1, 0.05), self.ranges, self.angles)
+        bounds = expected.tiles.bounds()
+        np.testing.assert_array_equal(self.grid.tiles.to_dense(bounds)[0],
+                                      expected.tiles.to_dense(bounds)[0])
+
+        self.grid.remove_scan(0)
+        self.grid.remove_scan(1)
+        self.assertFalse(self.grid.log_odds()[0].any())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add src directory to path to import path smoothing
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from path_smoothing import line_of_sight, smooth_path, resample
+from planner import astar, floor_plan
+
+class TestPathSmoothing(unittest.TestCase):
+    def setUp(self):
+        self.blocked = floor_plan(rows=120, cols=160, room=40, door=6)
+        self.route = astar(self.blocked, (5, 5), (110, 150))
+
+    def test_line_of_sight(self):
+        blocked = np.zeros((5, 5), dtype=bool)
+        blocked[1, 2] = blocked[2, 1] = True
+        clear = line_of_sight(blocked, [(0, 0), (0, 0), (1, 1), (4, 0), (0, 0)],
+                              [(0, 4), (4, 4), (2, 2), (4, 4), (0, 7)])
+        # Diagonals may not squeeze between touching obstacles; off-map is blocked
+        np.testing.assert_array_equal(clear, [True, False, False, True, False])
+
+    def test_matches_dense_sampling(self):
+        rng = np.random.default_rng(0)
+        blocked = rng.random((30, 30)) < 0.08
+        starts, ends = rng.integers(0, 30, (500, 2)), rng.integers(0, 30, (500, 2))
+        clear = line_of_sight(blocked, starts, ends)
+        t = np.linspace(0, 1, 2000)[:, None, None]
+        cells = np.floor(starts + 0.5 + t * (ends - starts)).astype(int)
+        sampled = ~blocked[cells[..., 0], cells[..., 1]].any(axis=0)
+        # Never clear where a sample hits; stricter only at exact corners
+        self.assertFalse((clear & ~sampled).any())
+
+    def test_shortcuts_stay_clear_and_shorter(self):
+        greedy = smooth_path(self.blocked, self.route.cells)
+        any_angle = smooth_path(self.blocked, self.route.cells, method='any_angle')
+        for result in (greedy, any_angle):
+            self.assertTrue(line_of_sight(self.blocked, result.points[:-1], result.points[1:]).all())
+            np.testing.assert_array_equal(result.points[[0, -1]], self.route.cells[[0, -1]])
+            self.assertLess(result.length_after, result.length_before)
+            self.assertEqual(result.removed, len(self.route.cells) - len(result.points))
+        self.assertLessEqual(any_angle.length_after, greedy.length_after + 1e-9)
+
+    def test_resampling(self):
+        result = smooth_path(self.blocked, self.route.cells, spacing=2.0)
+        steps = np.hypot(*np.diff(result.points, axis=0).T)
+        self.assertLessEqual(steps.max(), 2.0 + 1e-9)
+        spline = smooth_path(self.blocked, self.route.cells, spacing=2.0, spline=True)
+        self.assertTrue(line_of_sight(self.blocked, spline.points[:-1], spline.points[1:]).all())
+        np.testing.assert_array_equal(spline.points[[0, -1]], self.route.cells[[0, -1]])
+        line = resample([(0, 0), (0, 10)], 2.5)
+        np.testing.assert_allclose(line[:, 1], [0, 2.5, 5, 7.5, 10])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import unittest
+import sys
+import os
+import hashlib
+import shutil
+import subprocess
+import tempfile
+import numpy as np
+
+# Add src directory to path to import the person detector
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from person_detector import (PersonDetector, Interpreter, extract_model, load_model, quantize_multiplier,
+                             multiply_by_quantized_multiplier, saturating_rounding_doubling_high_mul,
+                             rounding_divide_by_pot, exp_on_negative_values, one_over_one_plus_x_for_x_in_0_1,
+                             MODEL_HEADER, TFLM_SOURCE, FRAME_SIZE, INT32_MAX, INT32_MIN)
+
+HARNESS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tflm_reference.cc')
+
+# The TFLM sources the MicroInterpreter needs for this graph's five ops
+_MICRO = ['micro_interpreter', 'micro_interpreter_context', 'micro_interpreter_graph', 'micro_allocator',
+          'micro_allocation_info', 'micro_context', 'memory_helpers', 'flatbuffer_utils', 'micro_log', 'debug_log',
+          'micro_op_resolver', 'micro_utils', 'micro_profiler', 'micro_resource_variable', 'micro_time',
+          'system_setup']
+_KERNELS = ['conv', 'conv_common', 'depthwise_conv', 'depthwise_conv_common', 'pooling', 'pooling_common',
+            'reshape', 'reshape_common', 'softmax', 'softmax_common', 'kernel_util']
+_DIRECTORIES = ['micro/arena_allocator', 'micro/memory_planner', 'micro/tflite_bridge', 'core/api']
+_OTHER = ['core/c/common', 'kernels/internal/common', 'kernels/internal/portable_tensor_utils',
+          'kernels/internal/quantization_util', 'kernels/internal/runtime_shape', 'kernels/internal/tensor_ctypes',
+          'kernels/kernel_util', 'schema/schema_utils']
+
+
+def tflm_sources():
+    root = os.path.join(TFLM_SOURCE, 'tensorflow', 'lite')
+    sources = [os.path.join(root, 'micro', name + '.cpp') for name in _MICRO]
+    sources += [os.path.join(root, 'micro', 'kernels', name + '.cpp') for name in _KERNELS]
+    sources += [os.path.join(root, name + '.cpp') for name in _OTHER]
+    for directory in _DIRECTORIES:
+        path = os.path.join(root, directory)
+        sources += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.cpp'))
+    return sources
+
+
+def build_reference():
+    """Compile the TFLM oracle once; objects are cached in the temp directory across runs."""
+    compiler = shutil.which('g++')
+    if compiler is None or not os.path.isdir(TFLM_SOURCE):
+        return None
+    flags = ['-std=c++17', '-O1', '-I' + TFLM_SOURCE, '-I' + os.path.dirname(os.path.dirname(os.path.dirname(MODEL_HEADER)))]
+    cache = os.path.join(tempfile.gettempdir(), 'hexit_tflm_reference')
+    os.makedirs(cache, exist_ok=True)
+    objects = []
+    for source in tflm_sources():
+        key = hashlib.sha1((source + ' '.join(flags)).encode() + open(source, 'rb').read()).hexdigest()[:16]
+        obj = os.path.join(cache, f'{os.path.basename(source)}.{key}.o')
+        if not os.path.exists(obj):
+            subprocess.run([compiler] + flags + ['-c', source, '-o', obj + '.tmp'], check=True)
+            os.replace(obj + '.tmp', obj)
+        objects.append(obj)
+    with open(HARNESS, 'rb') as f, open(MODEL_HEADER, 'rb') as g:
+        key = hashlib.sha1(f.read() + g.read()).hexdigest()[:16]
+    binary = os.path.join(cache, f'tflm_reference.{key}')
+    if not os.path.exists(binary):
+        subprocess.run([compiler] + flags + [HARNESS] + objects + ['-o', binary + '.tmp'], check=True)
+        os.replace(binary + '.tmp', binary)
+    return binary
+
+
+def sample_frames():
+    """Noise, flat fields, gradients and blurred blobs: every layer sees varied statistics."""
+    rng = np.random.default_rng(7)
+    frames = [rng.integers(0, 256, (FRAME_SIZE, FRAME_SIZE)) for _ in range(4)]
+    frames += [np.zeros((FRAME_SIZE, FRAME_SIZE)), np.full((FRAME_SIZE, FRAME_SIZE), 255)]
+    ramp = np.linspace(0, 255, FRAME_SIZE)
+    frames += [np.tile(ramp, (FRAME_SIZE, 1)), np.tile(ramp[:, None], (1, FRAME_SIZE))]
+    y, x = np.mgrid[:FRAME_SIZE, :FRAME_SIZE]
+    for _ in range(4):
+        cy, cx, r = rng.uniform(20, 76, 2).tolist() + [rng.uniform(8, 30)]
+        blob = 255 * np.exp(-((y - cy) ** 2 + (x - cx) ** 2) / (2 * r * r))
+        frames.append(np.clip(blob + rng.normal(0, 20, blob.shape), 0, 255))
+    return np.array(frames).astype(np.uint8)
+
+
+class TestPersonDetector(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.interpreter = Interpreter()
+
+    def test_model_from_header(self):
+        data = extract_model()
+        self.assertEqual(data[4:8], b'TFL3')
+        model = load_model(data)
+        self.assertEqual(model.tensors[model.inputs[0]].shape, (1, 96, 96, 1))
+        self.assertEqual(model.tensors[model.outputs[0]].shape, (1, 2))
+        self.assertEqual({op.op for op in model.operators},
+                         {'CONV_2D', 'DEPTHWISE_CONV_2D', 'AVERAGE_POOL_2D', 'RESHAPE', 'SOFTMAX'})
+
+    def test_fixed_point_helpers(self):
+        self.assertEqual(quantize_multiplier(0.5), (1 << 30, 0))
+        self.assertEqual(quantize_multiplier(0.75), (3 << 29, 0))
+        self.assertEqual(quantize_multiplier(3.0), (3 << 29, 2))
+        self.assertEqual(int(saturating_rounding_doubling_high_mul(INT32_MIN, INT32_MIN)), INT32_MAX)
+        # Rounds half away from zero, unlike an arithmetic shift
+        np.testing.assert_array_equal(rounding_divide_by_pot(np.array([5, -5, 6, -6, 7, -7]), 2), [1, -1, 2, -2, 2, -2])
+        # Double rounding can land just past half a step
+        multiplier, shift = quantize_multiplier(0.0123)
+        values = np.arange(-5000, 5000, 37)
+        np.testing.assert_allclose(multiply_by_quantized_multiplier(values, multiplier, shift), values * 0.0123, atol=0.51)
+        # exp of Q5.26 inputs and 1 / (1 + x) of Q0.31 inputs, against floats
+        x = -np.linspace(0, 8, 50)
+        exps = exp_on_negative_values(np.round(x * (1 << 26)).astype(np.int64), 5) / 2.0 ** 31
+        np.testing.assert_allclose(exps, np.exp(x), atol=1e-6)
+        x = np.linspace(0, 0.99, 50)
+        inverse = one_over_one_plus_x_for_x_in_0_1(np.round(x * 2.0 ** 31).astype(np.int64)) / 2.0 ** 31
+        np.testing.assert_allclose(inverse, 1 / (1 + x), atol=1e-6)
+
+    def test_batches_match_single_frames(self):
+        frames = sample_frames()
+        detector = PersonDetector(batch_size=5)
+        batched = detector.logits(frames)
+        single = np.concatenate([self.interpreter.invoke(frame.astype(np.int16).reshape(1, 96, 96, 1) - 128)
+                                 for frame in frames])
+        np.testing.assert_array_equal(batched, single)
+        # Softmax outputs of two classes sum to about 1
+        probabilities = (batched.astype(int) + 128) / 256
+        np.testing.assert_allclose(probabilities.sum(axis=1), 1.0, atol=2 / 256)
+        detection = detector.detect(frames)
+        np.testing.assert_array_equal(detection.person, batched[:, 1].astype(int) + 128)
+        self.assertEqual(detection.detected.shape, (len(frames),))
+
+    def test_matches_tflm_reference_kernels(self):
+        reference = build_reference()
+        if reference is None:
+            self.skipTest("needs g++ and the tflm_esp32 sources")
+        frames = sample_frames()
+        # Every tensor a layer writes, not just the output
+        indices = [layer.output for layer in self.interpreter.layers]
+        result = subprocess.run([reference] + [str(i) for i in indices], input=frames.tobytes(),
+                                capture_output=True, check=True)
+        shapes = [self.interpreter.model.tensors[i].shape[1:] for i in indices]
+        sizes = [int(np.prod(shape)) for shape in shapes]
+        expected = np.frombuffer(result.stdout, dtype=np.int8).reshape(len(frames), sum(sizes))
+
+        _, values = self.interpreter.invoke((frames.astype(np.int16) - 128).astype(np.int8), keep=True)
+        offset = 0
+        for layer, index, shape, size in zip(self.interpreter.layers, indices, shapes, sizes):
+            mismatches = np.count_nonzero(values[index].reshape(len(frames), size) != expected[:, offset:offset + size])
+            self.assertEqual(mismatches, 0, f"{layer.op} -> tensor {index} differs in {mismatches} values")
+            offset += size
+
+if __name__ == '__main__':
+    unittest.main()
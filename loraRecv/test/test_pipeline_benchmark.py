@@ -0,0 +1,62 @@
+import unittest
+import sys
+import os
+import json
+import asyncio
+import tempfile
+import time
+
+# Add src directory to path to import the pipeline benchmark
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from pipeline_benchmark import synthetic_stream, recorded_stream, paced_source, run_benchmark, compare
+from wire_protocol import StreamDecoder
+
+class TestPipelineBenchmark(unittest.TestCase):
+    def test_synthetic_stream_is_receiver_format(self):
+        for stream_format in ('binary', 'json'):
+            chunks = synthetic_stream(5, rate=10.0, stream_format=stream_format)
+            self.assertEqual([t for t, _ in chunks], [0.0, 0.1, 0.2, 0.3, 0.4])
+            batch = StreamDecoder().feed(b''.join(data for _, data in chunks))
+            self.assertEqual(len(batch.scans) + len(batch.pairs), 5)
+
+    def test_recorded_stream_is_timed_by_scan_timestamps(self):
+        with tempfile.NamedTemporaryFile(suffix='.bin', delete=False) as f:
+            f.write(b''.join(data for _, data in synthetic_stream(20, rate=5.0)))
+        self.addCleanup(os.remove, f.name)
+        chunks = recorded_stream(f.name, chunk_size=512)
+        self.assertGreaterEqual(chunks[0][0], 0.0)
+        self.assertAlmostEqual(chunks[-1][0], 19 / 5.0)
+        self.assertEqual([t for t, _ in chunks], sorted(t for t, _ in chunks))
+
+    def test_paced_replay_follows_speed(self):
+        chunks = synthetic_stream(5, rate=10.0)
+
+        async def drain(speed):
+            started = time.perf_counter()
+            count = 0
+            async for _ in paced_source(chunks, speed):
+                count += 1
+            return count, time.perf_counter() - started
+
+        count, elapsed = asyncio.run(drain(2.0))
+        self.assertEqual(count, 5)
+        self.assertGreaterEqual(elapsed, 0.19)
+        self.assertLess(asyncio.run(drain(None))[1], 0.05)
+
+    def test_report_is_json_with_stage_percentiles(self):
+        report = run_benchmark(synthetic_stream(12), plan_every=5)
+        report = json.loads(json.dumps(report))
+        self.assertEqual(report['scans'], 12)
+        self.assertEqual(report['ingestion']['dispatched'], 12)
+        self.assertEqual(report['plans'] + report['plan_failures'], 2)
+        for stage in ('queue', 'scan_matching', 'mapping', 'slam', 'planning', 'end_to_end'):
+            entry = report['stages'][stage]
+            self.assertLessEqual(entry['p50_ms'], entry['p99_ms'])
+            self.assertLessEqual(entry['p99_ms'], entry['max_ms'])
+        self.assertGreater(report['throughput_scans_per_s'], 0)
+        ratios = compare(report, report)
+        self.assertEqual(ratios['throughput'], 1.0)
+        self.assertEqual(ratios['slam']['p99_ms'], 1.0)
+
+if __name__ == '__main__':
+    unittest.main()
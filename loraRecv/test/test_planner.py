@@ -0,0 +1,62 @@
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add src directory to path to import the planner
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from planner import GridPlanner, astar, distance_field, descend, floor_plan
+
+class TestPlanner(unittest.TestCase):
+    def setUp(self):
+        self.blocked = floor_plan(rows=120, cols=160, room=40, door=6)
+        free = np.argwhere(~self.blocked)
+        rng = np.random.default_rng(0)
+        self.cells = [tuple(cell) for cell in free[rng.integers(len(free), size=10)]]
+
+    def test_field_and_astar_agree(self):
+        start = self.cells[0]
+        field = distance_field(self.blocked, start)
+        for goal in self.cells[1:]:
+            route = descend(field, goal)
+            self.assertAlmostEqual(route.cost, astar(self.blocked, start, goal).cost)
+            steps = np.diff(route.cells, axis=0)
+            self.assertLessEqual(np.abs(steps).max(), 1)
+            self.assertAlmostEqual(np.hypot(steps[:, 0], steps[:, 1]).sum(), route.cost)
+            self.assertFalse(self.blocked[route.cells[:, 0], route.cells[:, 1]].any())
+            self.assertEqual(tuple(route.cells[0]), start)
+            self.assertEqual(tuple(route.cells[-1]), goal)
+
+    def test_no_corner_cutting_or_route(self):
+        blocked = np.zeros((3, 3), dtype=bool)
+        blocked[0, 1] = blocked[1, 0] = True
+        self.assertIsNone(astar(blocked, (0, 0), (2, 2)))
+        self.assertIsNone(descend(distance_field(blocked, (2, 2)), (0, 0)))
+        with self.assertRaises(ValueError):
+            astar(blocked, (0, 1), (2, 2))
+
+    def test_fields_cached_per_map_version(self):
+        planner = GridPlanner(self.blocked, cache_size=2)
+        start = self.cells[0]
+        for goal in self.cells[1:]:
+            planner.plan(start, goal)
+        self.assertEqual((planner.misses, planner.hits), (1, len(self.cells) - 2))
+
+        blocked = self.blocked.copy()
+        blocked[:, 40] = True  # close the doorways of one wall
+        planner.set_map(blocked)
+        planner.plan(start, self.cells[1])
+        self.assertEqual(planner.misses, 2)
+        self.assertEqual(len(planner._fields), 1)
+
+    def test_default_versions_count_up(self):
+        planner = GridPlanner(self.blocked, version=None)
+        self.assertEqual(planner.version, 1)
+        planner.plan(self.cells[0], self.cells[1])
+        planner.set_map(self.blocked)
+        self.assertEqual(planner.version, 2)
+        planner.plan(self.cells[0], self.cells[1])
+        self.assertEqual((planner.misses, planner.hits), (2, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add src directory to path to import the pose graph
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from pose_graph import PoseGraph, SpatialIndex, relative_pose, compose
+
+class TestPoseGraph(unittest.TestCase):
+    def test_jacobians_match_finite_differences(self):
+        graph = PoseGraph()
+        poses = np.array([[0.3, -0.2, 0.4], [1.1, 0.5, 1.3]])
+        ei, ej = np.array([0]), np.array([1])
+        measurement = np.array([[0.8, 0.3, 0.7]])
+        _, jac_i, jac_j = graph._linearize(poses, ei, ej, measurement)
+        eps = 1e-6
+        for node, jac in ((0, jac_i[0]), (1, jac_j[0])):
+            for k in range(3):
+                shifted = poses.copy()
+                shifted[node, k] += eps
+                plus = graph._residuals(shifted, ei, ej, measurement)[0][0]
+                shifted[node, k] -= 2 * eps
+                minus = graph._residuals(shifted, ei, ej, measurement)[0][0]
+                np.testing.assert_allclose((plus - minus) / (2 * eps), jac[:, k], atol=1e-6)
+
+    def test_loop_closure_corrects_drift(self):
+        # Drive a 4 m square with biased odometry, then close the loop
+        truth = [np.array([0.0, 0.0, 0.0])]
+        for k in range(1, 41):
+            step = np.array([0.4, 0.0, np.pi / 2 if k % 10 == 0 else 0.0])
+            truth.append(compose(truth[-1], step))
+        graph = PoseGraph()
+        graph.add_node(truth[0])
+        info = np.diag([100.0, 100.0, 400.0])
+        for k in range(1, len(truth)):
+            measured = relative_pose(truth[k - 1], truth[k]) + [0.0, 0.0, 0.01]
+            graph.add_node(compose(graph.poses[k - 1], measured))
+            graph.add_edge(k - 1, k, measured, info)
+            graph.optimize()
+        drifted = np.hypot(*(graph.poses[-1, :2] - truth[-1][:2]))
+
+        candidates = graph.loop_closure_candidates(40, radius=1.5)
+        self.assertIn(0, candidates)
+        graph.add_edge(0, 40, relative_pose(truth[0], truth[40]), info * 10)
+        moved = graph.optimize()
+        corrected = np.hypot(*(graph.poses[-1, :2] - truth[-1][:2]))
+        self.assertLess(corrected, drifted / 5)
+        self.assertEqual(len(moved), 40)
+        self.assertLess(graph.stats[-1].final_error, graph.stats[-1].initial_error)
+
+    def test_sequential_optimization_only_touches_new_nodes(self):
+        graph = PoseGraph()
+        graph.add_node([0, 0, 0])
+        graph.add_node([1, 0, 0])
+        graph.add_edge(0, 1, [1, 0, 0], np.eye(3))
+        graph.optimize()
+        graph.add_node([2.2, 0, 0])
+        graph.add_edge(1, 2, [1, 0, 0], np.eye(3))
+        moved = graph.optimize()
+        self.assertEqual(list(moved), [2])
+        self.assertEqual(graph.stats[-1].active_nodes, 1)
+
+    def test_optimized_loop_closures_stay_out_of_later_windows(self):
+        graph = PoseGraph()
+        graph.add_node([0, 0, 0])
+        for k in range(1, 60):
+            graph.add_node([k, 0, 0])
+            graph.add_edge(k - 1, k, [1, 0, 0], np.eye(3))
+            if k % 10 == 0:
+                graph.add_edge(0, k, [k, 0, 0], np.eye(3))
+            graph.optimize()
+            if k % 10 == 0:
+                self.assertEqual(graph.stats[-1].active_nodes, k)
+            else:
+                # Only the new node and its odometry edge, not the span of an earlier closure
+                self.assertEqual(graph.stats[-1][2:4], (1, 1))
+        self.assertEqual(len(graph.edges), 64)
+
+    def test_spatial_index_radius_query(self):
+        index = SpatialIndex(cell_size=1.0)
+        positions = {i: (i * 0.5, 0.0) for i in range(20)}
+        for item, xy in positions.items():
+            index.insert(item, xy)
+        self.assertEqual(index.query((2.0, 0.0), 0.6, positions), [3, 4, 5])
+
+if __name__ == '__main__':
+    unittest.main()
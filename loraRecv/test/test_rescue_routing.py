@@ -0,0 +1,109 @@
+import unittest
+import sys
+import os
+import itertools
+import numpy as np
+
+# Add src directory to path to import the rescue router
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from costmap import CostMap
+from planner import astar, floor_plan
+from rescue_routing import RescueRouter, nearest_neighbour, two_opt, path_cost
+
+class TestRescueRouting(unittest.TestCase):
+    def setUp(self):
+        self.costmap = CostMap(floor_plan(rows=120, cols=240, room=40, door=6))
+        self.router = RescueRouter(self.costmap)
+        self.drone = (20, 20)
+        for cell in [(20, 60), (60, 20), (60, 60), (100, 20), (100, 60)]:
+            self.router.add_person(cell)
+
+    def test_matrix_matches_pairwise_astar(self):
+        matrix = self.router.matrix(self.drone)
+        self.assertEqual(self.router.searches, 5)
+        cells = [self.drone] + self.router.persons
+        for i, j in [(0, 1), (2, 4), (3, 5)]:
+            self.assertAlmostEqual(matrix[i, j], astar(self.costmap.blocked(), cells[i], cells[j]).cost)
+
+    def test_plan_close_to_optimal(self):
+        plan = self.router.plan(self.drone)
+        matrix = self.router.matrix(self.drone)
+        best = min(path_cost((0,) + order, matrix)
+                   for order in itertools.permutations(range(1, 6)))
+        self.assertLessEqual(plan.cost, 1.1 * best)
+        self.assertLessEqual(plan.cost, path_cost(nearest_neighbour(matrix), matrix))
+        self.assertEqual(sorted(plan.order), list(range(5)))
+        legs = self.router.legs(plan, self.drone)
+        self.assertEqual(tuple(legs[0][0]), self.drone)
+        self.assertEqual(tuple(legs[-1][-1]), self.router.persons[plan.order[-1]])
+
+    def test_fire_invalidates_only_affected_fields(self):
+        before = self.router.matrix(self.drone)
+        # A fire in the far corner room is farther than every target
+        self.costmap.add_fire([100], [220])
+        self.router.plan(self.drone)
+        self.assertEqual(self.router.searches, 5)
+        # Fire in the top doorway of the bottom-left room forces a detour to person 3
+        self.costmap.add_fire(np.full(8, 80), np.arange(16, 24))
+        after = self.router.matrix(self.drone)
+        self.assertGreater(self.router.searches, 5)
+        self.assertGreater(after[0, 4], before[0, 4])
+        self.assertAlmostEqual(after[0, 4], astar(self.costmap.blocked(), self.drone, (100, 20)).cost)
+
+    def test_kept_field_recomputed_beyond_its_radius(self):
+        # Two rooms joined by doorways at rows 14-15 and 55-56
+        walls = np.zeros((60, 60), dtype=bool)
+        walls[:, 30] = True
+        walls[14:16, 30] = False
+        walls[55:57, 30] = False
+        costmap = CostMap(walls)
+        router = RescueRouter(costmap)
+        router.add_person((15, 5))
+        router.matrix((15, 8))
+        # Fire in the near doorway, beyond the only target of person 0's field
+        costmap.add_fire([14, 15], [30, 30])
+        router.matrix((15, 8))
+        self.assertEqual(router.searches, 1)
+        # A new person, or the drone, beyond that distance needs the detour
+        router.add_person((15, 50))
+        matrix = router.matrix((15, 8))
+        detour = astar(costmap.blocked(), (15, 5), (15, 50)).cost
+        self.assertAlmostEqual(matrix[1, 2], detour)
+        self.assertAlmostEqual(matrix[2, 1], detour)
+        matrix = router.matrix((20, 45))
+        self.assertAlmostEqual(matrix[0, 1], astar(costmap.blocked(), (20, 45), (15, 5)).cost)
+
+    def test_fire_on_a_person_or_the_drone(self):
+        costmap = CostMap(np.zeros((30, 30), dtype=bool))
+        router = RescueRouter(costmap)
+        router.add_person((10, 10))
+        router.add_person((20, 20))
+        # The fire zone covers person 0, who is out of reach
+        costmap.add_fire([11], [10])
+        plan = router.plan((0, 0))
+        self.assertEqual((plan.order, plan.unreachable), ([1], [0]))
+        free = plan.cost
+
+        # The drone in a fire zone flies out of it to reach person 1
+        costmap.add_fire([0], [0])
+        self.assertFalse(costmap.is_free(0, 0))
+        plan = router.plan((0, 0))
+        self.assertEqual((plan.order, plan.unreachable), ([1], [0]))
+        self.assertAlmostEqual(plan.cost, free)
+        leg, = router.legs(plan, (0, 0))
+        self.assertEqual(tuple(leg[0]), (0, 0))
+        self.assertEqual(tuple(leg[-1]), (20, 20))
+        # One cell at a time, and in free cells once out of the zone
+        self.assertTrue((np.abs(np.diff(leg, axis=0)).max(axis=1) == 1).all())
+        outside = np.flatnonzero([costmap.is_free(*cell) for cell in leg])
+        self.assertTrue((np.diff(outside) == 1).all())
+        self.assertTrue(all(costmap.is_free(*cell) for cell in leg[outside[0]:]))
+
+    def test_two_opt_untangles_crossing(self):
+        points = np.array([[0, 0], [1, 0], [2, 0], [3, 0]])
+        matrix = np.hypot(*(points[:, None] - points[None]).transpose(2, 0, 1))
+        self.assertEqual(two_opt([0, 2, 1, 3], matrix), [0, 1, 2, 3])
+        self.assertEqual(nearest_neighbour(matrix), [0, 1, 2, 3])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add src directory to path to import the scan matcher
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from scan_matcher import ScanMatcher, scan_points, room_mask, benchmark
+from occupancy_grid import OccupancyGrid
+
+def room_scan(pose, angles):
+    # Ranges from `pose` to the walls of the 8 m x 6 m test room
+    directions = angles + pose[2]
+    dx, dy = np.cos(directions), np.sin(directions)
+    with np.errstate(divide='ignore'):
+        tx = np.where(dx > 0, (4.0 - pose[0]) / dx, (-4.0 - pose[0]) / dx)
+        ty = np.where(dy > 0, (3.0 - pose[1]) / dy, (-3.0 - pose[1]) / dy)
+    return np.minimum(np.abs(tx), np.abs(ty))
+
+class TestScanMatcher(unittest.TestCase):
+    def setUp(self):
+        self.angles = np.radians(np.arange(0, 180, 4))
+        self.true_pose = np.array([0.3, -0.2, 0.1])
+        self.points = scan_points(room_scan(self.true_pose, self.angles), self.angles)
+
+    def test_recovers_pose_from_imu_prediction(self):
+        matcher = ScanMatcher()
+        matcher.set_reference(*room_mask())
+        result = matcher.match(self.points, self.true_pose + [0.2, -0.15, 0.08])
+        np.testing.assert_allclose(result.pose, self.true_pose, atol=0.06)
+        self.assertGreater(result.score, 0.5)
+        self.assertTrue(np.all(np.linalg.eigvalsh(result.covariance) > 0))
+
+    def test_branch_and_bound_matches_exhaustive_search(self):
+        prior = self.true_pose + [0.1, 0.1, -0.03]
+        pruned = ScanMatcher(levels=4, linear_window=0.3, angular_window=0.05)
+        exhaustive = ScanMatcher(levels=1, linear_window=0.3, angular_window=0.05)
+        pruned.set_reference(*room_mask())
+        exhaustive.set_reference(*room_mask())
+        fast = pruned.match(self.points, prior)
+        full = exhaustive.match(self.points, prior)
+        self.assertAlmostEqual(fast.score, full.score, places=6)
+        self.assertLess(fast.candidates, full.candidates)
+
+    def test_matches_against_occupancy_grid(self):
+        grid = OccupancyGrid()
+        for i, pose in enumerate([(0, 0, 0), (0, 0, np.pi)]):
+            grid.insert_scan(i, pose, room_scan(pose, self.angles), self.angles)
+        matcher = ScanMatcher()
+        matcher.set_reference_grid(grid, self.true_pose)
+        result = matcher.match(self.points, self.true_pose + [-0.1, 0.1, 0.03])
+        np.testing.assert_allclose(result.pose[:2], self.true_pose[:2], atol=0.1)
+
+    def test_benchmark_reports_per_scan_cost(self):
+        stats = benchmark(num_scans=3)
+        self.assertEqual(stats['points_per_scan'], 45)
+        self.assertGreater(stats['match_ms_per_scan'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add src directory to path to import the scan normalization stage
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from scan_normalization import normalize_scans, synthetic_scans
+from wire_protocol import INVALID_DISTANCE
+
+class TestScanNormalization(unittest.TestCase):
+    def test_sorts_merges_and_drops_padding(self):
+        # Retrace readings at 8 and 4 degrees appended after the sweep, then padding
+        ranges = np.array([200, 210, 220, 230, 214, 206, INVALID_DISTANCE, INVALID_DISTANCE], dtype=np.int16)
+        angles = np.array([0, 4, 8, 12, 8, 4, 16, 16], dtype=np.int16)
+        scans = normalize_scans(ranges, angles, voxel_size=None)
+        self.assertEqual(scans.counts.tolist(), [4])
+        r, a, points = scans.scan(0)
+        np.testing.assert_allclose(np.degrees(a), [0, 4, 8, 12])
+        np.testing.assert_allclose(r, [2.0, 2.08, 2.17, 2.3])
+        np.testing.assert_allclose(points, np.column_stack([r * np.cos(a), r * np.sin(a)]))
+        self.assertTrue(np.isnan(scans.ranges[0, 4:]).all())
+
+    def test_drops_spikes_keeps_steps(self):
+        ranges = np.array([200, 201, 650, 202, 203, 500, 501, 502], dtype=np.int16)
+        angles = np.arange(0, 32, 4)
+        r, a, _ = normalize_scans(ranges, angles, voxel_size=None).scan(0)
+        # The lone spike goes, the wall 3 m further back stays
+        self.assertEqual(np.round(np.degrees(a)).astype(int).tolist(), [0, 4, 12, 16, 20, 24, 28])
+        self.assertNotIn(6.5, r)
+
+    def test_far_beams_only_clear_space(self):
+        # An open doorway: the beams through it see nothing within range
+        ranges = np.array([300, 850, 860, 855, 310], dtype=np.int16)
+        scans = normalize_scans(ranges, [0, 4, 8, 12, 16], max_range=8.0, voxel_size=None)
+        r, _, points = scans.scan(0)
+        self.assertEqual(len(r), 5)
+        self.assertEqual(len(points), 2)
+
+    def test_voxel_downsampling(self):
+        # Four readings 1 degree apart at 1 m fall within 2 cm of each other
+        scans = normalize_scans([100, 100, 100, 100, 300], [0, 1, 2, 3, 40], max_jump=10, voxel_size=0.1)
+        r, a, points = scans.scan(0)
+        cells = {tuple(c) for c in np.floor(points / 0.1).astype(int)}
+        self.assertEqual(len(cells), len(points))
+        self.assertLess(len(points), 5)
+        self.assertIn(3.0, r)
+
+    def test_batch_matches_single_scans(self):
+        ranges, angles = synthetic_scans(20)
+        batch = normalize_scans(ranges, angles)
+        for i in range(len(ranges)):
+            single = normalize_scans(ranges[i], angles[i]).scan(0)
+            for expected, actual in zip(single, batch.scan(i)):
+                np.testing.assert_array_equal(expected, actual)
+            # Angles come out sorted and unique
+            self.assertTrue(np.all(np.diff(batch.scan(i)[1]) > 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import unittest
+import multiprocessing
+import sys
+import os
+import time
+from types import SimpleNamespace
+import numpy as np
+
+# Add src directory to path to import the shared map
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from shared_map import SharedMap, SharedGrid, shared_map_hook
+from event_store import EventStore
+from occupancy_grid import OccupancyGrid
+from tile_renderer import TileRenderer
+
+def insert_scans(grid, first, count, rng):
+    angles = np.radians(np.arange(0, 360, 3))
+    for k in range(first, first + count):
+        grid.insert_scan(k, (k * 0.4 - 2, np.sin(k / 5), 0.0), rng.uniform(1, 6, len(angles)), angles)
+
+def read_in_child(name, results):
+    shared = SharedMap(name)
+    snapshot = shared.snapshot()
+    mask, origin = snapshot.occupied_mask()
+    results.put((snapshot.generation, int(mask.sum()), origin, snapshot.poses.tolist(), snapshot.event_dicts()))
+    del snapshot
+    shared.close()
+
+class TestSharedMap(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.grid = OccupancyGrid(resolution=20)
+        self.shared = SharedMap(create=True, rows=512, cols=512, max_poses=16, max_events=4)
+        self.reader = SharedMap(self.shared.name)
+
+    def tearDown(self):
+        self.reader.close()
+        self.shared.close()
+
+    def test_snapshot_matches_grid(self):
+        self.assertIsNone(self.reader.snapshot())
+        insert_scans(self.grid, 0, 5, self.rng)
+        self.shared.publish(self.grid, np.arange(15.0).reshape(5, 3))
+        snapshot = self.reader.snapshot()
+        cells, corner = snapshot.window()
+        expected, expected_corner = self.grid.tiles.to_dense()
+        np.testing.assert_array_equal(cells, expected)
+        self.assertEqual(corner, expected_corner)
+        mask, origin = snapshot.occupied_mask()
+        expected_mask, expected_origin = self.grid.occupied_mask()
+        np.testing.assert_array_equal(mask, expected_mask)
+        self.assertEqual(origin, expected_origin)
+        np.testing.assert_array_equal(snapshot.poses, np.arange(15.0).reshape(5, 3))
+        # Views into the segment, not copies, and not writable by readers
+        self.assertFalse(snapshot.cells.flags.writeable)
+        self.assertTrue(np.shares_memory(snapshot.cells, self.reader.slots[1].cells))
+
+    def test_incremental_publish_and_seqlock(self):
+        insert_scans(self.grid, 0, 3, self.rng)
+        self.shared.publish(self.grid)
+        first = self.reader.snapshot()
+        insert_scans(self.grid, 3, 3, self.rng)
+        self.shared.publish(self.grid)
+        # The writer used the other slot, so the first snapshot is intact
+        self.assertTrue(first.consistent())
+        insert_scans(self.grid, 6, 3, self.rng)
+        self.shared.publish(self.grid)
+        self.assertFalse(first.consistent())
+        # Each slot caught up on the tiles it missed
+        latest = self.reader.snapshot()
+        np.testing.assert_array_equal(latest.window()[0], self.grid.tiles.to_dense()[0])
+        self.assertEqual(latest.revision, self.grid.tiles.revision)
+
+    def test_new_grid_starts_over(self):
+        insert_scans(self.grid, 0, 3, self.rng)
+        self.shared.publish(self.grid)
+        self.shared.publish(self.grid)
+        epoch = self.reader.snapshot().epoch
+        other = OccupancyGrid(resolution=20)
+        insert_scans(other, 20, 1, self.rng)
+        self.shared.publish(other)
+        snapshot = self.reader.snapshot()
+        self.assertEqual(snapshot.epoch, epoch + 1)
+        np.testing.assert_array_equal(snapshot.window()[0], other.tiles.to_dense()[0])
+
+    def test_tile_renderer_over_shared_map(self):
+        insert_scans(self.grid, 0, 8, self.rng)
+        self.shared.publish(self.grid)
+        local, remote = TileRenderer(self.grid), TileRenderer(SharedGrid(self.reader))
+        self.assertEqual(local.keys(0), remote.keys(0))
+        for zoom in range(local.levels):
+            for row, col in local.keys(zoom):
+                np.testing.assert_array_equal(local.tile(zoom, col, row)[1], remote.tile(zoom, col, row)[1])
+
+    def test_reader_in_another_process(self):
+        insert_scans(self.grid, 0, 4, self.rng)
+        events = [{'id': 3, 'type': 'person', 'pose': [1.0, 2.0], 'count': 2, 'confidence': 0.75,
+                   'first_time': 1.0, 'last_time': 2.5}]
+        self.shared.publish(self.grid, np.ones((40, 3)), events)
+        results = multiprocessing.Queue()
+        child = multiprocessing.Process(target=read_in_child, args=(self.shared.name, results))
+        child.start()
+        generation, occupied, origin, poses, child_events = results.get(timeout=30)
+        child.join(30)
+        self.assertEqual(child.exitcode, 0)
+        self.assertEqual(generation, 1)
+        self.assertEqual(occupied, int(self.grid.occupied_mask()[0].sum()))
+        self.assertEqual(origin, self.grid.occupied_mask()[1])
+        # Only the newest poses fit
+        self.assertEqual(len(poses), 16)
+        self.assertEqual(child_events, events)
+
+    def test_throttled_scans_are_published_later(self):
+        slam = SimpleNamespace(grid=self.grid, poses=np.zeros((0, 3)), events=EventStore())
+        publish = shared_map_hook(self.shared, interval=0.2)
+
+        def step(count, accepted=True):
+            insert_scans(self.grid, len(slam.poses), count, self.rng)
+            slam.poses = np.zeros((len(slam.poses) + count, 3))
+            publish(slam, None, accepted)
+
+        step(1)
+        step(1)
+        self.assertEqual((self.reader.generation, len(self.reader.snapshot().poses)), (1, 1))
+        # A rejected scan past the interval still sends the pending one
+        time.sleep(0.25)
+        publish(slam, None, False)
+        self.assertEqual((self.reader.generation, len(self.reader.snapshot().poses)), (2, 2))
+        publish(slam, None, False)
+        step(1)
+        self.assertEqual(self.reader.generation, 2)
+        publish.flush()
+        publish.flush()
+        self.assertEqual((self.reader.generation, len(self.reader.snapshot().poses)), (3, 3))
+
+if __name__ == '__main__':
+    unittest.main()
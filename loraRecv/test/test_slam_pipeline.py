@@ -0,0 +1,112 @@
+import unittest
+import sys
+import os
+import asyncio
+import json
+import shutil
+import tempfile
+import numpy as np
+
+# Add src directory to path to import the SLAM pipeline
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from slam_pipeline import SlamPipeline
+from pose_graph import relative_pose
+from ingestion import ScanPair, IngestionService
+from wire_protocol import SENSOR_DTYPE, IMU_DTYPE
+from flight_log import FlightLog, FlightLogWriter, flight_log_consumer, flight_log_hook
+from map_stream import MapStream, stream_hook
+from pipeline_benchmark import synthetic_stream
+from shared_map import SharedMap, shared_map_hook
+from tile_renderer import TileRenderer, render_hook
+
+def room_scan(pose, angles):
+    # Ranges from `pose` to the walls of an 8 m x 6 m room
+    directions = angles + pose[2]
+    dx, dy = np.cos(directions), np.sin(directions)
+    with np.errstate(divide='ignore'):
+        tx = np.where(dx > 0, (4.0 - pose[0]) / dx, (-4.0 - pose[0]) / dx)
+        ty = np.where(dy > 0, (3.0 - pose[1]) / dy, (-3.0 - pose[1]) / dy)
+    return np.minimum(np.abs(tx), np.abs(ty))
+
+def circuit(steps=30, laps=1.5):
+    # Poses along an ellipse through the room, facing along the path
+    for k in range(int(steps * laps)):
+        theta = 2 * np.pi * k / steps
+        yield np.array([2.5 * np.sin(theta), -1.5 * np.cos(theta), theta])
+
+class TestSlamPipeline(unittest.TestCase):
+    def setUp(self):
+        self.angles = np.radians(np.arange(-90, 90, 4))
+        self.rng = np.random.default_rng(0)
+
+    def test_tracks_circuit_and_closes_loop(self):
+        slam = SlamPipeline()
+        poses = list(circuit())
+        start = poses[0]
+        for step, truth in enumerate(poses):
+            ranges = room_scan(truth, self.angles) + self.rng.normal(0, 0.01, len(self.angles))
+            # The first scan anchors the map frame; later priors are noisy
+            prior = relative_pose(start, truth)
+            if step:
+                prior += self.rng.normal(0, [0.1, 0.1, 0.03])
+            self.assertTrue(slam.add_scan(ranges, self.angles, prior))
+
+        expected = relative_pose(start, poses[-1])
+        self.assertLess(np.hypot(*(slam.poses[-1, :2] - expected[:2])), 0.15)
+        self.assertTrue(slam.loop_closures)
+        self.assertEqual(len(slam.grid), len(poses))
+        # Sequential scans only re-solve the newest node
+        self.assertLessEqual(min(s.active_nodes for s in slam.graph.stats), 1)
+
+    def test_process_pair_converts_units_and_records_events(self):
+        slam = SlamPipeline()
+        scan = np.zeros((), dtype=SENSOR_DTYPE)
+        scan['range'] = (room_scan(np.zeros(3), np.radians(np.arange(0, 180, 4))) * 100).astype(np.int16)
+        scan['range'][-3:] = 900
+        scan['angle'] = np.arange(0, 180, 4)
+        scan['temperature'] = 40.0
+        scan['personDetectedFlag'] = True
+        imu = np.zeros((), dtype=IMU_DTYPE)
+        self.assertTrue(slam(ScanPair(0.0, scan, imu)))
+        self.assertTrue(slam(ScanPair(1.0, scan, imu)))
+        self.assertEqual(len(slam.temperature_events), 2)
+        self.assertEqual(len(slam.person_events), 2)
+        # Both packets saw the same person and the same hot spot
+        self.assertEqual([c.count for c in slam.events.events()], [2, 2])
+        self.assertLess(np.abs(slam.poses[-1]).max(), 0.06)
+
+    def test_hooks_follow_each_step_once(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        shared = SharedMap(create=True)
+        self.addCleanup(shared.close)
+        stream, renderer = MapStream(), TileRenderer()
+        slam = SlamPipeline()
+        chunks = synthetic_stream(20, persons=range(3, 6))
+
+        async def source():
+            for _, data in chunks:
+                yield data
+
+        with FlightLogWriter(directory) as writer:
+            for hook in (flight_log_hook(writer), shared_map_hook(shared), stream_hook(stream),
+                         render_hook(renderer)):
+                slam.add_hook(hook)
+            asyncio.run(IngestionService(source(), [flight_log_consumer(writer), slam]).run())
+        self.assertEqual(slam.graph.num_nodes, 20)
+
+        log = FlightLog(directory)
+        self.assertEqual(len(log.read('scans')['timestamp']), 20)
+        np.testing.assert_array_equal(log.read('poses')['node'], np.arange(20))
+        self.assertEqual(len(log.read('events')['kind']), 3)
+        snapshot = shared.snapshot()
+        np.testing.assert_allclose(snapshot.poses, slam.poses)
+        self.assertEqual([event['count'] for event in snapshot.event_dicts()], [3])
+        # Attached once, then one update per scan
+        self.assertEqual(stream.seq, 21)
+        np.testing.assert_allclose(json.loads(stream.snapshot().data)['pose'], slam.poses[-1])
+        self.assertEqual(len(json.loads(renderer.overlay()[1])['trajectory']), 20)
+        self.assertIs(renderer.grid, slam.grid)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import sys
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+
+# Add src directory to path to import the supervisor
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from supervisor import Supervisor, DroneSpec
+from pipeline_benchmark import synthetic_stream
+
+class TestSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def recording(self, name, scans, persons=()):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(b''.join(data for _, data in synthetic_stream(scans, seed=len(name), persons=persons)))
+        return path
+
+    def test_drones_run_in_parallel_into_one_registry(self):
+        specs = [DroneSpec('alpha', self.recording('alpha.bin', 12, persons=range(3, 8)), replay=True),
+                 DroneSpec('bravo', self.recording('bravo.bin', 20), replay=True),
+                 DroneSpec('ghost', os.path.join(self.directory, 'missing-port'))]
+        supervisor = Supervisor(specs, interval=0.1)
+        supervisor.start()
+        self.addCleanup(supervisor.stop)
+        self.assertTrue(supervisor.wait(60))
+        supervisor.stop()
+
+        summary = supervisor.registry.summary()
+        self.assertEqual(list(summary), ['alpha', 'bravo', 'ghost'])
+        self.assertEqual([summary[d]['scans'] for d in ('alpha', 'bravo')], [12, 20])
+        self.assertTrue(summary['alpha']['finished'])
+        self.assertGreater(summary['bravo']['mean_scans_per_s'], 0)
+        self.assertIn('FileNotFoundError', summary['ghost']['error'])
+        # Five sweeps of the same person are one event, tagged with its drone
+        events = supervisor.registry.events('person')
+        self.assertEqual([(e['drone_id'], e['count']) for e in events], [('alpha', 5)])
+        dense, corner = supervisor.registry.to_dense('bravo')
+        self.assertTrue((dense != 0).any())
+        self.assertEqual(dense.shape[0] % 64, 0)
+
+    def wait_for(self, condition, timeout=60):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail("Timed out")
+            time.sleep(0.05)
+
+    @unittest.skipUnless(hasattr(os, 'openpty'), "needs a pty")
+    def test_restarted_worker_starts_a_fresh_map(self):
+        import termios
+        master, slave = os.openpty()
+        self.addCleanup(os.close, master)
+        self.addCleanup(os.close, slave)
+
+        def write_when_opened(chunks):
+            # A worker flushes pending input as it sets the port to its baud rate
+            self.wait_for(lambda: termios.tcgetattr(slave)[4] == termios.B115200)
+            os.write(master, b''.join(data for _, data in chunks))
+
+        def unconfigure():
+            attrs = termios.tcgetattr(slave)
+            attrs[4] = attrs[5] = termios.B9600
+            termios.tcsetattr(slave, termios.TCSANOW, attrs)
+
+        unconfigure()
+        supervisor = Supervisor([DroneSpec('pty', os.ttyname(slave))], interval=0.0)
+        supervisor.start()
+        self.addCleanup(supervisor.stop)
+        registry = supervisor.registry
+        write_when_opened(synthetic_stream(8, persons=range(2, 6)))
+        self.wait_for(lambda: registry.summary().get('pty', {}).get('scans') == 8)
+        self.assertEqual(len(registry.events('person')), 1)
+
+        unconfigure()
+        supervisor._processes['pty'].kill()
+        self.wait_for(lambda: registry.summary()['pty']['restarts'] == 1)
+        summary = registry.summary()['pty']
+        self.assertEqual((summary['scans'], summary['tiles'], summary['events']), (0, 0, 0))
+        self.assertEqual(registry.tiles('pty'), {})
+
+        # The new worker's map and rates only
+        write_when_opened(synthetic_stream(3, seed=1))
+        self.wait_for(lambda: registry.summary()['pty']['scans'] == 3)
+        summary = registry.summary()['pty']
+        self.assertGreaterEqual(summary['scans_per_s'], 0)
+        self.assertGreater(summary['tiles'], 0)
+        self.assertEqual(registry.events('person'), [])
+
+    def test_rejects_duplicate_ids(self):
+        with self.assertRaises(ValueError):
+            Supervisor([DroneSpec('a', 'x'), DroneSpec('a', 'y')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import sys
+import os
+import struct
+import zlib
+import json
+import numpy as np
+
+# Add src directory to path to import the tile renderer
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from tile_renderer import TileRenderer, SHADE_LUT, UNKNOWN_SHADE, encode_png
+from occupancy_grid import OccupancyGrid
+
+def decode_png(data):
+    # Just enough PNG reading for the 8-bit greyscale, unfiltered images we write
+    width, height = struct.unpack('>II', data[16:24])
+    pos, idat = 8, b''
+    while pos < len(data):
+        length = struct.unpack('>I', data[pos:pos + 4])[0]
+        if data[pos + 4:pos + 8] == b'IDAT':
+            idat += data[pos + 8:pos + 8 + length]
+        pos += length + 12
+    rows = np.frombuffer(zlib.decompress(idat), dtype=np.uint8).reshape(height, width + 1)
+    return rows[:, 1:]
+
+class TestTileRenderer(unittest.TestCase):
+    def setUp(self):
+        self.grid = OccupancyGrid(resolution=20)
+        self.angles = np.radians(np.arange(0, 360, 4))
+        self.renderer = TileRenderer(self.grid, levels=4)
+
+    def scan(self, scan_id, x, y, reach=3.0):
+        self.grid.insert_scan(scan_id, (x, y, 0.0), np.full(len(self.angles), reach), self.angles)
+
+    def test_only_dirty_tiles_are_redrawn(self):
+        self.scan(0, 0.0, 0.0)
+        first = self.renderer.render()
+        self.assertEqual(first, len(self.grid.tiles) + sum(len(self.renderer.keys(z)) for z in (1, 2, 3)))
+        self.assertEqual(self.renderer.render(), 0)
+        before = {key: self.renderer.etag(0, key[1], key[0]) for key in self.renderer.keys(0)}
+        # A short scan far away touches a few new tiles only
+        self.scan(1, 20.0, 0.0, reach=0.5)
+        redrawn = self.renderer.render()
+        self.assertLess(redrawn, first)
+        after = {key: self.renderer.etag(0, key[1], key[0]) for key in before}
+        self.assertEqual(before, after)
+
+    def test_pyramid_matches_the_map(self):
+        self.scan(0, 0.0, 0.0)
+        self.scan(1, 2.0, 1.0)
+        dense, (row0, col0) = self.grid.tiles.to_dense()
+        size = self.grid.tiles.tile_size
+        # Zoom 0 tiles are the shaded cells, +y up
+        key = self.renderer.keys(0)[0]
+        _, image = self.renderer.tile(0, key[1], key[0])
+        r, c = key[0] * size - row0, key[1] * size - col0
+        np.testing.assert_array_equal(image, SHADE_LUT[dense[r:r + size, c:c + size].view(np.uint8)][::-1])
+        # Zoom 1 keeps the darkest cell of each 2x2 block
+        key = self.renderer.keys(1)[0]
+        _, image = self.renderer.tile(1, key[1], key[0])
+        block = np.full((2 * size, 2 * size), UNKNOWN_SHADE, dtype=np.uint8)
+        for dr in (0, 1):
+            for dc in (0, 1):
+                child = self.grid.tiles.tiles.get((2 * key[0] + dr, 2 * key[1] + dc))
+                if child is not None:
+                    block[dr * size:(dr + 1) * size, dc * size:(dc + 1) * size] = SHADE_LUT[child.data.view(np.uint8)]
+        expected = block.reshape(size, 2, size, 2).min(axis=(1, 3))[::-1]
+        np.testing.assert_array_equal(image, expected)
+
+    def test_png_and_overlay(self):
+        self.scan(0, 0.0, 0.0)
+        key = self.renderer.keys(2)[0]
+        etag, data = self.renderer.png(2, key[1], key[0])
+        np.testing.assert_array_equal(decode_png(data), self.renderer.tile(2, key[1], key[0])[1])
+        self.assertIs(self.renderer.png(2, key[1], key[0])[1], data)
+        self.assertIsNone(self.renderer.png(0, 999, 999))
+        self.assertEqual(decode_png(encode_png(np.arange(12, dtype=np.uint8).reshape(3, 4))).tolist(),
+                         np.arange(12).reshape(3, 4).tolist())
+
+        tag, body = self.renderer.overlay()
+        self.renderer.update_overlay(np.array([[0.0, 0.0, 0.0], [1.0, 2.0, 0.5]]),
+                                     [{'type': 'person', 'pose': [1.0, 2.0]}])
+        new_tag, body = self.renderer.overlay()
+        self.assertNotEqual(tag, new_tag)
+        body = json.loads(body)
+        self.assertEqual(body['trajectory'], [[0.0, 0.0], [1.0, 2.0]])
+        self.assertEqual(body['events'][0]['type'], 'person')
+        # The overlay never dirties raster tiles
+        self.assertEqual(self.renderer.render(), 0)
+
+    def test_etags_change_on_attach(self):
+        self.scan(0, 0.0, 0.0)
+        key = self.renderer.keys(0)[0]
+        etag, image = self.renderer.tile(0, key[1], key[0])
+        overlay_tag = self.renderer.overlay()[0]
+        # The next flight maps the same tile differently, in its first frame too
+        other = OccupancyGrid(resolution=20)
+        other.insert_scan(0, (0.5, 0.5, 0.0), np.full(len(self.angles), 1.0), self.angles)
+        self.renderer.attach(other)
+        new_etag, new_image = self.renderer.tile(0, key[1], key[0])
+        self.assertFalse(np.array_equal(image, new_image))
+        self.assertNotEqual(etag, new_etag)
+        self.assertNotEqual(overlay_tag, self.renderer.overlay()[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import sys
+import os
+import numpy as np
+
+# Add src directory to path to import the tile store
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from tiled_map import TiledMap
+
+class TestTiledMap(unittest.TestCase):
+    def test_lazy_allocation_with_negative_cells(self):
+        tiles = TiledMap(tile_size=64)
+        tiles.add([-1, 0, 200], [-1, 0, -300], 5)
+        self.assertEqual(sorted(tiles.tiles), [(-1, -1), (0, 0), (3, -5)])
+        np.testing.assert_array_equal(tiles.get([-1, 0, 200, 5000], [-1, 0, -300, 5000]), [5, 5, 5, 0])
+        self.assertEqual(tiles.nbytes(), 3 * 64 * 64)
+
+    def test_saturates_at_int8(self):
+        tiles = TiledMap()
+        for _ in range(20):
+            tiles.add([3], [4], 15)
+        self.assertEqual(tiles.get([3], [4])[0], 127)
+        tiles.add([3], [4], -300)
+        self.assertEqual(tiles.get([3], [4])[0], -127)
+
+    def test_dirty_tiles_since_revision(self):
+        tiles = TiledMap(tile_size=16)
+        tiles.add([0], [0], 1)
+        seen = tiles.revision
+        tiles.add([40], [0], 1)
+        self.assertEqual(tiles.dirty_tiles(seen), [(2, 0)])
+        self.assertEqual(len(tiles.dirty_tiles(0)), 2)
+
+    def test_to_dense(self):
+        tiles = TiledMap(tile_size=16)
+        tiles.add([-3, 20], [5, -2], 7)
+        dense, (row0, col0) = tiles.to_dense()
+        self.assertEqual((row0, col0), (-16, -16))
+        self.assertEqual(dense.shape, (48, 32))
+        self.assertEqual(dense[-3 - row0, 5 - col0], 7)
+        self.assertEqual(dense[20 - row0, -2 - col0], 7)
+        self.assertEqual(int(dense.sum()), 14)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import sys
+import os
+import json
+import numpy as np
+
+# Add src directory to path to import the decoder
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from wire_protocol import (StreamDecoder, decode, encode_frame, encode_records, SENSOR_DTYPE,
+                           IMU_DTYPE, PAIR_DTYPE, FRAME_SCAN, FRAME_IMU, FRAME_PAIR,
+                           INVALID_DISTANCE)
+
+class TestWireProtocol(unittest.TestCase):
+    def generate_pairs(self, count):
+        pairs = np.zeros(count, dtype=PAIR_DTYPE)
+        for i in range(count):
+            pairs['scan']['device_id'][i] = 1
+            pairs['scan']['range'][i] = np.arange(45) + 100 * i
+            pairs['scan']['angle'][i] = np.arange(0, 180, 4)
+            pairs['scan']['temperature'][i] = 25.5 + i
+            pairs['scan']['timestamp'][i] = 1000 * i
+            pairs['scan']['personDetectedFlag'][i] = i % 2 == 0
+            pairs['imu']['device_id'][i] = 2
+            pairs['imu']['gyro_z'][i] = 0.01 * i
+            pairs['imu']['accel_x'][i] = 0.1
+            pairs['imu']['accel_y'][i] = -0.2
+        return pairs
+
+    def test_layout_matches_firmware_structs(self):
+        self.assertEqual(SENSOR_DTYPE.itemsize, 196)
+        self.assertEqual(SENSOR_DTYPE.fields['temperature'][1], 184)
+        self.assertEqual(IMU_DTYPE.itemsize, 16)
+        self.assertEqual(PAIR_DTYPE.itemsize, 212)
+
+    def test_batch_decode_is_a_view(self):
+        pairs = self.generate_pairs(5)
+        data = encode_records(FRAME_PAIR, pairs)
+        batch = decode(data)
+        self.assertEqual(len(batch.pairs), 5)
+        np.testing.assert_array_equal(batch.pairs, pairs)
+        self.assertFalse(batch.pairs.flags.owndata)
+
+    def test_split_feed_and_crc_errors(self):
+        pairs = self.generate_pairs(3)
+        data = bytearray(encode_records(FRAME_PAIR, pairs))
+        data[15] ^= 0xFF  # corrupt the first frame payload
+        decoder = StreamDecoder()
+        first = decoder.feed(bytes(data[:300]))
+        second = decoder.feed(bytes(data[300:]))
+        self.assertEqual(len(first.pairs) + len(second.pairs), 2)
+        self.assertEqual(decoder.crc_errors, 1)
+
+    def test_mixed_frames_json_and_status_lines(self):
+        pairs = self.generate_pairs(2)
+        doc = {
+            "ranges": [150] * 40, "angles": [10] * 40, "device_id_1": 1,
+            "temperature": 36.0, "timestamp": 42, "personDetectedFlag": True,
+            "device_id_2": 2, "rotation_z": 0.5, "accel_x": 0.1, "accel_y": 0.2
+        }
+        data = (encode_frame(FRAME_SCAN, pairs[0]['scan'].tobytes()) +
+                b'First packet invalid or not ID1. Dropping packet.\r\n' +
+                encode_frame(FRAME_IMU, pairs[0]['imu'].tobytes()) +
+                json.dumps(doc).encode() + b'\n')
+        decoder = StreamDecoder()
+        batch = decoder.feed(data)
+        self.assertEqual(len(batch.scans), 1)
+        self.assertEqual(len(batch.imus), 1)
+        self.assertEqual(len(batch.pairs), 1)
+        self.assertEqual(decoder.dropped_lines, 1)
+        self.assertEqual(decoder.json_lines, 1)
+        record = batch.pairs[0]
+        self.assertEqual(record['scan']['range'][0], 150)
+        self.assertEqual(record['scan']['range'][44], INVALID_DISTANCE)
+        self.assertAlmostEqual(float(record['imu']['gyro_z']), 0.5)
+
+if __name__ == '__main__':
+    unittest.main()
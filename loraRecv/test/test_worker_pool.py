@@ -0,0 +1,95 @@
+import unittest
+import sys
+import os
+import socket
+import time
+
+# Add src directory to path to import the worker pool
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+from worker_pool import WorkerPool, PoolClient, StubEngine, DONE, FAILED, CANCELLED, QUEUED
+
+class StubbornEngine(StubEngine):
+    def run(self, script, cancelled, poll=0.005):
+        time.sleep(10)
+
+class BrokenEngine(StubEngine):
+    def __init__(self):
+        raise RuntimeError("no licence")
+
+class TestWorkerPool(unittest.TestCase):
+    def make_pool(self, **kwargs):
+        pool = WorkerPool(**kwargs)
+        pool.start()
+        self.addCleanup(pool.shutdown, 1.0)
+        return pool
+
+    def test_jobs_run_on_prestarted_workers(self):
+        pool = self.make_pool(size=2, engine_kwargs={'startup': 0.2, 'duration': 0.05})
+        started = time.perf_counter()
+        job_ids = [pool.submit() for _ in range(4)]
+        self.assertLess(time.perf_counter() - started, 0.1)
+        results = [pool.wait(job_id, 5) for job_id in job_ids]
+        self.assertEqual([r['state'] for r in results], [DONE] * 4)
+        self.assertEqual(len({r['result']['pid'] for r in results}), 2)
+        with self.assertRaises(ValueError):
+            pool.submit('../../etc/passwd')
+
+    def test_cancel_queued_and_running(self):
+        pool = self.make_pool(size=1, engine_kwargs={'duration': 5.0})
+        running, queued = pool.submit(), pool.submit()
+        while pool.status(running)['state'] == QUEUED:
+            time.sleep(0.01)
+        self.assertTrue(pool.cancel(queued))
+        self.assertEqual(pool.status(queued)['state'], CANCELLED)
+        self.assertTrue(pool.cancel(running))
+        self.assertEqual(pool.wait(running, 2)['state'], CANCELLED)
+        self.assertFalse(pool.cancel(running))
+        # The same worker takes the next job
+        follow_up = pool.submit()
+        self.assertTrue(pool.cancel(follow_up))
+
+    def test_unresponsive_engine_is_replaced(self):
+        pool = self.make_pool(size=1, engine=StubbornEngine, cancel_timeout=0.2)
+        job_id = pool.submit()
+        time.sleep(0.2)
+        pool.cancel(job_id)
+        self.assertEqual(pool.wait(job_id, 2)['state'], CANCELLED)
+        self.assertEqual(len(pool._workers), 1)
+        self.assertTrue(pool._workers[0].process.is_alive())
+
+    def test_broken_engine_fails_jobs(self):
+        pool = self.make_pool(size=1, engine=BrokenEngine)
+        status = pool.wait(pool.submit(), 5)
+        self.assertEqual(status['state'], FAILED)
+        self.assertIn("no licence", status['error'])
+        # Later jobs fail straight away instead of queueing forever
+        self.assertEqual(pool.status(pool.submit())['state'], FAILED)
+
+    def test_web_workers_share_one_pool_process(self):
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            address = probe.getsockname()
+        # Two web workers; the first to need the pool starts it
+        first, second = (PoolClient(address, b'secret', spawn=(1, 'stub', 1.0)) for _ in range(2))
+
+        def stop_server(client):
+            if client.process is not None:
+                client.process.terminate()
+                client.process.wait(10)
+
+        self.addCleanup(stop_server, first)
+        job_id = first.submit()
+        self.assertEqual(second.wait(job_id, 10)['state'], DONE)
+        self.assertIsNone(second.process)
+        self.assertFalse(second.cancel(job_id))
+        self.assertEqual([job['id'] for job in first.jobs()], [job_id])
+        with self.assertRaises(ValueError):
+            second.submit('../../etc/passwd')
+
+        # A pool that went away is started again on the next call
+        stop_server(first)
+        self.assertIsNone(first.status(job_id))
+        self.assertEqual(second.active(), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+// Runs the person detection model with TFLM's MicroInterpreter and reference
+// kernels on the host, as the oracle for person_detector.py.
+//
+// Reads 96x96 uint8 frames from stdin, shifts them by -128 like
+// PersonDetection::run(), and writes for every frame the bytes of each
+// tensor index given on the command line (in that order) to stdout.
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <vector>
+
+#include "tensorflow/lite/micro/memory_helpers.h"
+#include "tensorflow/lite/micro/micro_interpreter.h"
+#include "tensorflow/lite/micro/micro_mutable_op_resolver.h"
+#include "tensorflow/lite/schema/schema_generated.h"
+#include "eloquent_tinyml/zoo/person_detection_model.h"
+
+namespace {
+constexpr int kFrameSize = 96 * 96;
+constexpr size_t kArenaSize = 4 * 1024 * 1024;
+alignas(16) uint8_t tensor_arena[kArenaSize];
+
+size_t TensorBytes(const TfLiteEvalTensor* tensor) {
+  size_t count = 1;
+  for (int i = 0; i < tensor->dims->size; ++i) count *= tensor->dims->data[i];
+  size_t bytes = 0;
+  tflite::TfLiteTypeSizeOf(tensor->type, &bytes);
+  return count * bytes;
+}
+}  // namespace
+
+int main(int argc, char** argv) {
+  const tflite::Model* model =
+      tflite::GetModel(eloq::tinyml::zoo::personDetectionModel);
+  tflite::MicroMutableOpResolver<5> resolver;
+  resolver.AddDepthwiseConv2D();
+  resolver.AddConv2D();
+  resolver.AddAveragePool2D();
+  resolver.AddReshape();
+  resolver.AddSoftmax();
+  // Keep intermediates so every layer can be compared
+  tflite::MicroInterpreter interpreter(model, resolver, tensor_arena, kArenaSize,
+                                       nullptr, nullptr, true);
+  if (interpreter.AllocateTensors() != kTfLiteOk) {
+    fprintf(stderr, "AllocateTensors failed\n");
+    return 1;
+  }
+
+  std::vector<int> tensors;
+  for (int i = 1; i < argc; ++i) tensors.push_back(atoi(argv[i]));
+  if (tensors.empty()) tensors.push_back(model->subgraphs()->Get(0)->outputs()->Get(0));
+
+  uint8_t frame[kFrameSize];
+  while (fread(frame, 1, kFrameSize, stdin) == kFrameSize) {
+    int8_t* input = interpreter.input(0)->data.int8;
+    for (int i = 0; i < kFrameSize; ++i) input[i] = static_cast<int16_t>(frame[i]) - 128;
+    if (interpreter.Invoke() != kTfLiteOk) {
+      fprintf(stderr, "Invoke failed\n");
+      return 1;
+    }
+    for (int index : tensors) {
+      const TfLiteEvalTensor* tensor = interpreter.GetTensor(index);
+      fwrite(tensor->data.raw, 1, TensorBytes(tensor), stdout);
+    }
+  }
+  return 0;
+}